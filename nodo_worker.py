@@ -12,18 +12,99 @@ import Pyro5.server
 import Pyro5.errors
 import threading
 import base64
-import tempfile
+import serpent
 import time
-from typing import Dict, Any, List
+import hashlib
+import uuid
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
 from pathlib import Path
 
 # Importaciones locales del nodo worker
 from procesador_imagen import ProcesadorImagenesImpl
+from utils.almacen_resultados import COMPLETADO, DESCONOCIDO, EN_COLA, FALLIDO, AlmacenResultados
+from utils.almacenamiento_compartido import escribir_atomico, mapear_lectura, resolver_referencia
+from utils.cache import CacheResultados, clave_resultado
+from utils.codificacion import resolver_codificacion
+from utils.contadores import ContadoresPorHilo
+from utils.cola_trabajos import PRIORIDAD_POR_DEFECTO, PRIORIDADES, ColaEspera, Turno
+from utils.ejecutor_procesos import EjecutorProcesos
+from utils.exportador_metricas import ExportadorMetricas
 from utils.logger import get_logger
+from utils.metricas import MetricasEtapas
+from utils.sondeo_imagen import MAX_PIXELES, estimar_memoria, leer_cabecera, sondear
+from utils.subidas import TAMAÑO_FRAGMENTO, UMBRAL_MEMORIA, GestorSubidas
 
 logger = get_logger("NodoWorker")
 
+# Modos de ejecución: hilos del daemon Pyro5 o pool de procesos
+MODOS_EJECUCION = ("hilos", "procesos")
+
+MB = 1024 * 1024
+
+
+def _normalizar_bytes(datos) -> bytes:
+    """
+    Convierte la carga recibida por Pyro5 a un objeto tipo bytes (sin copiar).
+    serpent transporta bytes como {'data': ..., 'encoding': 'base64'};
+    marshal y msgpack los entregan tal cual.
+    """
+    if isinstance(datos, (bytes, bytearray, memoryview)):
+        return datos
+    if isinstance(datos, dict) and datos.get("encoding") == "base64":
+        return serpent.tobytes(datos)
+    raise TypeError(f"Tipo de imagen no soportado: {type(datos).__name__}")
+
+
+def _desempaquetar_trabajo(trabajo) -> tuple:
+    """
+    Obtiene (id_trabajo, nombre_archivo, imagen_bytes, transformaciones, orden_estricto)
+    de un trabajo de lote
+    """
+    if isinstance(trabajo, dict):
+        return (
+            trabajo["id_trabajo"],
+            trabajo["nombre_archivo"],
+            trabajo["imagen_bytes"],
+            trabajo.get("transformaciones", []),
+            bool(trabajo.get("orden_estricto", False))
+        )
+    if len(trabajo) == 5:
+        id_trabajo, nombre_archivo, imagen_bytes, transformaciones, orden_estricto = trabajo
+        return id_trabajo, nombre_archivo, imagen_bytes, transformaciones, bool(orden_estricto)
+    id_trabajo, nombre_archivo, imagen_bytes, transformaciones = trabajo
+    return id_trabajo, nombre_archivo, imagen_bytes, transformaciones, False
+
+
+def _desempaquetar_receta(receta, indice: int) -> tuple:
+    """
+    Normaliza una receta de procesar_variantes.
+    Acepta una lista de transformaciones o un dict con 'transformaciones' y,
+    opcionalmente, 'id' (por defecto, su posición en la lista).
+    """
+    if isinstance(receta, dict):
+        return receta.get("id", indice), receta.get("transformaciones", [])
+    return indice, list(receta)
+
+
+class _TrabajoDiferido:
+    """
+    Trabajo de lote o asíncrono con el turno en la cola del nodo. No ocupa
+    ningún hilo mientras espera: al tocarle se reserva su slot y se envía a
+    'pool'. 'futuro' recibe su resultado (o el rechazo, si el nodo se detiene).
+    """
+
+    __slots__ = ("futuro", "pool", "argumentos", "al_iniciar")
+
+    def __init__(self, pool: ThreadPoolExecutor, argumentos: tuple, al_iniciar=None):
+        self.futuro: Future = Future()
+        self.pool = pool
+        # Argumentos de NodoWorker._ejecutar_trabajo
+        self.argumentos = argumentos
+        self.al_iniciar = al_iniciar
+
+
 @Pyro5.api.expose
 class NodoWorker:
     """
@@ -31,22 +112,100 @@ class NodoWorker:
     Expone sus métodos vía Pyro5 para ser llamados remotamente.
     """
     
-    def __init__(self, id_nodo: str, capacidad_maxima: int = 5):
+    def __init__(
+        self, 
+        id_nodo: str, 
+        capacidad_maxima: int = 5, 
+        modo_ejecucion: str = "hilos",
+        cache_mb: int = 256,
+        directorio_cache: Optional[str] = None,
+        cache_disco_mb: int = 1024,
+        presupuesto_memoria_mb: int = 0,
+        tamaño_cola: int = 0,
+        plazo_espera: float = 30.0,
+        reserva_interactiva: int = 0,
+        max_megapixeles: Optional[float] = None,
+        resultados_mb: int = 256,
+        ttl_resultados: float = 300.0,
+        max_trabajos_asincronos: int = 1000,
+        max_entradas_asincronas_mb: int = 512,
+        directorio_compartido: Optional[str] = None,
+        max_subidas_mb: int = 2048,
+        directorio_subidas: Optional[str] = None
+    ):
+        if modo_ejecucion not in MODOS_EJECUCION:
+            raise ValueError(f"Modo de ejecución inválido: {modo_ejecucion}. Opciones: {MODOS_EJECUCION}")
+        
         self.id_nodo = id_nodo
         self.estado = "activo"
         self.procesador = ProcesadorImagenesImpl()
+        self.modo_ejecucion = modo_ejecucion
+        # En modo 'procesos' cada slot de capacidad es un proceso del pool
+        self.ejecutor = (
+            EjecutorProcesos(capacidad_maxima) if modo_ejecucion == "procesos"
+            else self.procesador
+        )
         self.trabajos_activos = 0
         self.capacidad_maxima = capacidad_maxima
+        # Memoria estimada de los trabajos en curso frente al presupuesto (0 = sin límite)
+        self.presupuesto_memoria = presupuesto_memoria_mb * MB if presupuesto_memoria_mb > 0 else None
+        self.memoria_reservada = 0
+        # Trabajos que esperan slot cuando el nodo está lleno (tamaño_cola=0: rechazo inmediato)
+        self.cola = ColaEspera(tamaño_cola)
+        self.plazo_espera = plazo_espera
+        # Slots que sólo pueden ocupar los trabajos de prioridad 'interactiva'
+        self.reserva_interactiva = min(reserva_interactiva, capacidad_maxima - 1)
+        # Imágenes mayores se rechazan al sondear la cabecera (por defecto, el límite de Pillow)
+        self.max_pixeles = int(max_megapixeles * 1_000_000) if max_megapixeles else MAX_PIXELES
+        # Caché de resultados por hash de imagen + receta (cache_mb=0 la desactiva)
+        self.cache = (
+            CacheResultados(cache_mb * MB, directorio_cache, cache_disco_mb * MB)
+            if cache_mb > 0 else None
+        )
         self.lock = threading.Lock()
-        self.estadisticas = {
-            "trabajos_completados": 0,
-            "trabajos_fallidos": 0,
-            "tiempo_total_procesamiento": 0.0,
-            "ultima_actividad": None,
-            "inicio": datetime.now().isoformat()
-        }
+        self.condicion = threading.Condition(self.lock)
+        # Hilos que ejecutan los trabajos de lote ya admitidos (su turno espera en self.cola)
+        self._pool_hilos = ThreadPoolExecutor(
+            max_workers=capacidad_maxima,
+            thread_name_prefix=f"lote-{id_nodo}"
+        )
+        # Ídem para enviar_trabajo; su resultado espera en el almacén
+        self._pool_asincrono = ThreadPoolExecutor(
+            max_workers=capacidad_maxima,
+            thread_name_prefix=f"asincrono-{id_nodo}"
+        )
+        # Las entradas de los trabajos asíncronos pendientes esperan en memoria: se acotan en bytes
+        self.resultados = AlmacenResultados(
+            resultados_mb * MB, ttl_resultados, max_trabajos_asincronos,
+            max_entradas_asincronas_mb * MB
+        )
+        # Raíz de las referencias de procesar_referencia (None la desactiva)
+        self.directorio_compartido = (
+            os.path.realpath(directorio_compartido) if directorio_compartido else None
+        )
+        # Subidas fragmentadas en curso y resultados pendientes de descarga fragmentada
+        self.subidas = GestorSubidas(max_subidas_mb * MB, ttl_resultados, directorio_subidas)
+        self.descargas = AlmacenResultados(resultados_mb * MB, ttl_resultados, max_trabajos_asincronos)
+        # Histogramas de tiempos por etapa y por tipo de transformación
+        self.metricas = MetricasEtapas()
+        # Contadores con un shard por hilo: los trabajos no toman self.lock para actualizarlos
+        self.estadisticas = ContadoresPorHilo((
+            "trabajos_completados",
+            "trabajos_fallidos",
+            "trabajos_invalidos",
+            "tiempo_total_procesamiento",
+            "bytes_recibidos",
+            "bytes_enviados"
+        ))
+        self.ultima_actividad: Optional[str] = None
+        self.inicio = datetime.now().isoformat()
         
-        logger.info(f"Nodo {id_nodo} inicializado con capacidad: {capacidad_maxima}")
+        logger.info(
+            f"Nodo {id_nodo} inicializado con capacidad: {capacidad_maxima}, "
+            f"modo de ejecución: {modo_ejecucion}, "
+            f"presupuesto de memoria: {f'{presupuesto_memoria_mb} MB' if self.presupuesto_memoria else 'sin límite'}, "
+            f"cola de espera: {tamaño_cola}"
+        )
     
     # ==================== MÉTODOS EXPUESTOS VÍA PYRO5 ====================
     
@@ -54,38 +213,68 @@ class NodoWorker:
         """
         Retorna el estado actual del nodo.
         Llamado remotamente por el servidor FastAPI.
+        Sólo la ocupación y la cola se leen con self.lock; los contadores y
+        las cachés tienen su propia sincronización.
         """
         with self.lock:
-            tiempo_promedio = (
-                self.estadisticas["tiempo_total_procesamiento"] / 
-                self.estadisticas["trabajos_completados"]
-                if self.estadisticas["trabajos_completados"] > 0 else 0
-            )
-            
-            return {
-                "id_nodo": self.id_nodo,
-                "estado": self.estado,
-                "trabajos_activos": self.trabajos_activos,
-                "capacidad_maxima": self.capacidad_maxima,
-                "capacidad_disponible": self.capacidad_maxima - self.trabajos_activos,
-                "trabajos_completados": self.estadisticas["trabajos_completados"],
-                "trabajos_fallidos": self.estadisticas["trabajos_fallidos"],
-                "tiempo_promedio_procesamiento": round(tiempo_promedio, 2),
-                "ultima_actividad": self.estadisticas["ultima_actividad"],
-                "timestamp": datetime.now().isoformat()
-            }
+            estado = self.estado
+            trabajos_activos = self.trabajos_activos
+            memoria_reservada = self.memoria_reservada
+            cola = self.cola.estadisticas()
+        
+        contadores = self.estadisticas.valores()
+        tiempo_promedio = (
+            contadores["tiempo_total_procesamiento"] / contadores["trabajos_completados"]
+            if contadores["trabajos_completados"] > 0 else 0
+        )
+        
+        return {
+            "id_nodo": self.id_nodo,
+            "estado": estado,
+            "trabajos_activos": trabajos_activos,
+            "capacidad_maxima": self.capacidad_maxima,
+            "capacidad_disponible": self.capacidad_maxima - trabajos_activos,
+            "memoria_reservada_mb": round(memoria_reservada / MB, 1),
+            "presupuesto_memoria_mb": (
+                round(self.presupuesto_memoria / MB, 1) if self.presupuesto_memoria else None
+            ),
+            "modo_ejecucion": self.modo_ejecucion,
+            "cola": cola,
+            "reserva_interactiva": self.reserva_interactiva,
+            "trabajos_completados": contadores["trabajos_completados"],
+            "trabajos_fallidos": contadores["trabajos_fallidos"],
+            "trabajos_invalidos": contadores["trabajos_invalidos"],
+            "tiempo_promedio_procesamiento": round(tiempo_promedio, 2),
+            "bytes_recibidos": contadores["bytes_recibidos"],
+            "bytes_enviados": contadores["bytes_enviados"],
+            "ultima_actividad": self.ultima_actividad,
+            "cache": self.cache.estadisticas() if self.cache else None,
+            "tiempos_etapas": self.metricas.estadisticas(),
+            "trabajos_asincronos": self.resultados.estadisticas(),
+            "subidas": self.subidas.estadisticas(),
+            "descargas": self.descargas.estadisticas(),
+            # En modo 'procesos' cada proceso tiene su propia caché de intermedios
+            "cache_intermedios": (
+                self.procesador.estadisticas_cache() if self.modo_ejecucion == "hilos" else None
+            ),
+            "timestamp": datetime.now().isoformat()
+        }
     
     def esta_disponible(self) -> bool:
         """
         Verifica si el nodo puede aceptar más trabajos.
         Llamado por el balanceador de carga del servidor.
+        
+        Lee los campos sin tomar el lock: es una indicación orientativa que
+        no compite con _reservar_slot, que vuelve a comprobar la admisión
+        de forma atómica al recibir el trabajo.
         """
-        with self.lock:
-            disponible = (
-                self.estado == "activo" and 
-                self.trabajos_activos < self.capacidad_maxima
-            )
-            return disponible
+        return (
+            self.estado in ("activo", "procesando") and
+            self.trabajos_activos < self.capacidad_maxima and
+            len(self.cola) == 0 and
+            (self.presupuesto_memoria is None or self.memoria_reservada < self.presupuesto_memoria)
+        )
     
     def ping(self) -> Dict[str, Any]:
         """
@@ -107,135 +296,302 @@ class NodoWorker:
         id_trabajo: str, 
         nombre_archivo: str, 
         imagen_codificada: str, 
-        transformaciones: List[Dict]
+        transformaciones: List[Dict],
+        orden_estricto: bool = False,
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Procesa una imagen recibida como base64 y devuelve UNA imagen con todos los cambios.
         
+        Envoltorio de compatibilidad sobre procesar_binario: decodifica la
+        entrada y vuelve a codificar el resultado en base64.
+        
         Args:
             id_trabajo: ID único del trabajo
             nombre_archivo: Nombre original del archivo
             imagen_codificada: Imagen codificada en base64
             transformaciones: Lista de transformaciones a aplicar
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            plazo: Segundos máximos de espera en cola si el nodo está lleno
+            prioridad: 'interactiva', 'normal' o 'masiva'
+            cliente: Identificador del cliente/tenant para el reparto equitativo
             
         Returns:
             Dict con resultado del procesamiento incluyendo imagen codificada
         """
-        tiempo_inicio = datetime.now()
-        
-        # Validar disponibilidad antes de aceptar
-        if not self.esta_disponible():
-            logger.warning(
-                f"[{self.id_nodo}] Rechazando trabajo {id_trabajo} - "
-                f"Capacidad: {self.trabajos_activos}/{self.capacidad_maxima}"
-            )
+        inicio = time.perf_counter()
+        try:
+            imagen_bytes = base64.b64decode(imagen_codificada)
+        except Exception as e:
+            logger.error(f"[{self.id_nodo}] Error en trabajo {id_trabajo}: base64 inválido: {e}")
+            self.estadisticas.sumar(trabajos_fallidos=1)
+            self.ultima_actividad = datetime.now().isoformat()
             return {
                 "id_trabajo": id_trabajo,
                 "nodo": self.id_nodo,
                 "exito": False,
-                "error": "Nodo sin capacidad disponible",
+                "error": f"Error decodificando imagen base64: {e}",
                 "timestamp_fin": datetime.now().isoformat()
             }
         
+        tiempos = {"base64_entrada": round((time.perf_counter() - inicio) * 1000, 2)}
+        
+        resultado = self.procesar_binario(
+            id_trabajo=id_trabajo,
+            nombre_archivo=nombre_archivo,
+            imagen_bytes=imagen_bytes,
+            transformaciones=transformaciones,
+            orden_estricto=orden_estricto,
+            plazo=plazo,
+            prioridad=prioridad,
+            cliente=cliente
+        )
+        
+        if resultado.get("imagen_resultado") is not None:
+            inicio = time.perf_counter()
+            resultado["imagen_resultado"] = base64.b64encode(resultado["imagen_resultado"]).decode('utf-8')
+            tiempos["base64_salida"] = round((time.perf_counter() - inicio) * 1000, 2)
+        self.metricas.registrar(tiempos)
+        resultado.setdefault("tiempos_etapas", {}).update(tiempos)
+        return resultado
+    
+    def procesar_binario(
+        self, 
+        id_trabajo: str, 
+        nombre_archivo: str, 
+        imagen_bytes: bytes, 
+        transformaciones: List[Dict],
+        orden_estricto: bool = False,
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Procesa una imagen recibida como bytes crudos y devuelve el resultado en bytes.
+        
+        Evita el base64 en ambos sentidos. Con los serializadores 'marshal' o
+        'msgpack' de Pyro5 los bytes viajan sin inflar; con 'serpent' llegan
+        como dict base64, que se normaliza aquí.
+        
+        Args:
+            id_trabajo: ID único del trabajo
+            nombre_archivo: Nombre original del archivo
+            imagen_bytes: Contenido de la imagen (bytes, bytearray o memoryview)
+            transformaciones: Lista de transformaciones a aplicar
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            plazo: Segundos máximos de espera en cola si el nodo está lleno
+                (por defecto, plazo_espera del nodo)
+            prioridad: 'interactiva', 'normal' o 'masiva'; en cola entra
+                antes la clase más alta
+            cliente: Identificador del cliente/tenant; dentro de una clase
+                los clientes se turnan
+            
+        Returns:
+            Dict con resultado del procesamiento; 'imagen_resultado' son bytes
+            en el formato 'formato_resultado'
+        """
+        tiempo_inicio = datetime.now()
+        
+        # Normalizar una sola vez y validar la cabecera antes de ocupar nada
+        imagen_bytes, tiempo_transferencia, rechazo = self._normalizar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is not None:
+            return rechazo
+        cabecera, rechazo = self._validar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is not None:
+            return rechazo
+        
+        # Un acierto de caché no necesita slot
+        clave_cache, resultado = self._consultar_cache(
+            id_trabajo, imagen_bytes, transformaciones, orden_estricto, tiempo_inicio
+        )
+        if resultado is not None:
+            return resultado
+        
+        # Reservar slot y memoria de forma atómica (esperando en cola si la hay)
+        memoria = self._estimar_memoria(imagen_bytes, [transformaciones], cabecera)
+        motivo = self._reservar_slot(memoria=memoria, plazo=plazo, prioridad=prioridad, cliente=cliente)
+        if motivo is not None:
+            self._registrar_rechazo(id_trabajo, memoria, motivo)
+            return self._resultado_rechazo(id_trabajo, motivo)
+        
+        return self._ejecutar_trabajo(
+            id_trabajo, nombre_archivo, imagen_bytes, transformaciones, tiempo_inicio,
+            orden_estricto, clave_cache, memoria, tiempo_transferencia
+        )
+    
+    def procesar_lote(
+        self, 
+        trabajos: List[Any],
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Procesa varias imágenes en una sola llamada RPC.
+        Los trabajos se ejecutan en paralelo sin superar la capacidad del nodo;
+        los que no caben esperan su turno en la cola (por prioridad y
+        turnándose con otros clientes) en lugar de ser rechazados.
+        
+        Args:
+            trabajos: Lista de (id_trabajo, nombre_archivo, imagen_bytes, transformaciones),
+                      como tuplas/listas o dicts con esas claves. Admiten un
+                      quinto elemento / clave opcional 'orden_estricto'.
+            prioridad: Prioridad de todos los trabajos del lote
+            cliente: Identificador del cliente/tenant
+            
+        Returns:
+            Lista de resultados en el mismo orden que los trabajos recibidos
+        """
+        logger.info(f"[{self.id_nodo}] Recibido lote de {len(trabajos)} trabajos")
+        futuros = self._enviar_lote(trabajos, prioridad, cliente)
+        return [futuro.result() for futuro in futuros]
+    
+    def procesar_lote_stream(
+        self, 
+        trabajos: List[Any],
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Igual que procesar_lote, pero devuelve un iterador que entrega cada
+        resultado en cuanto termina (orden de finalización, no de envío).
+        Pyro5 transmite los elementos al cliente a medida que se generan
+        (ITER_STREAMING); si el cliente abandona el iterador, los trabajos
+        aún no iniciados se cancelan.
+        
+        Args:
+            trabajos: Lista de (id_trabajo, nombre_archivo, imagen_bytes, transformaciones)
+            prioridad: Prioridad de todos los trabajos del lote
+            cliente: Identificador del cliente/tenant
+            
+        Yields:
+            Resultado de cada trabajo, con la misma forma que procesar_binario
+        """
+        logger.info(f"[{self.id_nodo}] Recibido lote en streaming de {len(trabajos)} trabajos")
+        futuros = self._enviar_lote(trabajos, prioridad, cliente)
+        try:
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+    
+    def procesar_variantes(
+        self,
+        id_trabajo: str,
+        nombre_archivo: str,
+        imagen_bytes: bytes,
+        recetas: List[Any],
+        orden_estricto: bool = False,
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Genera varias versiones de una misma imagen en un único trabajo.
+        
+        La imagen se decodifica una sola vez y los pasos que comparten las
+        recetas (por ejemplo, un recorte común antes de varios tamaños) se
+        ejecutan una sola vez. Ocupa un único slot.
+        
+        Args:
+            id_trabajo: ID único del trabajo
+            nombre_archivo: Nombre original del archivo
+            imagen_bytes: Contenido de la imagen (bytes, bytearray o memoryview)
+            recetas: Lista de recetas; cada una es una lista de transformaciones
+                o un dict {'id': ..., 'transformaciones': [...]}
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            plazo: Segundos máximos de espera en cola si el nodo está lleno
+            prioridad: 'interactiva', 'normal' o 'masiva'
+            cliente: Identificador del cliente/tenant para el reparto equitativo
+            
+        Returns:
+            Dict con resultado del trabajo; 'variantes' es una lista con
+            {'id', 'exito', 'imagen_resultado', 'formato_resultado'} por receta,
+            en el mismo orden
+        """
+        tiempo_inicio = datetime.now()
+        recetas = [_desempaquetar_receta(r, i) for i, r in enumerate(recetas)]
+        
+        imagen_bytes, tiempo_transferencia, rechazo = self._normalizar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is not None:
+            return rechazo
+        cabecera, rechazo = self._validar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is not None:
+            return rechazo
+        
+        memoria = self._estimar_memoria(
+            imagen_bytes, [transformaciones for _, transformaciones in recetas], cabecera
+        )
+        motivo = self._reservar_slot(memoria=memoria, plazo=plazo, prioridad=prioridad, cliente=cliente)
+        if motivo is not None:
+            self._registrar_rechazo(id_trabajo, memoria, motivo)
+            return self._resultado_rechazo(id_trabajo, motivo)
+        
         logger.info(
             f"[{self.id_nodo}] Procesando trabajo: {id_trabajo} - "
-            f"Archivo: {nombre_archivo}, Transformaciones: {len(transformaciones)}"
+            f"Archivo: {nombre_archivo}, Variantes: {len(recetas)}"
         )
         
-        # Incrementar contador (thread-safe)
-        with self.lock:
-            self.trabajos_activos += 1
-            if self.trabajos_activos > 0:
-                self.estado = "procesando"
-            self.estadisticas["ultima_actividad"] = datetime.now().isoformat()
-        
         try:
-            # Decodificar imagen
-            try:
-                imagen_bytes = base64.b64decode(imagen_codificada)
-                logger.debug(f"[{id_trabajo}] Imagen decodificada: {len(imagen_bytes)} bytes")
-            except Exception as e:
-                raise ValueError(f"Error decodificando imagen base64: {e}")
+            inicio_procesamiento = time.time()
             
-            # Crear archivos temporales
-            temp_entrada = None
-            temp_salida = None
+            imagenes = self.ejecutor.procesar_variantes_bytes(
+                datos=imagen_bytes,
+                recetas=[transformaciones for _, transformaciones in recetas],
+                id_trabajo=id_trabajo,
+                orden_estricto=orden_estricto
+            )
             
-            try:
-                # Crear archivo temporal de entrada
-                extension = os.path.splitext(nombre_archivo)[1] or '.png'
-                with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as temp_entrada:
-                    temp_entrada.write(imagen_bytes)
-                    temp_entrada_path = temp_entrada.name
-                
-                # Crear archivo temporal de salida
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_salida:
-                    temp_salida_path = temp_salida.name
-                
-                # Procesar imagen - TODAS LAS TRANSFORMACIONES EN UNA SOLA IMAGEN
-                inicio_procesamiento = time.time()
-                
-                exito = self.procesador.procesar(
-                    ruta_entrada=temp_entrada_path,
-                    ruta_salida=temp_salida_path,
-                    lista_transformaciones=transformaciones,
-                    id_trabajo=id_trabajo
-                )
-                
-                tiempo_procesamiento = time.time() - inicio_procesamiento
-                
-                # Leer y codificar RESULTADO FINAL si fue exitoso
-                imagen_resultado_codificada = None
-                if exito and os.path.exists(temp_salida_path):
-                    with open(temp_salida_path, "rb") as f:
-                        imagen_resultado_codificada = base64.b64encode(f.read()).decode('utf-8')
-                    logger.debug(f"[{id_trabajo}] Imagen final codificada: {len(imagen_resultado_codificada)} caracteres")
-                
-                # Calcular tiempo total
-                tiempo_total = (datetime.now() - tiempo_inicio).total_seconds()
-                
-                # Actualizar estadísticas
-                with self.lock:
-                    if exito and imagen_resultado_codificada:
-                        self.estadisticas["trabajos_completados"] += 1
-                    else:
-                        self.estadisticas["trabajos_fallidos"] += 1
-                    self.estadisticas["tiempo_total_procesamiento"] += tiempo_procesamiento
-                    self.estadisticas["ultima_actividad"] = datetime.now().isoformat()
-                
-                resultado = {
-                    "id_trabajo": id_trabajo,
-                    "nodo": self.id_nodo,
-                    "exito": exito and bool(imagen_resultado_codificada),
-                    "imagen_resultado": imagen_resultado_codificada,  # ÚNICA IMAGEN CON TODOS LOS CAMBIOS
-                    "tiempo_procesamiento": round(tiempo_procesamiento, 2),
-                    "tiempo_total": round(tiempo_total, 2),
-                    "transformaciones_aplicadas": len(transformaciones),
-                    "timestamp_inicio": tiempo_inicio.isoformat(),
-                    "timestamp_fin": datetime.now().isoformat()
+            tiempo_procesamiento = time.time() - inicio_procesamiento
+            tiempos = self._registrar_tiempos(tiempo_transferencia)
+            variantes = [
+                {
+                    "id": id_variante,
+                    "exito": imagen is not None,
+                    "imagen_resultado": imagen,
+                    "formato_resultado": resolver_codificacion(transformaciones)["formato"]
                 }
-                
-                if exito and imagen_resultado_codificada:
-                    logger.info(
-                        f"[{self.id_nodo}] ✓ Trabajo {id_trabajo} completado - "
-                        f"{len(transformaciones)} transformaciones en {tiempo_procesamiento:.2f}s"
-                    )
-                else:
-                    error_msg = "Error procesando imagen - no se generó resultado final"
-                    logger.error(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} falló: {error_msg}")
-                    resultado["error"] = error_msg
-                
-                return resultado
-                
-            finally:
-                # Limpiar archivos temporales
-                try:
-                    if temp_entrada and os.path.exists(temp_entrada_path):
-                        os.unlink(temp_entrada_path)
-                    if temp_salida and os.path.exists(temp_salida_path):
-                        os.unlink(temp_salida_path)
-                except Exception as e:
-                    logger.warning(f"[{id_trabajo}] Error limpiando temporales: {e}")
+                for (id_variante, transformaciones), imagen in zip(recetas, imagenes)
+            ]
+            exito = all(v["exito"] for v in variantes)
+            tiempo_total = (datetime.now() - tiempo_inicio).total_seconds()
+            
+            self.estadisticas.sumar(
+                trabajos_completados=int(exito),
+                trabajos_fallidos=int(not exito),
+                tiempo_total_procesamiento=tiempo_procesamiento,
+                bytes_recibidos=len(imagen_bytes),
+                bytes_enviados=sum(len(i) for i in imagenes if i is not None)
+            )
+            self.ultima_actividad = datetime.now().isoformat()
+            self.metricas.registrar_trabajo(tiempo_total)
+            
+            resultado = {
+                "id_trabajo": id_trabajo,
+                "nodo": self.id_nodo,
+                "exito": exito,
+                "variantes": variantes,
+                "memoria_estimada_mb": round(memoria / MB, 1),
+                "tiempos_etapas": tiempos,
+                "tiempo_procesamiento": round(tiempo_procesamiento, 2),
+                "tiempo_total": round(tiempo_total, 2),
+                "timestamp_inicio": tiempo_inicio.isoformat(),
+                "timestamp_fin": datetime.now().isoformat()
+            }
+            
+            if exito:
+                logger.info(
+                    f"[{self.id_nodo}] ✓ Trabajo {id_trabajo} completado - "
+                    f"{len(variantes)} variantes en {tiempo_procesamiento:.2f}s"
+                )
+            else:
+                fallidas = [v["id"] for v in variantes if not v["exito"]]
+                resultado["error"] = f"No se generaron las variantes: {fallidas}"
+                logger.error(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} falló: {resultado['error']}")
+            
+            return resultado
             
         except Exception as e:
             tiempo_fin = datetime.now()
@@ -246,10 +602,8 @@ class NodoWorker:
                 exc_info=True
             )
             
-            with self.lock:
-                self.estadisticas["trabajos_fallidos"] += 1
-                self.estadisticas["tiempo_total_procesamiento"] += tiempo_total
-                self.estadisticas["ultima_actividad"] = tiempo_fin.isoformat()
+            self.estadisticas.sumar(trabajos_fallidos=1, tiempo_total_procesamiento=tiempo_total)
+            self.ultima_actividad = tiempo_fin.isoformat()
             
             return {
                 "id_trabajo": id_trabajo,
@@ -262,11 +616,353 @@ class NodoWorker:
             }
             
         finally:
-            # Decrementar contador
-            with self.lock:
-                self.trabajos_activos -= 1
-                if self.trabajos_activos == 0:
-                    self.estado = "activo"
+            self._liberar_slot(memoria)
+    
+    def enviar_trabajo(
+        self,
+        id_trabajo: str,
+        nombre_archivo: str,
+        imagen_bytes: bytes,
+        transformaciones: List[Dict],
+        orden_estricto: bool = False,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Encola un trabajo y responde de inmediato, sin esperar a que termine.
+        
+        La imagen se valida y su memoria se estima antes de aceptarla, y las
+        entradas pendientes se acotan en bytes (max_entradas_asincronas_mb).
+        El trabajo espera turno como los de un lote (sin plazo) y su resultado
+        queda en el nodo hasta que se recoge con obtener_resultado o caduca
+        (ttl_resultados). El id_trabajo es el identificador para consultarlo.
+        
+        Args:
+            id_trabajo: ID único del trabajo
+            nombre_archivo: Nombre original del archivo
+            imagen_bytes: Contenido de la imagen (bytes, bytearray o memoryview)
+            transformaciones: Lista de transformaciones a aplicar
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            prioridad: 'interactiva', 'normal' o 'masiva'
+            cliente: Identificador del cliente/tenant para el reparto equitativo
+            
+        Returns:
+            Dict con 'aceptado' y 'estado' ('en_cola'); si se rechazó, la
+            forma del rechazo de procesar_binario con 'aceptado' False
+        """
+        if self.estado not in ("activo", "procesando"):
+            motivo = f"Nodo no disponible (estado: {self.estado})"
+            logger.warning(f"[{self.id_nodo}] ✗ Trabajo asíncrono {id_trabajo} rechazado: {motivo}")
+            return dict(self._resultado_rechazo(id_trabajo, motivo), aceptado=False)
+        
+        imagen_bytes, tiempo_transferencia, rechazo = self._normalizar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is None:
+            cabecera, rechazo = self._validar_entrada(id_trabajo, imagen_bytes)
+        if rechazo is not None:
+            return dict(rechazo, aceptado=False)
+        memoria = self._estimar_memoria(imagen_bytes, [transformaciones], cabecera)
+        
+        motivo = self.resultados.registrar(id_trabajo, len(imagen_bytes))
+        if motivo is not None:
+            self._registrar_rechazo(id_trabajo, memoria, motivo)
+            return dict(self._resultado_rechazo(id_trabajo, motivo), aceptado=False)
+        
+        futuro = self._enviar_diferido(
+            self._pool_asincrono, id_trabajo, nombre_archivo, imagen_bytes, transformaciones,
+            orden_estricto, prioridad, cliente, cabecera, memoria, tiempo_transferencia,
+            al_iniciar=lambda: self.resultados.marcar_procesando(id_trabajo)
+        )
+        futuro.add_done_callback(lambda futuro: self.resultados.guardar(id_trabajo, futuro.result()))
+        logger.info(f"[{self.id_nodo}] Trabajo asíncrono {id_trabajo} encolado")
+        return {
+            "id_trabajo": id_trabajo,
+            "nodo": self.id_nodo,
+            "aceptado": True,
+            "estado": EN_COLA
+        }
+    
+    def consultar_trabajo(self, id_trabajo: str) -> Dict[str, Any]:
+        """
+        Estado de un trabajo de enviar_trabajo: 'en_cola', 'procesando',
+        'completado', 'fallido', 'descartado' (el resultado no cupo en el
+        almacén) o 'desconocido' (no existe, ya se recogió o caducó).
+        """
+        return {
+            "id_trabajo": id_trabajo,
+            "nodo": self.id_nodo,
+            "estado": self.resultados.consultar(id_trabajo)
+        }
+    
+    def obtener_resultado(self, id_trabajo: str, conservar: bool = False) -> Dict[str, Any]:
+        """
+        Resultado de un trabajo de enviar_trabajo, con la misma forma que el
+        de procesar_binario más su 'estado'.
+        
+        Args:
+            id_trabajo: ID del trabajo
+            conservar: No retirarlo del nodo (por defecto se libera al entregarlo)
+            
+        Returns:
+            Resultado del trabajo; si aún no ha terminado, 'exito' es False
+            y 'estado' indica en qué punto está
+        """
+        resultado = self.resultados.retirar(id_trabajo, conservar)
+        if resultado is not None:
+            return dict(resultado, estado=COMPLETADO if resultado.get("exito") else FALLIDO)
+        
+        estado = self.resultados.consultar(id_trabajo)
+        return {
+            "id_trabajo": id_trabajo,
+            "nodo": self.id_nodo,
+            "exito": False,
+            "estado": estado,
+            "error": f"Resultado no disponible (estado: {estado})"
+        }
+    
+    def procesar_referencia(
+        self,
+        id_trabajo: str,
+        ruta_entrada: str,
+        ruta_salida: str,
+        transformaciones: List[Dict],
+        orden_estricto: bool = False,
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Procesa una imagen del almacenamiento compartido sin que sus bytes
+        pasen por el canal RPC: lee la entrada con mmap y escribe el
+        resultado de forma atómica en ruta_salida.
+        
+        Las rutas son relativas a directorio_compartido (o absolutas / URIs
+        'file://' dentro de él); el modo está desactivado si el nodo no
+        tiene directorio_compartido.
+        
+        Args:
+            id_trabajo: ID único del trabajo
+            ruta_entrada: Referencia de la imagen de entrada
+            ruta_salida: Referencia donde escribir el resultado
+            transformaciones: Lista de transformaciones a aplicar
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            plazo: Segundos máximos de espera en cola si el nodo está lleno
+            prioridad: 'interactiva', 'normal' o 'masiva'
+            cliente: Identificador del cliente/tenant para el reparto equitativo
+            
+        Returns:
+            Dict con la misma forma que procesar_binario, pero sin
+            'imagen_resultado': en su lugar 'ruta_salida' y 'bytes_resultado'
+        """
+        if self.directorio_compartido is None:
+            return self._resultado_rechazo(id_trabajo, "Nodo sin directorio compartido configurado")
+        try:
+            entrada = resolver_referencia(ruta_entrada, self.directorio_compartido)
+            salida = resolver_referencia(ruta_salida, self.directorio_compartido)
+        except ValueError as e:
+            logger.warning(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} rechazado: {e}")
+            return self._resultado_rechazo(id_trabajo, str(e))
+        
+        try:
+            with mapear_lectura(entrada) as imagen_bytes:
+                resultado = self.procesar_binario(
+                    id_trabajo=id_trabajo,
+                    nombre_archivo=os.path.basename(entrada),
+                    imagen_bytes=imagen_bytes,
+                    transformaciones=transformaciones,
+                    orden_estricto=orden_estricto,
+                    plazo=plazo,
+                    prioridad=prioridad,
+                    cliente=cliente
+                )
+        except OSError as e:
+            logger.error(f"[{self.id_nodo}] Error leyendo {ruta_entrada} para {id_trabajo}: {e}")
+            self.estadisticas.sumar(trabajos_fallidos=1)
+            return self._resultado_rechazo(id_trabajo, f"Error leyendo la entrada: {e}")
+        
+        imagen_resultado = resultado.pop("imagen_resultado", None)
+        if not resultado.get("exito"):
+            return resultado
+        
+        inicio = time.perf_counter()
+        try:
+            resultado["bytes_resultado"] = escribir_atomico(salida, imagen_resultado)
+        except OSError as e:
+            logger.error(f"[{self.id_nodo}] Error escribiendo {ruta_salida} para {id_trabajo}: {e}")
+            # El trabajo ya se contó como completado al procesarlo
+            self.estadisticas.sumar(trabajos_completados=-1, trabajos_fallidos=1)
+            resultado.update(exito=False, error=f"Error escribiendo el resultado: {e}")
+            return resultado
+        tiempos = {"escritura_salida": round((time.perf_counter() - inicio) * 1000, 2)}
+        self.metricas.registrar(tiempos)
+        resultado.setdefault("tiempos_etapas", {}).update(tiempos)
+        resultado["ruta_salida"] = ruta_salida
+        return resultado
+    
+    def abrir_subida(self, tamaño_total: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Abre una subida fragmentada, para imágenes demasiado grandes para
+        enviarlas en un solo mensaje: después se envían los fragmentos en
+        orden con enviar_fragmento y se procesa con procesar_subida.
+        
+        Args:
+            tamaño_total: Tamaño de la imagen en bytes
+            sha256: Checksum hexadecimal de la imagen (o al llamar a procesar_subida)
+            
+        Returns:
+            Dict con 'id_subida' y el 'tamaño_fragmento' recomendado, o 'error'
+        """
+        try:
+            id_subida = self.subidas.abrir(tamaño_total, sha256)
+        except (ValueError, OSError) as e:
+            logger.warning(f"[{self.id_nodo}] ✗ Subida de {tamaño_total} bytes rechazada: {e}")
+            return {"nodo": self.id_nodo, "exito": False, "error": str(e)}
+        logger.info(f"[{self.id_nodo}] Subida {id_subida} abierta: {tamaño_total / MB:.1f} MB")
+        return {
+            "id_subida": id_subida,
+            "nodo": self.id_nodo,
+            "exito": True,
+            "tamaño_fragmento": TAMAÑO_FRAGMENTO
+        }
+    
+    def enviar_fragmento(self, id_subida: str, offset: int, datos: bytes) -> Dict[str, Any]:
+        """
+        Añade un fragmento a una subida. Los fragmentos van en orden; reenviar
+        uno ya recibido (un reintento) no tiene efecto.
+        
+        Returns:
+            Dict con los bytes 'recibidos' hasta ahora, o 'error'
+        """
+        try:
+            recibidos = self.subidas.escribir(id_subida, offset, _normalizar_bytes(datos))
+        except (TypeError, ValueError) as e:
+            return {"id_subida": id_subida, "nodo": self.id_nodo, "exito": False, "error": str(e)}
+        return {"id_subida": id_subida, "nodo": self.id_nodo, "exito": True, "recibidos": recibidos}
+    
+    def cancelar_subida(self, id_subida: str) -> Dict[str, Any]:
+        """Descarta una subida y libera su búfer"""
+        return {"id_subida": id_subida, "nodo": self.id_nodo, "exito": self.subidas.cancelar(id_subida)}
+    
+    def procesar_subida(
+        self,
+        id_trabajo: str,
+        id_subida: str,
+        nombre_archivo: str,
+        transformaciones: List[Dict],
+        sha256: Optional[str] = None,
+        orden_estricto: bool = False,
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Verifica el checksum de una subida completa y la procesa. El resultado
+        queda en el nodo para descargarlo por fragmentos con descargar_fragmento:
+        en memoria si es pequeño y, si no, en un archivo temporal dentro del
+        límite de las subidas (max_subidas_mb), no en el de resultados_mb.
+        
+        Args:
+            id_trabajo: ID único del trabajo
+            id_subida: ID devuelto por abrir_subida
+            nombre_archivo: Nombre original del archivo
+            transformaciones: Lista de transformaciones a aplicar
+            sha256: Checksum hexadecimal (si no se dio al abrir la subida)
+            orden_estricto: Aplicar las transformaciones tal cual, sin optimizarlas
+            plazo: Segundos máximos de espera en cola si el nodo está lleno
+            prioridad: 'interactiva', 'normal' o 'masiva'
+            cliente: Identificador del cliente/tenant para el reparto equitativo
+            
+        Returns:
+            Dict con la misma forma que procesar_binario, pero sin
+            'imagen_resultado': en su lugar 'id_descarga', 'bytes_resultado'
+            y 'sha256_resultado'
+        """
+        try:
+            with self.subidas.tomar(id_subida, sha256) as imagen_bytes:
+                resultado = self.procesar_binario(
+                    id_trabajo=id_trabajo,
+                    nombre_archivo=nombre_archivo,
+                    imagen_bytes=imagen_bytes,
+                    transformaciones=transformaciones,
+                    orden_estricto=orden_estricto,
+                    plazo=plazo,
+                    prioridad=prioridad,
+                    cliente=cliente
+                )
+        except ValueError as e:
+            logger.warning(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} rechazado: {e}")
+            return self._resultado_rechazo(id_trabajo, str(e))
+        
+        imagen_resultado = resultado.pop("imagen_resultado", None)
+        if not resultado.get("exito"):
+            return resultado
+        
+        if len(imagen_resultado) > min(UMBRAL_MEMORIA, self.descargas.max_bytes):
+            # Como las subidas grandes: a un archivo temporal, no al almacén en memoria
+            try:
+                id_descarga = self.subidas.guardar(imagen_resultado)
+            except (ValueError, OSError) as e:
+                # El trabajo ya se contó como completado al procesarlo
+                self.estadisticas.sumar(trabajos_completados=-1, trabajos_fallidos=1)
+                resultado.update(exito=False, error=f"No se pudo retener el resultado en el nodo: {e}")
+                return resultado
+        else:
+            id_descarga = uuid.uuid4().hex
+            self.descargas.guardar(id_descarga, {"exito": True, "imagen_resultado": imagen_resultado})
+        resultado.update(
+            id_descarga=id_descarga,
+            bytes_resultado=len(imagen_resultado),
+            sha256_resultado=hashlib.sha256(imagen_resultado).hexdigest(),
+            tamaño_fragmento=TAMAÑO_FRAGMENTO
+        )
+        return resultado
+    
+    def descargar_fragmento(
+        self, id_descarga: str, offset: int = 0, tamaño: int = TAMAÑO_FRAGMENTO
+    ) -> Dict[str, Any]:
+        """
+        Fragmento del resultado de procesar_subida. El resultado se conserva
+        hasta cerrar_descarga (o hasta que caduca), así que un fragmento se
+        puede volver a pedir.
+        
+        Returns:
+            Dict con 'datos' (bytes), 'offset', 'bytes_resultado' y 'fin'
+            (True en el último fragmento), o 'error'
+        """
+        guardado = self.descargas.retirar(id_descarga, conservar=True)
+        estado = self.descargas.consultar(id_descarga)
+        datos = None
+        if guardado is None and estado == DESCONOCIDO:
+            # Resultado volcado a un archivo temporal
+            try:
+                datos, total = self.subidas.leer(id_descarga, offset, tamaño)
+            except ValueError as e:
+                error = str(e)
+        elif guardado is None:
+            error = f"Descarga no disponible (estado: {estado})"
+        elif not 0 <= offset <= len(guardado["imagen_resultado"]) or tamaño <= 0:
+            error = f"Fragmento fuera de rango: offset {offset}, tamaño {tamaño}"
+        else:
+            total = len(guardado["imagen_resultado"])
+            datos = guardado["imagen_resultado"][offset:offset + tamaño]
+        if datos is not None:
+            return {
+                "id_descarga": id_descarga,
+                "nodo": self.id_nodo,
+                "exito": True,
+                "offset": offset,
+                "datos": datos,
+                "bytes_resultado": total,
+                "fin": offset + len(datos) >= total
+            }
+        return {"id_descarga": id_descarga, "nodo": self.id_nodo, "exito": False, "error": error}
+    
+    def cerrar_descarga(self, id_descarga: str) -> Dict[str, Any]:
+        """Libera el resultado de una descarga fragmentada"""
+        liberado = (
+            self.descargas.retirar(id_descarga) is not None
+            or self.subidas.cancelar(id_descarga, descarga=True)
+        )
+        return {"id_descarga": id_descarga, "nodo": self.id_nodo, "exito": liberado}
     
     def procesar(
         self, 
@@ -276,7 +972,8 @@ class NodoWorker:
         lista_transformaciones: list
     ) -> Dict[str, Any]:
         """
-        MÉTODO ORIGINAL - ahora usa transferencia de archivos internamente
+        MÉTODO ORIGINAL - ahora usa transferencia de archivos internamente.
+        Con almacenamiento compartido, usar procesar_referencia.
         """
         logger.warning(f"[{self.id_nodo}] Usando método obsoleto 'procesar' para {id_trabajo}")
         
@@ -284,16 +981,20 @@ class NodoWorker:
         try:
             if os.path.exists(ruta_entrada):
                 with open(ruta_entrada, "rb") as f:
-                    imagen_codificada = base64.b64encode(f.read()).decode('utf-8')
+                    imagen_bytes = f.read()
                 
                 nombre_archivo = os.path.basename(ruta_entrada)
                 
-                return self.procesar_con_archivo(
+                resultado = self.procesar_binario(
                     id_trabajo=id_trabajo,
                     nombre_archivo=nombre_archivo,
-                    imagen_codificada=imagen_codificada,
+                    imagen_bytes=imagen_bytes,
                     transformaciones=lista_transformaciones
                 )
+                # Mantener el contrato original: resultado en base64
+                if resultado.get("imagen_resultado") is not None:
+                    resultado["imagen_resultado"] = base64.b64encode(resultado["imagen_resultado"]).decode('utf-8')
+                return resultado
             else:
                 return {
                     "id_trabajo": id_trabajo,
@@ -313,12 +1014,526 @@ class NodoWorker:
     def detener(self) -> Dict[str, Any]:
         """Inicia shutdown ordenado del nodo"""
         logger.info(f"Nodo {self.id_nodo} iniciando detención...")
-        with self.lock:
+        with self.condicion:
             self.estado = "deteniendo"
+            # Los trabajos de lote y asíncronos en cola no llegan a ejecutarse
+            diferidos = self.cola.retirar_diferidos()
+            # Despertar a las llamadas en espera para que terminen
+            self.condicion.notify_all()
+        for turno in diferidos:
+            self._rechazar_diferido(turno.trabajo, "Nodo detenido antes de ejecutar el trabajo")
+        # Los ya admitidos que aún no han empezado se cancelan (ver _despachar)
+        self._pool_hilos.shutdown(wait=False, cancel_futures=True)
+        self._pool_asincrono.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self.ejecutor, EjecutorProcesos):
+            self.ejecutor.cerrar()
         return {
             "mensaje": f"Nodo {self.id_nodo} deteniendo",
             "trabajos_pendientes": self.trabajos_activos
         }
+    
+    # ==================== MÉTODOS INTERNOS ====================
+    
+    def _reservar_slot(
+        self, 
+        memoria: int = 0, 
+        plazo: Optional[float] = None,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Comprueba disponibilidad e incrementa trabajos_activos en una sola sección crítica.
+        Con presupuesto de memoria, reserva además la memoria estimada del trabajo.
+        
+        Si el nodo está lleno, el trabajo espera su turno en la cola (por
+        prioridad y turnándose entre clientes, ver ColaEspera): se rechaza de
+        inmediato si la cola está llena o desactivada, o si la espera prevista
+        supera el plazo; si no, espera como mucho 'plazo' segundos (por
+        defecto plazo_espera). Los trabajos de lote y asíncronos no pasan por
+        aquí: ver _enviar_diferido.
+        
+        Returns:
+            None si se reservó el slot; si no, el motivo del rechazo
+        """
+        if prioridad not in PRIORIDADES:
+            return f"Prioridad inválida: {prioridad}. Opciones: {', '.join(PRIORIDADES)}"
+        
+        with self.condicion:
+            if self.estado not in ("activo", "procesando"):
+                return f"Nodo no disponible (estado: {self.estado})"
+            
+            turno = Turno(memoria, prioridad, cliente)
+            # Los turnos de clases más bajas no le cierran el paso (p. ej. a un
+            # trabajo interactivo con su slot reservado libre)
+            if not self.cola.hay_por_delante(prioridad) and self._puede_admitir(memoria, prioridad):
+                self.cola.registrar_admision(turno, esperado=False)
+                self._admitir(memoria)
+                return None
+            
+            plazo = self.plazo_espera if plazo is None else plazo
+            if self.cola.tamaño_maximo == 0:
+                return "Nodo sin capacidad disponible"
+            if self.cola.llena():
+                self.cola.rechazos_cola_llena += 1
+                return "Nodo sin capacidad disponible (cola de espera llena)"
+            if self._espera_prevista() > plazo:
+                self.cola.rechazos_plazo += 1
+                return "Nodo sin capacidad disponible (espera prevista mayor que el plazo)"
+            limite = turno.llegada + plazo
+            
+            self.cola.agregar(turno)
+            try:
+                while True:
+                    if self.estado not in ("activo", "procesando"):
+                        return f"Nodo no disponible (estado: {self.estado})"
+                    if self.cola.siguiente() is turno and self._puede_admitir(memoria, prioridad):
+                        self.cola.quitar(turno)
+                        self.cola.registrar_admision(turno)
+                        self._admitir(memoria)
+                        return None
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.cola.rechazos_plazo += 1
+                        return "Nodo sin capacidad disponible (plazo de espera agotado)"
+                    self.condicion.wait(restante)
+            finally:
+                # Al salir (admitido o no) puede tocarle al siguiente de la cola
+                self.cola.quitar(turno)
+                self._despachar()
+                self.condicion.notify_all()
+    
+    def _puede_admitir(self, memoria: int, prioridad: str) -> bool:
+        """
+        Hay slot y memoria para el trabajo (llamar con el lock tomado).
+        Los slots de reserva_interactiva sólo los ocupa la prioridad 'interactiva'.
+        """
+        limite = self.capacidad_maxima
+        if prioridad != "interactiva":
+            limite -= self.reserva_interactiva
+        return self.trabajos_activos < limite and self._memoria_cabe(memoria)
+    
+    def _admitir(self, memoria: int):
+        """Ocupa un slot y la memoria del trabajo (llamar con el lock tomado)"""
+        self.trabajos_activos += 1
+        self.memoria_reservada += memoria
+        self.estado = "procesando"
+        self.ultima_actividad = datetime.now().isoformat()
+    
+    def _espera_prevista(self) -> float:
+        """
+        Segundos que tardaría en entrar un trabajo nuevo: tandas de
+        capacidad_maxima trabajos por delante a tiempo medio cada una
+        (llamar con el lock tomado).
+        """
+        if self.cola.tamaño_maximo == 0:
+            return 0.0
+        contadores = self.estadisticas.valores()
+        completados = contadores["trabajos_completados"]
+        if completados == 0:
+            return 0.0
+        tiempo_medio = contadores["tiempo_total_procesamiento"] / completados
+        tandas = len(self.cola) // self.capacidad_maxima + 1
+        return tandas * tiempo_medio
+    
+    def _liberar_slot(self, memoria: int = 0):
+        """Libera un slot y su memoria y despierta a los trabajos en espera"""
+        with self.condicion:
+            self.trabajos_activos -= 1
+            self.memoria_reservada -= memoria
+            if self.trabajos_activos == 0 and self.estado == "procesando":
+                self.estado = "activo"
+            self._despachar()
+            # Con presupuesto de memoria, el que cabe no tiene por qué ser el primero
+            self.condicion.notify_all()
+    
+    def _memoria_cabe(self, memoria: int) -> bool:
+        """
+        Si la memoria estimada cabe en el presupuesto (llamar con el lock tomado).
+        Con el nodo vacío se admite cualquier trabajo, para que los que superan
+        el presupuesto no queden bloqueados para siempre.
+        """
+        return (
+            self.presupuesto_memoria is None or
+            self.trabajos_activos == 0 or
+            self.memoria_reservada + memoria <= self.presupuesto_memoria
+        )
+    
+    def _normalizar_entrada(self, id_trabajo: str, imagen_bytes) -> tuple:
+        """
+        Convierte la carga recibida por Pyro5 en bytes, una sola vez por
+        trabajo: el resto de etapas reciben ya el resultado. Con 'serpent'
+        es aquí donde se decodifica el base64 ('transferencia_entrada').
+        
+        Returns:
+            Tupla (datos, segundos empleados, None) o (None, 0, resultado de rechazo)
+        """
+        inicio = time.perf_counter()
+        try:
+            datos = _normalizar_bytes(imagen_bytes)
+        except TypeError as e:
+            return None, 0.0, self._rechazar_entrada(id_trabajo, str(e))
+        return datos, time.perf_counter() - inicio, None
+    
+    def _validar_entrada(self, id_trabajo: str, imagen_bytes) -> tuple:
+        """
+        Sondea la cabecera de la imagen (ya normalizada) sin decodificarla y
+        rechaza datos corruptos, formatos no soportados e imágenes demasiado
+        grandes.
+        
+        Returns:
+            Tupla (cabecera, None) si es válida o (None, resultado de rechazo)
+        """
+        cabecera, motivo = sondear(imagen_bytes, self.max_pixeles)
+        if motivo is None:
+            return cabecera, None
+        return None, self._rechazar_entrada(id_trabajo, motivo)
+    
+    def _rechazar_entrada(self, id_trabajo: str, motivo: str) -> Dict[str, Any]:
+        """Rechazo de una entrada inválida, contado en 'trabajos_invalidos'"""
+        logger.warning(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} rechazado: {motivo}")
+        self.estadisticas.sumar(trabajos_fallidos=1, trabajos_invalidos=1)
+        self.ultima_actividad = datetime.now().isoformat()
+        return self._resultado_rechazo(id_trabajo, motivo)
+    
+    def _estimar_memoria(self, imagen_bytes, recetas: List[List[Dict]],
+                         cabecera: Optional[Dict[str, Any]] = None) -> int:
+        """Pico de memoria estimado (bytes) para la imagen y la receta más cara"""
+        try:
+            cabecera = cabecera or leer_cabecera(imagen_bytes)
+            return max(estimar_memoria(imagen_bytes, receta, cabecera) for receta in recetas or [[]])
+        except Exception:
+            # Entrada inválida: el error se reporta al procesarla
+            return 0
+    
+    def _registrar_rechazo(self, id_trabajo: str, memoria: int, motivo: str):
+        logger.warning(
+            f"[{self.id_nodo}] Rechazando trabajo {id_trabajo} - {motivo} - "
+            f"Capacidad: {self.trabajos_activos}/{self.capacidad_maxima}, "
+            f"en cola: {len(self.cola)}, "
+            f"memoria: {self.memoria_reservada / MB:.0f}+{memoria / MB:.0f} MB"
+            + (f" de {self.presupuesto_memoria / MB:.0f} MB" if self.presupuesto_memoria else "")
+        )
+    
+    def _resultado_rechazo(self, id_trabajo: str, error: str) -> Dict[str, Any]:
+        """Resultado para un trabajo que no llegó a ejecutarse"""
+        return {
+            "id_trabajo": id_trabajo,
+            "nodo": self.id_nodo,
+            "exito": False,
+            "error": error,
+            "timestamp_fin": datetime.now().isoformat()
+        }
+    
+    def _enviar_lote(self, trabajos: List[Any], prioridad: str, cliente: Optional[str]) -> List[Future]:
+        """Pone en la cola el turno de cada trabajo del lote"""
+        futuros = []
+        for i, trabajo in enumerate(trabajos):
+            try:
+                argumentos = _desempaquetar_trabajo(trabajo)
+            except (TypeError, ValueError, KeyError) as e:
+                futuro = Future()
+                futuro.set_result(self._resultado_rechazo(f"lote[{i}]", f"Trabajo mal formado: {e}"))
+                futuros.append(futuro)
+                continue
+            futuros.append(self._enviar_diferido(self._pool_hilos, *argumentos, prioridad, cliente))
+        return futuros
+    
+    def _enviar_diferido(
+        self,
+        pool: ThreadPoolExecutor,
+        id_trabajo: str,
+        nombre_archivo: str,
+        imagen_bytes: bytes,
+        transformaciones: List[Dict],
+        orden_estricto: bool = False,
+        prioridad: str = PRIORIDAD_POR_DEFECTO,
+        cliente: Optional[str] = None,
+        cabecera: Optional[Dict[str, Any]] = None,
+        memoria: Optional[int] = None,
+        tiempo_transferencia: float = 0.0,
+        al_iniciar=None
+    ) -> Future:
+        """
+        Valida un trabajo de lote o asíncrono, consulta la caché y pone su
+        turno en la cola sin esperar: _despachar lo envía a 'pool' cuando le
+        toca. Con 'cabecera' y 'memoria' la entrada ya se normalizó, validó y
+        estimó.
+        
+        Returns:
+            Futuro con el resultado del trabajo (o su rechazo)
+        """
+        futuro = Future()
+        tiempo_inicio = datetime.now()
+        if cabecera is None:
+            imagen_bytes, tiempo_transferencia, rechazo = self._normalizar_entrada(id_trabajo, imagen_bytes)
+            if rechazo is None:
+                cabecera, rechazo = self._validar_entrada(id_trabajo, imagen_bytes)
+            if rechazo is not None:
+                futuro.set_result(rechazo)
+                return futuro
+        clave_cache, resultado = self._consultar_cache(
+            id_trabajo, imagen_bytes, transformaciones, orden_estricto, tiempo_inicio
+        )
+        if resultado is not None:
+            futuro.set_result(resultado)
+            return futuro
+        if prioridad not in PRIORIDADES:
+            futuro.set_result(self._resultado_rechazo(
+                id_trabajo, f"Prioridad inválida: {prioridad}. Opciones: {', '.join(PRIORIDADES)}"
+            ))
+            return futuro
+        if memoria is None:
+            memoria = self._estimar_memoria(imagen_bytes, [transformaciones], cabecera)
+        
+        trabajo = _TrabajoDiferido(pool, (
+            id_trabajo, nombre_archivo, imagen_bytes, transformaciones, tiempo_inicio,
+            orden_estricto, clave_cache, memoria, tiempo_transferencia
+        ), al_iniciar)
+        turno = Turno(memoria, prioridad, cliente, trabajo)
+        with self.condicion:
+            if self.estado not in ("activo", "procesando"):
+                trabajo.futuro.set_result(
+                    self._resultado_rechazo(id_trabajo, f"Nodo no disponible (estado: {self.estado})")
+                )
+                return trabajo.futuro
+            self.cola.agregar(turno)
+            self._despachar()
+        # Un trabajo cancelado (p. ej. por procesar_lote_stream) deja la cola
+        trabajo.futuro.add_done_callback(lambda futuro: self._retirar_si_cancelado(turno, futuro))
+        return trabajo.futuro
+    
+    def _despachar(self):
+        """
+        Admite y envía a su pool los trabajos diferidos a los que les toca
+        entrar (llamar con el lock tomado). Se detiene en el primer turno que
+        no cabe o que es de una llamada síncrona, que entra por sí misma al
+        despertarla notify_all.
+        """
+        while self.estado in ("activo", "procesando"):
+            turno = self.cola.siguiente()
+            if turno is None or turno.trabajo is None:
+                return
+            if turno.trabajo.futuro.cancelled():
+                self.cola.quitar(turno)
+                continue
+            if not self._puede_admitir(turno.memoria, turno.prioridad):
+                return
+            self.cola.quitar(turno)
+            if not turno.trabajo.futuro.set_running_or_notify_cancel():
+                continue
+            self.cola.registrar_admision(turno)
+            self._admitir(turno.memoria)
+            ejecucion = turno.trabajo.pool.submit(self._ejecutar_diferido, turno)
+            # detener() cancela los admitidos que aún no han empezado: devuelven su slot
+            ejecucion.add_done_callback(
+                lambda ejecucion, turno=turno: self._liberar_si_cancelado(turno, ejecucion)
+            )
+    
+    def _ejecutar_diferido(self, turno: Turno):
+        """Ejecuta un trabajo diferido ya admitido y resuelve su futuro"""
+        trabajo = turno.trabajo
+        if trabajo.al_iniciar is not None:
+            trabajo.al_iniciar()
+        try:
+            resultado = self._ejecutar_trabajo(*trabajo.argumentos)
+        except Exception as e:
+            logger.error(f"[{self.id_nodo}] Error en trabajo {trabajo.argumentos[0]}: {e}", exc_info=True)
+            resultado = self._resultado_rechazo(trabajo.argumentos[0], str(e))
+        trabajo.futuro.set_result(resultado)
+    
+    def _retirar_si_cancelado(self, turno: Turno, futuro: Future):
+        """Saca de la cola el turno de un trabajo diferido cancelado"""
+        if not futuro.cancelled():
+            return
+        with self.condicion:
+            if self.cola.quitar(turno):
+                self._despachar()
+                self.condicion.notify_all()
+    
+    def _liberar_si_cancelado(self, turno: Turno, ejecucion: Future):
+        """Devuelve el slot de un trabajo admitido cuya ejecución se canceló antes de empezar"""
+        if not ejecucion.cancelled():
+            return
+        self._liberar_slot(turno.memoria)
+        self._rechazar_diferido(turno.trabajo, "Nodo detenido antes de ejecutar el trabajo")
+    
+    def _rechazar_diferido(self, trabajo: _TrabajoDiferido, motivo: str):
+        try:
+            trabajo.futuro.set_result(self._resultado_rechazo(trabajo.argumentos[0], motivo))
+        except InvalidStateError:
+            # El cliente lo canceló entretanto
+            pass
+    
+    def _registrar_tiempos(self, tiempo_transferencia: float) -> Dict[str, Any]:
+        """
+        Tiempos por etapa del trabajo recién ejecutado en este hilo más la
+        recepción de los bytes ('transferencia_entrada'); se añaden a los
+        histogramas del nodo.
+        """
+        tiempos = self.ejecutor.ultimos_tiempos()
+        tiempos["transferencia_entrada"] = round(tiempo_transferencia * 1000, 2)
+        self.metricas.registrar(tiempos)
+        return tiempos
+    
+    def _consultar_cache(
+        self, 
+        id_trabajo: str, 
+        imagen_bytes: bytes, 
+        transformaciones: List[Dict],
+        orden_estricto: bool,
+        tiempo_inicio: datetime
+    ):
+        """
+        Busca el resultado en la caché.
+        
+        Returns:
+            Tupla (clave de caché o None, resultado completo si hubo acierto o None)
+        """
+        if self.cache is None:
+            return None, None
+        try:
+            clave = clave_resultado(imagen_bytes, transformaciones, orden_estricto=orden_estricto)
+        except Exception:
+            # Entrada inválida: el error se reporta al procesarla
+            return None, None
+        
+        imagen_resultado = self.cache.obtener(clave)
+        if imagen_resultado is None:
+            return clave, None
+        
+        tiempo_total = (datetime.now() - tiempo_inicio).total_seconds()
+        self.estadisticas.sumar(
+            trabajos_completados=1, bytes_recibidos=len(imagen_bytes), bytes_enviados=len(imagen_resultado)
+        )
+        self.ultima_actividad = datetime.now().isoformat()
+        self.metricas.registrar_trabajo(tiempo_total)
+        
+        logger.info(f"[{self.id_nodo}] ✓ Trabajo {id_trabajo} servido desde caché")
+        return clave, {
+            "id_trabajo": id_trabajo,
+            "nodo": self.id_nodo,
+            "exito": True,
+            "imagen_resultado": imagen_resultado,
+            "formato_resultado": resolver_codificacion(transformaciones)["formato"],
+            "desde_cache": True,
+            "tiempo_procesamiento": 0.0,
+            "tiempo_total": round(tiempo_total, 2),
+            "transformaciones_aplicadas": len(transformaciones),
+            "timestamp_inicio": tiempo_inicio.isoformat(),
+            "timestamp_fin": datetime.now().isoformat()
+        }
+    
+    def _ejecutar_trabajo(
+        self, 
+        id_trabajo: str, 
+        nombre_archivo: str, 
+        imagen_bytes: bytes, 
+        transformaciones: List[Dict],
+        tiempo_inicio: datetime,
+        orden_estricto: bool = False,
+        clave_cache: Optional[str] = None,
+        memoria: int = 0,
+        tiempo_transferencia: float = 0.0
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta un trabajo que ya tiene un slot (y 'memoria' bytes) reservados.
+        Siempre los libera al terminar. 'imagen_bytes' ya está normalizada
+        (ver _normalizar_entrada), que tardó 'tiempo_transferencia' segundos.
+        """
+        logger.info(
+            f"[{self.id_nodo}] Procesando trabajo: {id_trabajo} - "
+            f"Archivo: {nombre_archivo}, Transformaciones: {len(transformaciones)}"
+        )
+        
+        try:
+            logger.debug(f"[{id_trabajo}] Imagen recibida: {len(imagen_bytes)} bytes")
+            
+            # Procesar imagen en memoria - TODAS LAS TRANSFORMACIONES EN UNA SOLA IMAGEN
+            inicio_procesamiento = time.time()
+            
+            imagen_resultado = self.ejecutor.procesar_bytes(
+                datos=imagen_bytes,
+                lista_transformaciones=transformaciones,
+                id_trabajo=id_trabajo,
+                orden_estricto=orden_estricto
+            )
+            
+            tiempo_procesamiento = time.time() - inicio_procesamiento
+            tiempos = self._registrar_tiempos(tiempo_transferencia)
+            exito = imagen_resultado is not None
+            if exito:
+                logger.debug(f"[{id_trabajo}] Imagen final: {len(imagen_resultado)} bytes")
+                if clave_cache is not None:
+                    self.cache.guardar(clave_cache, imagen_resultado)
+            
+            # Calcular tiempo total
+            tiempo_total = (datetime.now() - tiempo_inicio).total_seconds()
+            
+            # Actualizar estadísticas
+            completado = bool(exito and imagen_resultado)
+            self.estadisticas.sumar(
+                trabajos_completados=int(completado),
+                trabajos_fallidos=int(not completado),
+                tiempo_total_procesamiento=tiempo_procesamiento,
+                bytes_recibidos=len(imagen_bytes),
+                bytes_enviados=len(imagen_resultado or b"")
+            )
+            self.ultima_actividad = datetime.now().isoformat()
+            self.metricas.registrar_trabajo(tiempo_total)
+            
+            resultado = {
+                "id_trabajo": id_trabajo,
+                "nodo": self.id_nodo,
+                "exito": exito and bool(imagen_resultado),
+                "imagen_resultado": imagen_resultado,  # ÚNICA IMAGEN CON TODOS LOS CAMBIOS
+                "formato_resultado": resolver_codificacion(transformaciones)["formato"],
+                "desde_cache": False,
+                "memoria_estimada_mb": round(memoria / MB, 1),
+                "tiempo_procesamiento": round(tiempo_procesamiento, 2),
+                "tiempos_etapas": tiempos,
+                "tiempo_total": round(tiempo_total, 2),
+                "transformaciones_aplicadas": len(transformaciones),
+                "timestamp_inicio": tiempo_inicio.isoformat(),
+                "timestamp_fin": datetime.now().isoformat()
+            }
+            
+            if exito and imagen_resultado:
+                logger.info(
+                    f"[{self.id_nodo}] ✓ Trabajo {id_trabajo} completado - "
+                    f"{len(transformaciones)} transformaciones en {tiempo_procesamiento:.2f}s"
+                )
+            else:
+                error_msg = "Error procesando imagen - no se generó resultado final"
+                logger.error(f"[{self.id_nodo}] ✗ Trabajo {id_trabajo} falló: {error_msg}")
+                resultado["error"] = error_msg
+            
+            return resultado
+            
+        except Exception as e:
+            tiempo_fin = datetime.now()
+            tiempo_total = (tiempo_fin - tiempo_inicio).total_seconds()
+            
+            logger.error(
+                f"[{self.id_nodo}] Error en trabajo {id_trabajo}: {e}",
+                exc_info=True
+            )
+            
+            self.estadisticas.sumar(trabajos_fallidos=1, tiempo_total_procesamiento=tiempo_total)
+            self.ultima_actividad = tiempo_fin.isoformat()
+            
+            return {
+                "id_trabajo": id_trabajo,
+                "nodo": self.id_nodo,
+                "exito": False,
+                "error": str(e),
+                "tiempo_total": round(tiempo_total, 2),
+                "timestamp_inicio": tiempo_inicio.isoformat(),
+                "timestamp_fin": tiempo_fin.isoformat()
+            }
+            
+        finally:
+            # Decrementar contador y liberar la memoria reservada
+            self._liberar_slot(memoria)
 
 
 # ==================== FUNCIONES DE INICIALIZACIÓN ====================
@@ -376,16 +1591,25 @@ def main():
     
     if len(sys.argv) < 2:
         print("Argumentos insuficientes\n")
-        print("Uso: python nodo_worker.py <id_nodo> [capacidad] [host] [puerto]")
+        print("Uso: python nodo_worker.py <id_nodo> [capacidad] [host] [puerto] [modo] [memoria_mb] [cola] [puerto_metricas] [directorio_compartido]")
         print("\nEjemplos:")
         print("  python nodo_worker.py worker01")
         print("  python nodo_worker.py worker01 10")
         print("  python nodo_worker.py worker01 10 0.0.0.0 9090")
+        print("  python nodo_worker.py worker01 16 0.0.0.0 9090 procesos")
+        print("  python nodo_worker.py worker01 32 0.0.0.0 9090 hilos 4096 20")
+        print("  python nodo_worker.py worker01 32 0.0.0.0 9090 hilos 4096 20 9100")
+        print("  python nodo_worker.py worker01 32 0.0.0.0 9090 hilos 4096 20 0 /mnt/imagenes")
         print("\nParámetros:")
         print("  id_nodo   : Identificador único (ej: worker01)")
         print("  capacidad : Trabajos concurrentes (default: 5)")
         print("  host      : IP para bind (default: localhost)")
         print("  puerto    : Puerto RPC (default: auto)")
+        print("  modo      : hilos | procesos (default: hilos)")
+        print("  memoria_mb: Presupuesto de memoria de los trabajos en curso (default: 0, sin límite)")
+        print("  cola      : Trabajos que pueden esperar slot en lugar de rechazarse (default: 0)")
+        print("  puerto_metricas: Puerto HTTP de /metrics en formato Prometheus (default: 0, desactivado)")
+        print("  directorio_compartido: Raíz de las rutas de procesar_referencia (default: desactivado)")
         print()
         sys.exit(1)
 
@@ -394,12 +1618,24 @@ def main():
     capacidad = int(sys.argv[2]) if len(sys.argv) > 2 else 5
     host = sys.argv[3] if len(sys.argv) > 3 else "localhost"
     puerto = int(sys.argv[4]) if len(sys.argv) > 4 else 0  # 0 = auto
+    modo = sys.argv[5] if len(sys.argv) > 5 else "hilos"
+    memoria_mb = int(sys.argv[6]) if len(sys.argv) > 6 else 0
+    tamaño_cola = int(sys.argv[7]) if len(sys.argv) > 7 else 0
+    puerto_metricas = int(sys.argv[8]) if len(sys.argv) > 8 else 0
+    directorio_compartido = sys.argv[9] if len(sys.argv) > 9 else None
+    if modo not in MODOS_EJECUCION:
+        print(f"Modo inválido: {modo}. Opciones: {', '.join(MODOS_EJECUCION)}\n")
+        sys.exit(1)
     
     print(f"Configuración:")
     print(f"  ID Nodo   : {id_nodo}")
     print(f"  Capacidad : {capacidad} trabajos concurrentes")
     print(f"  Host      : {host}")
     print(f"  Puerto    : {puerto if puerto > 0 else 'automático'}")
+    print(f"  Modo      : {modo}")
+    print(f"  Memoria   : {f'{memoria_mb} MB' if memoria_mb > 0 else 'sin límite'}")
+    print(f"  Cola      : {tamaño_cola} trabajos en espera")
+    print(f"  Métricas  : {f'puerto {puerto_metricas}' if puerto_metricas > 0 else 'desactivadas'}")
     print()
     
     # Validar dependencias
@@ -408,10 +1644,20 @@ def main():
     print()
     
     # Crear nodo
-    nodo = NodoWorker(id_nodo, capacidad)
+    nodo = NodoWorker(
+        id_nodo, capacidad, modo,
+        presupuesto_memoria_mb=memoria_mb,
+        tamaño_cola=tamaño_cola,
+        directorio_compartido=directorio_compartido
+    )
     daemon = None
+    exportador = None
 
     try:
+        if puerto_metricas > 0:
+            exportador = ExportadorMetricas(nodo, host, puerto_metricas)
+            exportador.iniciar()
+        
         # Configurar daemon Pyro5
         logger.info(f"Configurando daemon Pyro5 en {host}...")
         if puerto > 0:
@@ -437,6 +1683,9 @@ def main():
         print(f"Nombre NS     : {nombre_registro}")
         print(f"Estado        : {nodo.estado}")
         print(f"Capacidad     : {capacidad} trabajos concurrentes")
+        print(f"Modo          : {modo}")
+        if exportador is not None:
+            print(f"Métricas      : http://{host}:{exportador.puerto}/metrics")
         print(f"\nTransformaciones disponibles:")
         for trans in sorted(nodo.procesador.transformaciones.keys()):
             print(f"  • {trans}")
@@ -463,6 +1712,8 @@ def main():
         
     except KeyboardInterrupt:
         print("\n\n Shutdown ordenado iniciado...")
+        if exportador:
+            exportador.detener()
         if daemon:
             nodo.detener()
             daemon.shutdown()
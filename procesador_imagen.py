@@ -3,10 +3,16 @@ Procesador de imágenes para nodos workers
 Implementa transformaciones usando Pillow (PIL)
 """
 
+import hashlib
+import io
+import json
+import math
 import os
-from PIL import Image, ImageFilter, ImageEnhance
+import threading
+from PIL import Image, ImageFile, ImageFilter, ImageEnhance
 from typing import Dict, List, Any, Optional
 from utils.logger import get_logger
+from utils.metricas import Cronometro
 
 # Importar todas las transformaciones
 from transformaciones.escala_grises import EscalaGrises
@@ -19,9 +25,37 @@ from transformaciones.perfilar import Perfilar
 from transformaciones.brillo_contraste import BrilloContraste
 from transformaciones.marca_agua import MarcaAgua
 from transformaciones.convertir_formato import ConvertirFormato
+from transformaciones.transponer import Transponer
+from transformaciones.ajustes_puntuales import AjustesPuntuales
+from utils.codificacion import formato_paso, opciones_guardado, resolver_codificacion
+from utils.jpeg_sin_perdida import transponer_jpeg
+from utils.cache import CacheIntermedios
+from utils.lector_memoria import LectorMemoria
+from utils.optimizador_pipeline import optimizar_transformaciones, reduccion_inicial, transposicion_equivalente
+from utils.teselado import aplicar_por_franjas, halo_paso
 
 logger = get_logger("ProcesadorImagen")
 
+# Reducción mínima (original / destino) para decodificar a menor resolución
+FACTOR_MINIMO_REDUCCION = 2.0
+
+
+def _construir_arbol(planes: List[List[Dict]]) -> Dict:
+    """
+    Árbol de prefijos de recetas. Cada nodo tiene 'hijos' (paso serializado ->
+    (paso, nodo)) y 'finales' (índices de las recetas que terminan en él).
+    """
+    raiz = {"hijos": {}, "finales": []}
+    for indice, plan in enumerate(planes):
+        nodo = raiz
+        for paso in plan:
+            clave = json.dumps(paso, sort_keys=True, default=str)
+            if clave not in nodo["hijos"]:
+                nodo["hijos"][clave] = (paso, {"hijos": {}, "finales": []})
+            nodo = nodo["hijos"][clave][1]
+        nodo["finales"].append(indice)
+    return raiz
+
 
 class ProcesadorImagenesImpl:
     """
@@ -29,7 +63,25 @@ class ProcesadorImagenesImpl:
     Aplica transformaciones usando la biblioteca Pillow.
     """
     
-    def __init__(self):
+    def __init__(self, optimizar_pipeline: bool = True, decodificacion_reducida: bool = True,
+                 cache_intermedios_mb: int = 128, ttl_intermedios: float = 60.0,
+                 umbral_teselado_mpx: float = 24.0, evitar_recodificacion: bool = True):
+        # Reescribir la lista de transformaciones antes de ejecutarla
+        self.optimizar_pipeline = optimizar_pipeline
+        # Decodificar sólo la resolución necesaria cuando el pipeline reduce la imagen
+        self.decodificacion_reducida = decodificacion_reducida
+        # Imágenes decodificadas/intermedias por prefijo de receta (0 la desactiva)
+        self.cache_intermedios = (
+            CacheIntermedios(cache_intermedios_mb * 1024 * 1024, ttl_intermedios)
+            if cache_intermedios_mb > 0 else None
+        )
+        # Por encima de este tamaño, los pasos teselables se ejecutan por franjas (0 lo desactiva)
+        self.umbral_teselado = int(umbral_teselado_mpx * 1_000_000) if umbral_teselado_mpx > 0 else None
+        # Devolver la entrada tal cual (o transpuesta sin pérdida) si la receta no cambia los píxeles
+        self.evitar_recodificacion = evitar_recodificacion
+        # Cronómetro del trabajo en curso de cada hilo (ver ultimos_tiempos)
+        self._local = threading.local()
+        
         # Diccionario de transformaciones disponibles con mapeo desde el frontend
         self.transformaciones = {
             # Mapeo de IDs del frontend a clases de transformación
@@ -44,13 +96,18 @@ class ProcesadorImagenesImpl:
             'flop': Reflejar,
             'resize': Redimensionar,
             'crop': Recortar,
-            'convert_format': ConvertirFormato
+            'convert_format': ConvertirFormato,
+            # Generadas por el optimizador al fusionar giros y reflejos
+            # y al compilar ajustes puntuales consecutivos
+            'transpose': Transponer,
+            'point_ops': AjustesPuntuales
         }
         
         logger.info(f"Procesador inicializado con {len(self.transformaciones)} transformaciones")
 
     def procesar(self, ruta_entrada: str, ruta_salida: str, 
-                 lista_transformaciones: List[Dict], id_trabajo: str = None) -> bool:
+                 lista_transformaciones: List[Dict], id_trabajo: str = None,
+                 orden_estricto: bool = False) -> bool:
         """
         Procesa una imagen aplicando una lista de transformaciones.
         Devuelve UNA SOLA imagen con todos los cambios aplicados.
@@ -60,11 +117,13 @@ class ProcesadorImagenesImpl:
             ruta_salida: Ruta donde guardar el resultado
             lista_transformaciones: Lista de dicts con 'tipo' y 'parametros' del frontend
             id_trabajo: ID del trabajo para logging
+            orden_estricto: Aplicar la lista tal cual, sin optimizarla
             
         Returns:
             bool: True si el procesamiento fue exitoso
         """
         id_trabajo = id_trabajo or "desconocido"
+        cronometro = self._iniciar_cronometro()
         
         try:
             logger.info(f"[Trabajo {id_trabajo}] Procesando imagen con {len(lista_transformaciones)} transformaciones")
@@ -76,34 +135,9 @@ class ProcesadorImagenesImpl:
             
             # Abrir imagen
             with Image.open(ruta_entrada) as img:
-                # Convertir a RGB si es necesario (para JPEG)
-                if img.mode in ('P', 'RGBA', 'LA'):
-                    img = img.convert('RGB')
-                
-                logger.info(f"[Trabajo {id_trabajo}] Imagen original: {img.size}px, formato: {img.format}")
-                
-                # Aplicar transformaciones en orden - SOBRE LA MISMA IMAGEN
-                transformaciones_aplicadas = []
-                for i, transformacion in enumerate(lista_transformaciones):
-                    tipo_frontend = transformacion.get('tipo')  # ID del frontend
-                    parametros = transformacion.get('parametros', {})
-                    
-                    # Mapear tipo del frontend a clase de transformación
-                    if tipo_frontend in self.transformaciones:
-                        clase_transformacion = self.transformaciones[tipo_frontend]
-                        
-                        # Para flip/flop, pasar el tipo como parámetro
-                        if tipo_frontend in ['flip', 'flop']:
-                            parametros['tipo'] = tipo_frontend
-                        
-                        logger.debug(f"[Trabajo {id_trabajo}] Aplicando transformación {i+1}: {tipo_frontend} con parámetros: {parametros}")
-                        
-                        # Aplicar la transformación
-                        img = clase_transformacion.aplicar(img, parametros)
-                        transformaciones_aplicadas.append(tipo_frontend)
-                    else:
-                        logger.warning(f"[Trabajo {id_trabajo}] Transformación no soportada: {tipo_frontend}, omitiendo")
-                        continue
+                img, transformaciones_aplicadas = self._aplicar_transformaciones(
+                    img, lista_transformaciones, id_trabajo, orden_estricto
+                )
                 
                 # Crear directorio de salida si no existe
                 os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
@@ -111,17 +145,14 @@ class ProcesadorImagenesImpl:
                 # Guardar ÚNICA imagen resultante con todos los cambios
                 logger.info(f"[Trabajo {id_trabajo}] Guardando imagen final: {ruta_salida}")
                 
-                # Determinar formato basado en extensión
+                # Formato de la receta (convert_format) o, si no lo indica, de la extensión
                 formato = 'PNG'
                 if ruta_salida.lower().endswith('.jpg') or ruta_salida.lower().endswith('.jpeg'):
                     formato = 'JPEG'
-                    img.save(ruta_salida, format=formato, quality=95, optimize=True)
                 elif ruta_salida.lower().endswith('.webp'):
                     formato = 'WEBP'
-                    img.save(ruta_salida, format=formato, quality=95)
-                else:
-                    # Por defecto PNG
-                    img.save(ruta_salida, format='PNG', optimize=True)
+                with cronometro.etapa('codificacion'):
+                    self._guardar(img, ruta_salida, resolver_codificacion(lista_transformaciones, formato))
                 
                 # Verificar que el archivo se creó correctamente
                 if os.path.exists(ruta_salida):
@@ -138,4 +169,475 @@ class ProcesadorImagenesImpl:
                     
         except Exception as e:
             logger.error(f"[Trabajo {id_trabajo}] Error procesando imagen: {e}", exc_info=True)
-            return False
\ No newline at end of file
+            return False
+
+    def procesar_bytes(self, datos, lista_transformaciones: List[Dict],
+                       id_trabajo: str = None, formato: str = 'PNG',
+                       orden_estricto: bool = False) -> Optional[bytes]:
+        """
+        Procesa una imagen en memoria, sin pasar por disco.
+        
+        Args:
+            datos: Imagen de entrada (bytes, bytearray, memoryview o archivo en memoria)
+            lista_transformaciones: Lista de dicts con 'tipo' y 'parametros' del frontend
+            id_trabajo: ID del trabajo para logging
+            formato: Formato de salida ('PNG', 'JPEG' o 'WEBP') si la receta no
+                tiene paso 'convert_format' (ver utils.codificacion)
+            orden_estricto: Aplicar la lista tal cual, sin optimizarla
+            
+        Returns:
+            bytes de la imagen resultante, o None si el procesamiento falló
+        """
+        id_trabajo = id_trabajo or "desconocido"
+        cronometro = self._iniciar_cronometro()
+        lector = None
+        
+        try:
+            logger.info(f"[Trabajo {id_trabajo}] Procesando imagen con {len(lista_transformaciones)} transformaciones")
+            
+            if hasattr(datos, 'read'):
+                fuente, clave_fuente = datos, None
+            else:
+                if not orden_estricto:
+                    with cronometro.etapa('sin_recodificar'):
+                        resultado = self._resultado_sin_recodificar(datos, lista_transformaciones, formato, id_trabajo)
+                    if resultado is not None:
+                        return resultado
+                fuente = lector = LectorMemoria(datos)
+                clave_fuente = (
+                    hashlib.blake2b(datos, digest_size=20).hexdigest()
+                    if self.cache_intermedios is not None else None
+                )
+            
+            with Image.open(fuente) as img:
+                img, transformaciones_aplicadas = self._aplicar_transformaciones(
+                    img, lista_transformaciones, id_trabajo, orden_estricto, clave_fuente
+                )
+                
+                with cronometro.etapa('codificacion'):
+                    salida = io.BytesIO()
+                    self._guardar(img, salida, resolver_codificacion(lista_transformaciones, formato))
+                    resultado = salida.getvalue()
+                
+                logger.info(
+                    f"[Trabajo {id_trabajo}] ✓ Procesamiento completado. "
+                    f"Transformaciones aplicadas: {len(transformaciones_aplicadas)}. "
+                    f"Resultado: {len(resultado)/1024:.2f} KB"
+                )
+                return resultado
+                
+        except Exception as e:
+            logger.error(f"[Trabajo {id_trabajo}] Error procesando imagen: {e}", exc_info=True)
+            return None
+        finally:
+            if lector is not None:
+                lector.close()
+
+    def procesar_variantes_bytes(self, datos, recetas: List[List[Dict]], id_trabajo: str = None,
+                                 formato: str = 'PNG', orden_estricto: bool = False) -> List[Optional[bytes]]:
+        """
+        Genera varias versiones de una misma imagen decodificándola una sola vez.
+        Las recetas (ya planificadas) se organizan en un árbol de prefijos, de
+        modo que los pasos comunes a varias ramas se ejecutan una sola vez y
+        las recetas idénticas comparten también la codificación.
+        
+        Args:
+            datos: Imagen de entrada (bytes, bytearray, memoryview o archivo en memoria)
+            recetas: Lista de listas de transformaciones, una por variante
+            id_trabajo: ID del trabajo para logging
+            formato: Formato de salida de las recetas sin paso 'convert_format'
+            orden_estricto: Aplicar cada lista tal cual, sin optimizarla
+            
+        Returns:
+            Lista con los bytes de cada variante (None en las que fallaron), en el orden de 'recetas'
+        """
+        id_trabajo = id_trabajo or "desconocido"
+        resultados: List[Optional[bytes]] = [None] * len(recetas)
+        cronometro = self._iniciar_cronometro()
+        lector = None
+        
+        try:
+            logger.info(f"[Trabajo {id_trabajo}] Generando {len(recetas)} variantes")
+            
+            fuente = datos if hasattr(datos, 'read') else LectorMemoria(datos)
+            lector = None if fuente is datos else fuente
+            with Image.open(fuente) as img:
+                logger.info(f"[Trabajo {id_trabajo}] Imagen original: {img.size}px, formato: {img.format}")
+                planes = [
+                    self._planificar(receta, img.size, id_trabajo, orden_estricto)
+                    for receta in recetas
+                ]
+                
+                with cronometro.etapa('decodificacion'):
+                    img.load()
+                    # Convertir a RGB si es necesario (para JPEG)
+                    if img.mode in ('P', 'RGBA', 'LA'):
+                        img = img.convert('RGB')
+                
+                raiz = _construir_arbol(planes)
+                self._recorrer_arbol(img, raiz, resultados, resolver_codificacion([], formato),
+                                     formato, id_trabajo, 1)
+            
+            logger.info(
+                f"[Trabajo {id_trabajo}] ✓ Variantes completadas: "
+                f"{sum(r is not None for r in resultados)}/{len(recetas)}"
+            )
+            
+        except Exception as e:
+            logger.error(f"[Trabajo {id_trabajo}] Error generando variantes: {e}", exc_info=True)
+        finally:
+            if lector is not None:
+                lector.close()
+        
+        return resultados
+
+    def _recorrer_arbol(self, img: Image.Image, nodo: Dict, resultados: List[Optional[bytes]],
+                        codificacion: Dict, formato: str, id_trabajo: str, profundidad: int):
+        """
+        Codifica las variantes que terminan en este nodo y desciende a cada rama.
+        'codificacion' es la del camino hasta el nodo: la fija el último
+        'convert_format' recorrido o, si no hay ninguno, 'formato'.
+        """
+        cronometro = self._cronometro()
+        if nodo["finales"]:
+            try:
+                with cronometro.etapa('codificacion'):
+                    salida = io.BytesIO()
+                    self._guardar(img, salida, codificacion)
+                    codificada = salida.getvalue()
+            except Exception as e:
+                logger.error(f"[Trabajo {id_trabajo}] Error codificando variantes {nodo['finales']}: {e}")
+                codificada = None
+            for indice in nodo["finales"]:
+                resultados[indice] = codificada
+        
+        for paso, hijo in nodo["hijos"].values():
+            try:
+                with cronometro.transformacion(paso.get('tipo')):
+                    img_rama, _ = self._aplicar_paso(img, dict(paso, parametros=dict(paso.get('parametros') or {})),
+                                                     id_trabajo, profundidad)
+            except Exception as e:
+                logger.error(f"[Trabajo {id_trabajo}] Error en rama de variantes: {e}")
+                continue
+            codificacion_rama = (
+                resolver_codificacion([paso], formato) if paso.get('tipo') == 'convert_format'
+                else codificacion
+            )
+            self._recorrer_arbol(img_rama, hijo, resultados, codificacion_rama, formato,
+                                 id_trabajo, profundidad + 1)
+
+    def _aplicar_transformaciones(self, img: Image.Image, lista_transformaciones: List[Dict],
+                                  id_trabajo: str, orden_estricto: bool = False,
+                                  clave_fuente: Optional[str] = None):
+        """
+        Aplica las transformaciones en orden sobre la misma imagen.
+        Salvo orden_estricto, la lista se optimiza antes (ver optimizador_pipeline)
+        y, si empieza reduciendo la imagen, se decodifica a menor resolución.
+        La imagen debe llegar sin cargar (recién abierta) para poder usar draft().
+        
+        Con clave_fuente (hash de los bytes de entrada) se reanuda desde el
+        estado intermedio cacheado más profundo de la receta y se guardan los
+        nuevos estados para las siguientes variantes de la misma imagen.
+        
+        Returns:
+            Tupla (imagen resultante, lista de tipos aplicados)
+        """
+        tamaño_original = img.size
+        cronometro = self._cronometro()
+        logger.info(f"[Trabajo {id_trabajo}] Imagen original: {img.size}px, formato: {img.format}")
+        
+        lista_transformaciones = self._planificar(lista_transformaciones, img.size, id_trabajo, orden_estricto)
+        reducir = self.decodificacion_reducida and not orden_estricto
+        
+        claves = None
+        cacheada = None
+        if clave_fuente is not None and self.cache_intermedios is not None:
+            claves = self._claves_prefijos(clave_fuente, lista_transformaciones, orden_estricto)
+            hechos, cacheada = self.cache_intermedios.obtener_mas_profundo(claves)
+        
+        if cacheada is not None:
+            logger.info(
+                f"[Trabajo {id_trabajo}] Reanudando desde estado cacheado: "
+                f"{hechos}/{len(lista_transformaciones)} pasos ya aplicados"
+            )
+            img = cacheada
+            tamaño_referencia = img.size
+        else:
+            hechos = 0
+            with cronometro.etapa('decodificacion'):
+                if reducir:
+                    img = self._decodificar_reducido(img, lista_transformaciones, id_trabajo)
+                img.load()
+                
+                # Convertir a RGB si es necesario (para JPEG)
+                if img.mode in ('P', 'RGBA', 'LA'):
+                    img = img.convert('RGB')
+            
+            # La imagen decodificada sólo se comparte si está a resolución completa
+            if claves is not None and img.size == tamaño_original:
+                self._guardar_intermedio(claves[0], img)
+            tamaño_referencia = tamaño_original
+        
+        restante = lista_transformaciones[hechos:]
+        cubiertos_primero = 1
+        if reducir:
+            with cronometro.etapa('decodificacion'):
+                img, restante, cubiertos_primero = self._reducir_region(
+                    img, restante, tamaño_referencia, id_trabajo
+                )
+        
+        # Aplicar transformaciones en orden - SOBRE LA MISMA IMAGEN
+        transformaciones_aplicadas = []
+        i = 0
+        while i < len(restante):
+            fin = self._fin_tramo_teselable(img, restante, i)
+            if fin > i:
+                # Imagen grande: el tramo se aplica por franjas sin intermedios completos
+                tramo = restante[i:fin]
+                logger.info(
+                    f"[Trabajo {id_trabajo}] Aplicando {len(tramo)} transformaciones por franjas "
+                    f"({img.width}x{img.height}px)"
+                )
+                with cronometro.transformacion('por_franjas'):
+                    img = aplicar_por_franjas(
+                        img, tramo, lambda franja, paso: self._aplicar_paso(franja, paso, id_trabajo, i + 1)[0]
+                    )
+                aplicada = True
+                transformaciones_aplicadas.extend(paso.get('tipo') for paso in tramo)
+                hechos += (cubiertos_primero - 1 if i == 0 else 0) + len(tramo)
+                i = fin
+            else:
+                hechos += cubiertos_primero if i == 0 else 1
+                with cronometro.transformacion(restante[i].get('tipo')):
+                    img, aplicada = self._aplicar_paso(img, restante[i], id_trabajo, i + 1)
+                if aplicada:
+                    transformaciones_aplicadas.append(restante[i].get('tipo'))
+                i += 1
+            
+            if aplicada and claves is not None:
+                self._guardar_intermedio(claves[hechos], img)
+        
+        return img, transformaciones_aplicadas
+
+    def ultimos_tiempos(self) -> Dict[str, Any]:
+        """
+        Tiempos por etapa del último trabajo procesado en este hilo, en ms:
+        'decodificacion', 'codificacion', 'sin_recodificar' y, bajo
+        'transformaciones', el de cada tipo de transformación (ver utils.metricas).
+        """
+        cronometro = getattr(self._local, 'cronometro', None)
+        return cronometro.tiempos() if cronometro is not None else {}
+
+    def _iniciar_cronometro(self) -> Cronometro:
+        self._local.cronometro = Cronometro()
+        return self._local.cronometro
+
+    def _cronometro(self) -> Cronometro:
+        cronometro = getattr(self._local, 'cronometro', None)
+        return cronometro if cronometro is not None else self._iniciar_cronometro()
+
+    def _fin_tramo_teselable(self, img: Image.Image, pasos: List[Dict], inicio: int) -> int:
+        """
+        Índice final (exclusivo) del tramo de pasos teselables que empieza en
+        'inicio', o 'inicio' si la imagen no supera el umbral de teselado.
+        """
+        if self.umbral_teselado is None or img.width * img.height < self.umbral_teselado:
+            return inicio
+        fin = inicio
+        while fin < len(pasos) and halo_paso(pasos[fin]) is not None:
+            fin += 1
+        return fin
+
+    def _aplicar_paso(self, img: Image.Image, transformacion: Dict, id_trabajo: str, numero: int):
+        """
+        Aplica una transformación de la lista.
+        
+        Returns:
+            Tupla (imagen resultante, True si el tipo está soportado)
+        """
+        tipo_frontend = transformacion.get('tipo')  # ID del frontend
+        parametros = transformacion.get('parametros', {})
+        
+        # Mapear tipo del frontend a clase de transformación
+        if tipo_frontend not in self.transformaciones:
+            logger.warning(f"[Trabajo {id_trabajo}] Transformación no soportada: {tipo_frontend}, omitiendo")
+            return img, False
+        
+        clase_transformacion = self.transformaciones[tipo_frontend]
+        
+        # Para flip/flop, pasar el tipo como parámetro
+        if tipo_frontend in ['flip', 'flop']:
+            parametros['tipo'] = tipo_frontend
+        
+        logger.debug(f"[Trabajo {id_trabajo}] Aplicando transformación {numero}: {tipo_frontend} con parámetros: {parametros}")
+        
+        # Aplicar la transformación
+        return clase_transformacion.aplicar(img, parametros), True
+
+    def _resultado_sin_recodificar(self, datos, lista_transformaciones: List[Dict],
+                                   formato: str, id_trabajo: str) -> Optional[bytes]:
+        """
+        Resultado sin decodificar los píxeles, leyendo sólo la cabecera, cuando
+        la receta (ya sin pasos nulos) no cambia la imagen y el formato de
+        salida es el de entrada: se devuelven los bytes originales. Si sólo
+        gira múltiplos de 90° o refleja un JPEG, se transpone sin pérdida
+        con jpegtran cuando está instalado.
+        
+        Returns:
+            bytes del resultado, o None si hay que procesar la imagen
+        """
+        if not self.evitar_recodificacion:
+            return None
+        
+        with LectorMemoria(datos) as lector, Image.open(lector) as img:
+            formato_entrada, modo, tamaño = img.format, img.mode, img.size
+            fotogramas = getattr(img, "n_frames", 1)
+        
+        # Sólo modos que el pipeline no convierte al decodificar, y un único fotograma
+        if fotogramas != 1 or modo not in ('RGB', 'L'):
+            return None
+        if resolver_codificacion(lista_transformaciones, formato)["formato"] != formato_entrada:
+            return None
+        
+        pasos = self._planificar(lista_transformaciones, tamaño, id_trabajo, False)
+        resto = []
+        for paso in pasos:
+            if paso.get('tipo') != 'convert_format':
+                resto.append(paso)
+                continue
+            # Un cambio de formato sin opciones de codificación que no toque el modo
+            parametros = paso.get('parametros') or {}
+            formato_destino = formato_paso(parametros)
+            if set(parametros) - {'formato'} or formato_destino == 'PNG':
+                return None
+            if formato_destino == 'JPEG' and modo != 'RGB':
+                return None
+        
+        metodo = transposicion_equivalente(resto)
+        if metodo == "":
+            logger.info(f"[Trabajo {id_trabajo}] Receta sin efecto: se devuelve la imagen original")
+            return bytes(datos)
+        if metodo and formato_entrada == 'JPEG':
+            resultado = transponer_jpeg(bytes(datos), metodo)
+            if resultado is not None:
+                logger.info(f"[Trabajo {id_trabajo}] Transposición {metodo} sin pérdida con jpegtran")
+            return resultado
+        return None
+
+    def _planificar(self, lista_transformaciones: List[Dict], tamaño, id_trabajo: str,
+                    orden_estricto: bool) -> List[Dict]:
+        """Lista de transformaciones a ejecutar (optimizada salvo orden_estricto)"""
+        if not self.optimizar_pipeline or orden_estricto:
+            return lista_transformaciones
+        
+        lista_optimizada = optimizar_transformaciones(lista_transformaciones, tamaño)
+        if len(lista_optimizada) != len(lista_transformaciones):
+            logger.info(
+                f"[Trabajo {id_trabajo}] Pipeline optimizado: "
+                f"{len(lista_transformaciones)} -> {len(lista_optimizada)} pasos"
+            )
+        return lista_optimizada
+
+    @staticmethod
+    def _claves_prefijos(clave_fuente: str, lista_transformaciones: List[Dict],
+                         orden_estricto: bool) -> List[tuple]:
+        """Clave de caché de intermedios para cada prefijo (índice k = tras k pasos)"""
+        pasos = [json.dumps(paso, sort_keys=True, default=str) for paso in lista_transformaciones]
+        return [(clave_fuente, orden_estricto, tuple(pasos[:k])) for k in range(len(pasos) + 1)]
+
+    def _guardar_intermedio(self, clave: tuple, img: Image.Image):
+        """Guarda un estado intermedio, separándolo del archivo de origen si hace falta"""
+        if isinstance(img, ImageFile.ImageFile):
+            # Imagen ligada al archivo abierto: se cierra al terminar el trabajo
+            if not self.cache_intermedios.cabe(img):
+                return
+            img = img.copy()
+        self.cache_intermedios.guardar(clave, img)
+
+    def estadisticas_cache(self) -> Optional[Dict[str, Any]]:
+        """Estadísticas de la caché de intermedios, o None si está desactivada"""
+        return self.cache_intermedios.estadisticas() if self.cache_intermedios else None
+
+    @staticmethod
+    def _decodificar_reducido(img: Image.Image, lista_transformaciones: List[Dict],
+                              id_trabajo: str) -> Image.Image:
+        """
+        Para JPEG, pide a libjpeg que decodifique ya escalado (1/2, 1/4 o 1/8)
+        con Image.draft(), sin bajar de la resolución que necesita el redimensionado.
+        """
+        if img.format != 'JPEG':
+            return img
+        reduccion = reduccion_inicial(lista_transformaciones, img.size)
+        if reduccion is None:
+            return img
+        
+        caja, destino, _ = reduccion
+        factor = min((caja[2] - caja[0]) / destino[0], (caja[3] - caja[1]) / destino[1])
+        if factor < FACTOR_MINIMO_REDUCCION:
+            return img
+        
+        solicitado = (math.ceil(img.width / factor), math.ceil(img.height / factor))
+        tamaño_previo = img.size
+        img.draft(None, solicitado)
+        if img.size != tamaño_previo:
+            logger.info(f"[Trabajo {id_trabajo}] Decodificación reducida JPEG: {tamaño_previo} -> {img.size}")
+        return img
+
+    @staticmethod
+    def _reducir_region(img: Image.Image, lista_transformaciones: List[Dict],
+                        tamaño_original, id_trabajo: str):
+        """
+        Resuelve el recorte y el redimensionado iniciales sobre la imagen ya
+        decodificada: traslada la caja del recorte a la escala del draft y, si
+        sigue sobrando resolución, usa Image.reduce() (promedio por bloques)
+        sobre esa región antes del LANCZOS final.
+        
+        Returns:
+            Tupla (imagen, lista de transformaciones restante, pasos de la
+            lista original que cubre el primer paso devuelto)
+        """
+        reduccion = reduccion_inicial(lista_transformaciones, tamaño_original)
+        if reduccion is None:
+            return img, lista_transformaciones, 1
+        
+        caja, destino, num_pasos = reduccion
+        escala = max(1, round(tamaño_original[0] / img.width))
+        caja = (
+            caja[0] // escala,
+            caja[1] // escala,
+            min(img.width, math.ceil(caja[2] / escala)),
+            min(img.height, math.ceil(caja[3] / escala))
+        )
+        ancho_region, alto_region = caja[2] - caja[0], caja[3] - caja[1]
+        factor = (
+            int(ancho_region / destino[0] / FACTOR_MINIMO_REDUCCION) or 1,
+            int(alto_region / destino[1] / FACTOR_MINIMO_REDUCCION) or 1
+        )
+        region_completa = caja == (0, 0) + img.size
+        
+        if factor != (1, 1):
+            try:
+                img = img.reduce(factor, box=caja)
+            except ValueError:
+                # Modo no soportado por reduce(): recortar sin reducir
+                img = img if region_completa else img.crop(caja)
+        elif escala > 1 and not region_completa:
+            img = img.crop(caja)
+        elif escala == 1:
+            # Ni draft ni reduce: ejecutar el pipeline tal cual
+            return img, lista_transformaciones, 1
+        
+        logger.debug(f"[Trabajo {id_trabajo}] Región inicial resuelta a {img.size}px, destino {destino}")
+        redimensionar = {"tipo": "resize", "parametros": {"ancho": destino[0], "alto": destino[1]}}
+        return img, [redimensionar] + list(lista_transformaciones[num_pasos:]), num_pasos
+
+    @staticmethod
+    def _guardar(img: Image.Image, destino, codificacion: Dict):
+        """
+        Guarda la imagen en una ruta o archivo en memoria con el formato y las
+        opciones de codificación indicados (ver utils.codificacion.resolver_codificacion)
+        """
+        if codificacion["formato"] == 'JPEG' and img.mode not in ('RGB', 'L', 'CMYK'):
+            # JPEG no admite transparencia ni paleta
+            img = img.convert('RGB')
+        img.save(destino, **opciones_guardado(codificacion))
@@ -4,6 +4,21 @@ import requests
 import Pyro5.api
 import sys
 import os
+import base64
+import hashlib
+import io
+import tempfile
+import threading
+import tracemalloc
+import urllib.request
+from PIL import Image, ImageChops
+
+from nodo_worker import NodoWorker, MB
+from utils import subidas
+from utils.cola_trabajos import ColaEspera, Turno
+from utils.ejecutor_procesos import EjecutorProcesos
+from utils.exportador_metricas import ExportadorMetricas
+from utils.sondeo_imagen import estimar_memoria
 
 def test_nodo_worker_corregido():
     print("=== TEST NODO WORKER CORREGIDO ===")
@@ -127,5 +142,699 @@ def test_nodo_worker_corregido():
     
     return True
 
+
+# ==================== PRUEBAS LOCALES (SIN PYRO5) ====================
+
+def codificar(img, formato='PNG'):
+    buffer = io.BytesIO()
+    img.save(buffer, format=formato)
+    return buffer.getvalue()
+
+
+class EjecutorRetenido:
+    """Ejecutor que deja esperando los trabajos indicados hasta liberar()"""
+
+    def __init__(self, ejecutor, retenidos):
+        self.ejecutor = ejecutor
+        self.retenidos = set(retenidos)
+        self.iniciado = threading.Event()
+        self.liberado = threading.Event()
+        # Orden en que empezaron los trabajos
+        self.iniciados = []
+
+    def procesar_bytes(self, datos, lista_transformaciones, id_trabajo=None, orden_estricto=False):
+        self.iniciados.append(id_trabajo)
+        if id_trabajo in self.retenidos:
+            self.iniciado.set()
+            self.liberado.wait(10)
+        return self.ejecutor.procesar_bytes(
+            datos, lista_transformaciones, id_trabajo=id_trabajo, orden_estricto=orden_estricto
+        )
+
+    def ultimos_tiempos(self):
+        return self.ejecutor.ultimos_tiempos()
+
+    def liberar(self):
+        self.liberado.set()
+
+
+def ocupar_slot(nodo, id_trabajo, imagen_bytes, transformaciones=(), **opciones):
+    """Lanza un trabajo que ocupa un slot hasta liberar el ejecutor devuelto"""
+    ejecutor = EjecutorRetenido(nodo.procesador, {id_trabajo})
+    nodo.ejecutor = ejecutor
+    hilo = threading.Thread(
+        target=nodo.procesar_binario,
+        args=(id_trabajo, "x.png", imagen_bytes, list(transformaciones)),
+        kwargs=opciones
+    )
+    hilo.start()
+    assert ejecutor.iniciado.wait(10)
+    return ejecutor, hilo
+
+
+def test_procesar_binario_local():
+    imagen_bytes = codificar(Image.new('RGB', (80, 60), color='green'))
+    nodo = NodoWorker("worker_test", capacidad_maxima=2)
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 40}}]
+
+    # Bytes crudos de ida y vuelta
+    resultado = nodo.procesar_binario("test_bin_01", "verde.png", imagen_bytes, transformaciones)
+    assert resultado["exito"], resultado
+    assert isinstance(resultado["imagen_resultado"], bytes)
+    with Image.open(io.BytesIO(resultado["imagen_resultado"])) as img:
+        assert img.size == (40, 30)
+
+    # Forma en que serpent entrega los bytes
+    serpent_dict = {"data": base64.b64encode(imagen_bytes).decode(), "encoding": "base64"}
+    resultado = nodo.procesar_binario("test_bin_02", "verde.png", serpent_dict, transformaciones)
+    assert resultado["exito"], resultado
+
+    # Envoltorio base64 de compatibilidad
+    resultado = nodo.procesar_con_archivo(
+        "test_b64_01", "verde.png", base64.b64encode(imagen_bytes).decode(), transformaciones
+    )
+    assert resultado["exito"], resultado
+    assert isinstance(resultado["imagen_resultado"], str)
+
+
+def test_modo_procesos_local():
+    imagen_bytes = codificar(Image.effect_noise((120, 90), 40).convert('RGB'))
+    transformaciones = [
+        {"tipo": "rotate", "parametros": {"degrees": 90}},
+        {"tipo": "brightness", "parametros": {"value": 20, "contraste": 10}},
+        {"tipo": "resize", "parametros": {"ancho": 45}},
+    ]
+    hilos = NodoWorker("worker_hilos", capacidad_maxima=1, cache_mb=0)
+    procesos = NodoWorker("worker_procesos", capacidad_maxima=1, modo_ejecucion="procesos", cache_mb=0)
+    try:
+        esperado = hilos.procesar_binario("hilos_01", "x.png", imagen_bytes, transformaciones)
+        resultado = procesos.procesar_binario("procesos_01", "x.png", imagen_bytes, transformaciones)
+        assert esperado["exito"] and resultado["exito"], resultado
+        assert resultado["imagen_resultado"] == esperado["imagen_resultado"]
+        assert "memoria_compartida" in resultado["tiempos_etapas"], resultado["tiempos_etapas"]
+    finally:
+        procesos.detener()
+
+
+def test_memoria_compartida_liberada_local():
+    if not os.path.isdir("/dev/shm"):
+        return
+    imagen_bytes = codificar(Image.new('RGB', (64, 48), color='red'))
+    ejecutor = EjecutorProcesos(1)
+    try:
+        # Arranca el proceso hijo antes de tomar la foto de /dev/shm
+        assert ejecutor.procesar_bytes(imagen_bytes, [], "arranque") is not None
+        antes = set(os.listdir("/dev/shm"))
+        # Una opción desconocida hace fallar procesar_bytes dentro del proceso hijo
+        try:
+            ejecutor.procesar_bytes(imagen_bytes, [], "fallo", opcion_inexistente=True)
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("El trabajo debía fallar en el proceso hijo")
+        assert set(os.listdir("/dev/shm")) - antes == set()
+    finally:
+        ejecutor.cerrar()
+
+
+def test_procesar_lote_local():
+    imagen_bytes = codificar(Image.new('RGB', (64, 64), color='red'))
+
+    # Más trabajos que capacidad: los sobrantes esperan slot en vez de ser rechazados
+    nodo = NodoWorker("worker_lote", capacidad_maxima=2)
+    trabajos = [
+        (f"lote_{i}", "rojo.png", imagen_bytes, [{"tipo": "resize", "parametros": {"ancho": 16 + i}}])
+        for i in range(5)
+    ]
+    trabajos.append({"id_trabajo": "lote_dict", "nombre_archivo": "rojo.png",
+                     "imagen_bytes": imagen_bytes, "transformaciones": []})
+    trabajos.append(("mal_formado",))
+
+    resultados = nodo.procesar_lote(trabajos)
+    assert len(resultados) == len(trabajos)
+    assert [r["id_trabajo"] for r in resultados[:6]] == [f"lote_{i}" for i in range(5)] + ["lote_dict"]
+    assert all(r["exito"] for r in resultados[:6]), resultados
+    assert not resultados[6]["exito"]
+    for i, resultado in enumerate(resultados[:5]):
+        with Image.open(io.BytesIO(resultado["imagen_resultado"])) as img:
+            assert img.width == 16 + i
+
+    estado = nodo.obtener_estado()
+    assert estado["trabajos_activos"] == 0
+    assert estado["trabajos_completados"] == 6
+
+    # Versión en streaming: mismos trabajos, resultados en orden de finalización
+    resultados_stream = list(nodo.procesar_lote_stream(trabajos[:5]))
+    assert sorted(r["id_trabajo"] for r in resultados_stream) == [f"lote_{i}" for i in range(5)]
+    assert all(r["exito"] for r in resultados_stream)
+
+
+def test_cache_resultados_local():
+    imagen_bytes = codificar(Image.new('RGB', (64, 64), color='blue'))
+    transformaciones = [{"tipo": "blur", "parametros": {"radius": 2}}]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        nodo = NodoWorker("worker_cache", capacidad_maxima=1, directorio_cache=directorio)
+        primero = nodo.procesar_binario("cache_01", "azul.png", imagen_bytes, transformaciones)
+        segundo = nodo.procesar_binario("cache_02", "azul.png", imagen_bytes, transformaciones)
+        assert not primero["desde_cache"] and segundo["desde_cache"]
+        assert primero["imagen_resultado"] == segundo["imagen_resultado"]
+
+        # Otra receta no comparte entrada
+        tercero = nodo.procesar_binario("cache_03", "azul.png", imagen_bytes, [{"tipo": "grayscale"}])
+        assert not tercero["desde_cache"]
+
+        cache = nodo.obtener_estado()["cache"]
+        assert cache["aciertos_memoria"] == 1 and cache["fallos"] == 2
+
+        # Un nodo nuevo sobre el mismo directorio acierta en disco
+        nodo_nuevo = NodoWorker("worker_cache_2", capacidad_maxima=1, directorio_cache=directorio)
+        cuarto = nodo_nuevo.procesar_binario("cache_04", "azul.png", imagen_bytes, transformaciones)
+        assert cuarto["desde_cache"]
+        assert nodo_nuevo.obtener_estado()["cache"]["aciertos_disco"] == 1
+
+
+def test_procesar_variantes_local():
+    imagen_bytes = codificar(Image.linear_gradient('L').convert('RGB'))
+    recorte = {"tipo": "crop", "parametros": {"izquierda": 16, "superior": 16, "derecha": 144, "inferior": 144}}
+    recetas = [
+        {"id": "grande", "transformaciones": [recorte, {"tipo": "resize", "parametros": {"ancho": 96}}]},
+        {"id": "mini", "transformaciones": [recorte, {"tipo": "resize", "parametros": {"ancho": 32}}]},
+        [recorte, {"tipo": "blur", "parametros": {"radius": 2}}],
+        [],
+    ]
+
+    nodo = NodoWorker("worker_variantes", capacidad_maxima=1, cache_mb=0)
+    resultado = nodo.procesar_variantes("var_1", "gradiente.png", imagen_bytes, recetas)
+    assert resultado["exito"], resultado
+    assert [v["id"] for v in resultado["variantes"]] == ["grande", "mini", 2, 3]
+
+    # Cada variante coincide con procesar su receta por separado (salvo el
+    # redondeo del recorte+redimensionado fusionado que usa el trabajo suelto)
+    for receta, variante in zip(recetas, resultado["variantes"]):
+        transformaciones = receta["transformaciones"] if isinstance(receta, dict) else receta
+        individual = nodo.procesar_binario("ind", "gradiente.png", imagen_bytes, transformaciones)
+        with Image.open(io.BytesIO(variante["imagen_resultado"])) as a, \
+                Image.open(io.BytesIO(individual["imagen_resultado"])) as b:
+            assert a.size == b.size
+            assert max(hi for _, hi in ImageChops.difference(a, b).getextrema()) <= 1
+
+    with Image.open(io.BytesIO(resultado["variantes"][1]["imagen_resultado"])) as img:
+        assert img.size == (32, 32)
+    assert nodo.obtener_estado()["trabajos_activos"] == 0
+
+
+def test_admision_por_memoria_local():
+    imagen_bytes = codificar(Image.new('RGB', (1000, 1000), color='gray'))
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 100}}]
+    memoria = estimar_memoria(imagen_bytes, transformaciones)
+    assert 7 * MB < memoria < 10 * MB  # decodificada + entrada y salida del paso más caro
+
+    # Uno cabe en el presupuesto de 10 MB, dos no
+    nodo = NodoWorker("worker_memoria", capacidad_maxima=5, cache_mb=0, presupuesto_memoria_mb=10)
+    ejecutor, hilo = ocupar_slot(nodo, "mem_01", imagen_bytes, transformaciones)
+    rechazado = nodo.procesar_binario("mem_02", "gris.png", imagen_bytes, transformaciones)
+    assert not rechazado["exito"]
+    assert nodo.obtener_estado()["memoria_reservada_mb"] == round(memoria / MB, 1)
+
+    ejecutor.liberar()
+    hilo.join(10)
+    aceptado = nodo.procesar_binario("mem_03", "gris.png", imagen_bytes, transformaciones)
+    assert aceptado["exito"] and aceptado["memoria_estimada_mb"] > 0
+    assert nodo.obtener_estado()["memoria_reservada_mb"] == 0
+
+
+def test_cola_espera_local():
+    imagen_bytes = codificar(Image.new('RGB', (32, 32), color='white'))
+    nodo = NodoWorker("worker_cola", capacidad_maxima=1, cache_mb=0, tamaño_cola=1)
+    ejecutor, ocupante = ocupar_slot(nodo, "cola_00", imagen_bytes)
+
+    # Sin slot: espera en cola y entra cuando se libera
+    resultados = {}
+    hilo = threading.Thread(target=lambda: resultados.update(
+        espera=nodo.procesar_binario("cola_01", "blanco.png", imagen_bytes, [], plazo=5)
+    ))
+    hilo.start()
+    while nodo.obtener_estado()["cola"]["en_espera"] == 0:
+        time.sleep(0.01)
+
+    # Cola llena: rechazo inmediato
+    lleno = nodo.procesar_binario("cola_02", "blanco.png", imagen_bytes, [])
+    assert not lleno["exito"] and "cola de espera llena" in lleno["error"]
+
+    time.sleep(0.1)
+    ejecutor.liberar()
+    ocupante.join(5)
+    hilo.join(5)
+    assert resultados["espera"]["exito"], resultados
+
+    # Plazo agotado sin que se libere el slot
+    ejecutor, ocupante = ocupar_slot(nodo, "cola_03", imagen_bytes)
+    vencido = nodo.procesar_binario("cola_04", "blanco.png", imagen_bytes, [], plazo=0.1)
+    assert not vencido["exito"] and "plazo" in vencido["error"]
+    ejecutor.liberar()
+    ocupante.join(5)
+
+    cola = nodo.obtener_estado()["cola"]
+    assert cola["admitidos_tras_espera"] == 1 and cola["espera_maxima_ms"] >= 100
+    assert cola["rechazos_cola_llena"] == 1 and cola["rechazos_plazo"] == 1
+
+
+def test_prioridades_y_reparto_local():
+    cola = ColaEspera(10)
+    turnos = [Turno(prioridad="masiva", cliente="importador") for _ in range(3)]
+    turnos.append(Turno(prioridad="masiva", cliente="tienda"))
+    turnos.append(Turno(prioridad="interactiva", cliente="editor"))
+    for turno in turnos:
+        cola.agregar(turno)
+
+    orden = []
+    while len(cola):
+        turno = cola.siguiente()
+        cola.quitar(turno)
+        cola.registrar_admision(turno)
+        orden.append(turno.cliente)
+    # Interactiva primero; después los clientes masivos se turnan
+    assert orden == ["editor", "importador", "tienda", "importador", "importador"], orden
+
+    # Con un slot ocupado, el reservado sólo lo ocupan trabajos interactivos
+    imagen_bytes = codificar(Image.new('RGB', (16, 16)))
+    nodo = NodoWorker("worker_prioridad", capacidad_maxima=2, cache_mb=0, reserva_interactiva=1)
+    ejecutor, hilo = ocupar_slot(nodo, "masivo", imagen_bytes, prioridad="masiva", cliente="importador")
+    assert not nodo.procesar_binario("normal", "x.png", imagen_bytes, [],
+                                     prioridad="normal", cliente="tienda")["exito"]
+    assert nodo.procesar_binario("interactivo", "x.png", imagen_bytes, [],
+                                 prioridad="interactiva", cliente="editor")["exito"]
+    invalida = nodo.procesar_binario("urgente", "x.png", imagen_bytes, [], prioridad="urgente")
+    assert "Prioridad inválida" in invalida["error"]
+
+    # Un lote masivo esperando en cola no quita el slot reservado al interactivo,
+    # aunque la cola de espera esté desactivada (tamaño_cola=0)
+    lote = []
+    esperando = threading.Thread(target=lambda: lote.extend(nodo.procesar_lote(
+        [("masivo_2", "x.png", imagen_bytes, [])], prioridad="masiva", cliente="importador"
+    )))
+    esperando.start()
+    limite = time.time() + 10
+    while nodo.obtener_estado()["cola"]["en_espera"] == 0 and time.time() < limite:
+        time.sleep(0.01)
+    assert nodo.obtener_estado()["cola"]["en_espera"] == 1
+    assert nodo.procesar_binario("interactivo_2", "x.png", imagen_bytes, [],
+                                 prioridad="interactiva", cliente="editor")["exito"]
+    assert not nodo.procesar_binario("masivo_3", "x.png", imagen_bytes, [],
+                                     prioridad="masiva", cliente="tienda")["exito"]
+    ejecutor.liberar()
+    hilo.join(5)
+    esperando.join(5)
+    assert lote[0]["exito"], lote
+
+
+def test_orden_lotes_por_prioridad_local():
+    imagen_bytes = codificar(Image.new('RGB', (16, 16)))
+    # Con un solo slot los trabajos empiezan en el orden exacto en que se admiten
+    nodo = NodoWorker("worker_orden_lotes", capacidad_maxima=1, cache_mb=0)
+    ejecutor = EjecutorRetenido(nodo.procesador, {"A0"})
+    nodo.ejecutor = ejecutor
+
+    def lote(prefijo, n, prioridad):
+        return threading.Thread(target=nodo.procesar_lote, args=(
+            [(f"{prefijo}{i}", "x.png", imagen_bytes, []) for i in range(n)],
+        ), kwargs={"prioridad": prioridad, "cliente": prefijo})
+
+    def esperar_en_cola(n):
+        limite = time.time() + 10
+        while nodo.obtener_estado()["cola"]["en_espera"] < n and time.time() < limite:
+            time.sleep(0.01)
+        assert nodo.obtener_estado()["cola"]["en_espera"] == n
+
+    # A ocupa el slot con un lote masivo; después llegan B (interactivo) y C (masivo)
+    hilos = [lote("A", 12, "masiva")]
+    hilos[0].start()
+    assert ejecutor.iniciado.wait(10)
+    esperar_en_cola(11)
+    hilos.append(lote("B", 2, "interactiva"))
+    hilos[-1].start()
+    esperar_en_cola(13)
+    hilos.append(lote("C", 2, "masiva"))
+    hilos[-1].start()
+    esperar_en_cola(15)
+
+    ejecutor.liberar()
+    for hilo in hilos:
+        hilo.join(10)
+    # B adelanta a todo el lote de A; dentro de 'masiva', A y C se turnan
+    esperado = ["A0", "B0", "B1", "C0", "A1", "C1"] + [f"A{i}" for i in range(2, 12)]
+    assert ejecutor.iniciados == esperado, ejecutor.iniciados
+
+
+def test_validacion_cabecera_local():
+    nodo = NodoWorker("worker_sondeo", capacidad_maxima=1, cache_mb=0, max_megapixeles=1)
+    casos = {
+        "corrupta": (b"\x89PNG no es una imagen", "reconocible"),
+        "ppm": (codificar(Image.new('RGB', (8, 8)), 'PPM'), "Formato no soportado"),
+        "enorme": (codificar(Image.new('1', (2000, 1000))), "bomba de descompresión"),
+    }
+    for id_trabajo, (datos, error) in casos.items():
+        resultado = nodo.procesar_binario(id_trabajo, "x", datos, [])
+        assert not resultado["exito"] and error in resultado["error"], resultado
+
+    valido = nodo.procesar_binario("valida", "x", codificar(Image.new('RGB', (8, 8)), 'JPEG'), [])
+    assert valido["exito"]
+    estado = nodo.obtener_estado()
+    assert estado["trabajos_invalidos"] == 3 and estado["trabajos_activos"] == 0
+
+
+def test_entrada_serpent_local():
+    # serpent envía los bytes como {'data': base64, 'encoding': 'base64'}
+    imagen_bytes = codificar(Image.new('RGB', (64, 48), color='blue'))
+    carga = {"data": base64.b64encode(imagen_bytes).decode("ascii"), "encoding": "base64"}
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 32}}]
+    nodo = NodoWorker("worker_serpent", capacidad_maxima=1, cache_mb=0)
+
+    resultado = nodo.procesar_binario("serpent_1", "x.png", carga, transformaciones)
+    assert resultado["exito"] and resultado["tiempos_etapas"]["transferencia_entrada"] >= 0, resultado
+    lote = nodo.procesar_lote([("serpent_2", "x.png", carga, transformaciones)])
+    assert lote[0]["exito"], lote
+    assert nodo.enviar_trabajo("serpent_3", "x.png", carga, transformaciones)["aceptado"]
+    limite = time.time() + 10
+    while nodo.consultar_trabajo("serpent_3")["estado"] != "completado" and time.time() < limite:
+        time.sleep(0.01)
+    asincrono = nodo.obtener_resultado("serpent_3")
+    assert asincrono["imagen_resultado"] == resultado["imagen_resultado"] == lote[0]["imagen_resultado"]
+
+    # Un tipo no soportado se rechaza como entrada inválida, sin ocupar slot
+    rechazo = nodo.procesar_binario("serpent_4", "x.png", 12345, transformaciones)
+    assert not rechazo["exito"] and "Tipo de imagen no soportado" in rechazo["error"], rechazo
+    estado = nodo.obtener_estado()
+    assert estado["trabajos_invalidos"] == 1 and estado["trabajos_activos"] == 0
+
+
+def test_tiempos_etapas_local():
+    imagen_bytes = codificar(Image.new('RGB', (64, 48), color='green'))
+    transformaciones = [
+        {"tipo": "blur", "parametros": {"radius": 2}},
+        {"tipo": "rotate", "parametros": {"degrees": 30}},
+    ]
+
+    nodo = NodoWorker("worker_tiempos", capacidad_maxima=1, cache_mb=0)
+    resultados = [
+        nodo.procesar_binario(f"tiempos_{i}", "x.png", imagen_bytes, transformaciones)
+        for i in range(3)
+    ]
+    assert all(r["exito"] for r in resultados)
+    # Los siguientes reanudan desde la caché de intermedios: sólo el primero transforma
+    tiempos = resultados[0]["tiempos_etapas"]
+    for etapa in ("transferencia_entrada", "decodificacion", "codificacion"):
+        assert tiempos[etapa] >= 0, tiempos
+    assert set(tiempos["transformaciones"]) == {"blur", "rotate"}
+
+    histogramas = nodo.obtener_estado()["tiempos_etapas"]
+    assert histogramas["etapas"]["codificacion"]["observaciones"] == 3
+    assert histogramas["transformaciones"]["blur"]["p95_ms"] is not None
+
+
+def test_exportador_metricas_local():
+    imagen_bytes = codificar(Image.new('RGB', (32, 32), color='blue'))
+    nodo = NodoWorker("worker_metricas", capacidad_maxima=1)
+    for _ in range(2):
+        assert nodo.procesar_binario("m", "x.png", imagen_bytes, [{"tipo": "grayscale"}])["exito"]
+
+    exportador = ExportadorMetricas(nodo, "127.0.0.1", 0)
+    puerto = exportador.iniciar()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metrics", timeout=5) as respuesta:
+            assert respuesta.headers["Content-Type"].startswith("text/plain")
+            texto = respuesta.read().decode("utf-8")
+    finally:
+        exportador.detener()
+
+    assert 'nodo_worker_trabajos_total{nodo="worker_metricas",resultado="completado"} 2' in texto
+    assert 'nodo_worker_trabajo_segundos_count{nodo="worker_metricas"} 2' in texto
+    assert 'nodo_worker_transformacion_segundos_count{nodo="worker_metricas",tipo="grayscale"} 1' in texto
+    assert 'nodo_worker_cache_consultas_total{nodo="worker_metricas",resultado="acierto_memoria"} 1' in texto
+    assert 'nodo_worker_rss_bytes{nodo="worker_metricas",proceso="principal"}' in texto
+
+
+def test_estadisticas_concurrentes_local():
+    imagen_bytes = codificar(Image.new('RGB', (16, 16), color='black'))
+    nodo = NodoWorker("worker_contadores", capacidad_maxima=8)
+    nodo.procesar_binario("contador", "x.png", imagen_bytes, [{"tipo": "grayscale"}])
+
+    def trabajar():
+        for _ in range(50):
+            nodo.procesar_binario("contador", "x.png", imagen_bytes, [{"tipo": "grayscale"}])
+
+    # Dos tandas: al leer, los hilos de la primera ya han terminado
+    for _ in range(2):
+        hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    estado = nodo.obtener_estado()
+    assert estado["trabajos_completados"] == 801
+    assert estado["bytes_recibidos"] == 801 * len(imagen_bytes)
+    assert estado["cache"]["aciertos_memoria"] == 800
+
+    # La sonda del balanceador no espera al lock del nodo
+    disponible = []
+    with nodo.lock:
+        hilo = threading.Thread(target=lambda: disponible.append(nodo.esta_disponible()))
+        hilo.start()
+        hilo.join(2)
+    assert disponible == [True]
+
+
+def test_trabajos_asincronos_local():
+    imagen_bytes = codificar(Image.new('RGB', (64, 48), color='red'))
+    nodo = NodoWorker("worker_asincrono", capacidad_maxima=2, cache_mb=0)
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 32}}]
+
+    respuesta = nodo.enviar_trabajo("async_01", "x.png", imagen_bytes, transformaciones)
+    assert respuesta["aceptado"] and respuesta["estado"] == "en_cola", respuesta
+    assert not nodo.enviar_trabajo("async_01", "x.png", imagen_bytes, transformaciones)["aceptado"]
+    # La entrada se valida antes de aceptarla, con el rechazo de procesar_binario
+    rechazo = nodo.enviar_trabajo("async_02", "x.png", b"no es una imagen", transformaciones)
+    assert not rechazo["aceptado"] and not rechazo["exito"] and "error" in rechazo, rechazo
+
+    limite = time.time() + 10
+    while nodo.consultar_trabajo("async_01")["estado"] != "completado" and time.time() < limite:
+        time.sleep(0.01)
+    resultado = nodo.obtener_resultado("async_01")
+    assert resultado["exito"] and resultado["estado"] == "completado", resultado
+    with Image.open(io.BytesIO(resultado["imagen_resultado"])) as img:
+        assert img.size == (32, 24)
+    # Entregado y retirado del nodo
+    assert nodo.consultar_trabajo("async_01")["estado"] == "desconocido"
+
+    assert nodo.consultar_trabajo("async_02")["estado"] == "desconocido"
+    assert nodo.obtener_resultado("no_existe")["estado"] == "desconocido"
+    assert nodo.obtener_estado()["trabajos_asincronos"]["pendientes"] == 0
+
+
+def test_detener_cancela_pendientes_local():
+    imagen_bytes = codificar(Image.new('RGB', (64, 48), color='red'))
+    nodo = NodoWorker("worker_detener", capacidad_maxima=1, cache_mb=0)
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 32}}]
+    ejecutor, ocupante = ocupar_slot(nodo, "detener_00", imagen_bytes)
+
+    # Con el único slot ocupado, el lote y los trabajos asíncronos quedan esperando
+    lote = [(f"detener_l{i}", "x.png", imagen_bytes, transformaciones) for i in range(4)]
+    resultados = []
+    hilo = threading.Thread(target=lambda: resultados.extend(nodo.procesar_lote(lote)))
+    hilo.start()
+    for i in range(3):
+        assert nodo.enviar_trabajo(f"detener_a{i}", "x.png", imagen_bytes, transformaciones)["aceptado"]
+    time.sleep(0.2)
+
+    nodo.detener()
+    ejecutor.liberar()
+    ocupante.join(10)
+    hilo.join(10)
+    assert len(resultados) == 4 and not any(r["exito"] for r in resultados), resultados
+    limite = time.time() + 10
+    while nodo.obtener_estado()["trabajos_asincronos"]["pendientes"] and time.time() < limite:
+        time.sleep(0.01)
+    for i in range(3):
+        assert nodo.consultar_trabajo(f"detener_a{i}")["estado"] == "fallido"
+    # Sólo llegó a ejecutarse el trabajo que ya ocupaba el slot
+    assert nodo.obtener_estado()["trabajos_completados"] == 1
+    # Y los hilos de los pools de lote y asíncrono terminan
+    prefijos = ("lote-worker_detener", "asincrono-worker_detener")
+    while any(h.name.startswith(prefijos) for h in threading.enumerate()) and time.time() < limite:
+        time.sleep(0.01)
+    assert not any(h.name.startswith(prefijos) for h in threading.enumerate())
+
+
+def test_limite_entradas_asincronas_local():
+    # PNG de ruido de ~0.6 MB: dos no caben en 1 MB de entradas pendientes
+    ruido = Image.frombytes('RGB', (450, 450), os.urandom(450 * 450 * 3))
+    grande = codificar(ruido)
+    pequeña = codificar(Image.new('RGB', (64, 48), color='red'))
+    assert 0.5 * MB < len(grande) < MB
+    nodo = NodoWorker("worker_async_limite", capacidad_maxima=1, cache_mb=0, max_entradas_asincronas_mb=1)
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 32}}]
+
+    # Con el único slot ocupado, los trabajos aceptados quedan pendientes
+    ejecutor, ocupante = ocupar_slot(nodo, "async_bloqueo", pequeña)
+    assert nodo.enviar_trabajo("async_g1", "x.png", grande, transformaciones)["aceptado"]
+    rechazo = nodo.enviar_trabajo("async_g2", "x.png", grande, transformaciones)
+    assert not rechazo["aceptado"] and not rechazo["exito"] and "Sin espacio" in rechazo["error"], rechazo
+    assert nodo.enviar_trabajo("async_p1", "x.png", pequeña, transformaciones)["aceptado"]
+    estado = nodo.obtener_estado()["trabajos_asincronos"]
+    assert estado["pendientes"] == 2 and estado["bytes_pendientes"] == len(grande) + len(pequeña)
+
+    # Al terminar, los bytes de entrada se liberan y vuelve a haber sitio
+    ejecutor.liberar()
+    ocupante.join(10)
+    limite = time.time() + 10
+    while nodo.obtener_estado()["trabajos_asincronos"]["pendientes"] and time.time() < limite:
+        time.sleep(0.01)
+    assert nodo.obtener_estado()["trabajos_asincronos"]["bytes_pendientes"] == 0
+    assert nodo.obtener_resultado("async_g1")["exito"]
+    assert nodo.enviar_trabajo("async_g2", "x.png", grande, transformaciones)["aceptado"]
+
+
+def test_procesar_referencia_local():
+    with tempfile.TemporaryDirectory() as raiz:
+        Image.new('RGB', (64, 48), color='blue').save(os.path.join(raiz, "entrada.png"))
+        nodo = NodoWorker("worker_referencia", capacidad_maxima=1, directorio_compartido=raiz)
+        transformaciones = [{"tipo": "resize", "parametros": {"ancho": 32}}]
+
+        resultado = nodo.procesar_referencia("ref_01", "entrada.png", "salida/r.png", transformaciones)
+        assert resultado["exito"], resultado
+        assert "imagen_resultado" not in resultado
+        ruta = os.path.join(raiz, "salida", "r.png")
+        assert resultado["bytes_resultado"] == os.path.getsize(ruta)
+        with Image.open(ruta) as img:
+            assert img.size == (32, 24)
+        # Sin temporales a la vista
+        assert os.listdir(os.path.join(raiz, "salida")) == ["r.png"]
+
+        # URI file:// y acierto de caché
+        uri = "file://" + os.path.join(raiz, "entrada.png")
+        assert nodo.procesar_referencia("ref_02", uri, "salida/r2.png", transformaciones)["desde_cache"]
+
+        # Referencias fuera del directorio compartido o inexistentes
+        assert not nodo.procesar_referencia("ref_03", "../fuera.png", "x.png", transformaciones)["exito"]
+        assert not nodo.procesar_referencia("ref_04", "no_existe.png", "x.png", transformaciones)["exito"]
+
+    assert not NodoWorker("worker_sin_ref", capacidad_maxima=1).procesar_referencia(
+        "ref_05", "entrada.png", "x.png", [])["exito"]
+
+
+def test_entrada_sin_copias_local():
+    # El heap de Python no crece con el tamaño del archivo: la entrada se lee
+    # del mmap o del búfer de la subida sin copiarla entera
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 50}}]
+    with tempfile.TemporaryDirectory() as raiz:
+        nodo = NodoWorker("worker_sin_copias", capacidad_maxima=1, cache_mb=0, directorio_compartido=raiz)
+        for lado in (500, 1500):
+            nombre = f"ruido_{lado}.png"
+            Image.effect_noise((lado, lado), 64).convert('RGB').save(os.path.join(raiz, nombre), compress_level=0)
+            with open(os.path.join(raiz, nombre), "rb") as f:
+                imagen_bytes = f.read()
+            subida = nodo.abrir_subida(len(imagen_bytes), hashlib.sha256(imagen_bytes).hexdigest())
+            nodo.enviar_fragmento(subida["id_subida"], 0, imagen_bytes)
+            del imagen_bytes
+
+            tracemalloc.start()
+            try:
+                assert nodo.procesar_referencia(f"ref_{lado}", nombre, f"salida_{lado}.png", transformaciones)["exito"]
+                pico_referencia = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+                assert nodo.procesar_subida(f"sub_{lado}", subida["id_subida"], nombre, transformaciones)["exito"]
+                pico_subida = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            # 0.75 MB y 6.75 MB de archivo: ninguno llega a copiarse
+            assert pico_referencia < 512 * 1024 and pico_subida < 512 * 1024, (lado, pico_referencia, pico_subida)
+
+
+def test_subida_fragmentada_local():
+    imagen_bytes = codificar(Image.effect_noise((200, 150), 64).convert('RGB'))
+    sha256 = hashlib.sha256(imagen_bytes).hexdigest()
+    nodo = NodoWorker("worker_subidas", capacidad_maxima=1, cache_mb=0)
+    transformaciones = [{"tipo": "resize", "parametros": {"ancho": 100}}]
+
+    # En memoria y, con umbral 0, en un archivo temporal mapeado
+    umbral = subidas.UMBRAL_MEMORIA
+    try:
+        for umbral_prueba in (umbral, 0):
+            subidas.UMBRAL_MEMORIA = umbral_prueba
+            subida = nodo.abrir_subida(len(imagen_bytes), sha256)
+            assert subida["exito"], subida
+            for offset in range(0, len(imagen_bytes), 1000):
+                respuesta = nodo.enviar_fragmento(subida["id_subida"], offset, imagen_bytes[offset:offset + 1000])
+                assert respuesta["exito"], respuesta
+                if offset == 0:
+                    # Un reintento no tiene efecto; un salto se rechaza
+                    assert nodo.enviar_fragmento(subida["id_subida"], 0, imagen_bytes[:1000])["recibidos"] == 1000
+                    assert not nodo.enviar_fragmento(subida["id_subida"], 2000, b"x")["exito"]
+
+            resultado = nodo.procesar_subida("sub_01", subida["id_subida"], "ruido.png", transformaciones)
+            assert resultado["exito"] and "imagen_resultado" not in resultado, resultado
+
+            partes, offset = [], 0
+            while True:
+                fragmento = nodo.descargar_fragmento(resultado["id_descarga"], offset, 700)
+                assert fragmento["exito"], fragmento
+                partes.append(fragmento["datos"])
+                offset += len(fragmento["datos"])
+                if fragmento["fin"]:
+                    break
+            descargado = b"".join(partes)
+            assert hashlib.sha256(descargado).hexdigest() == resultado["sha256_resultado"]
+            with Image.open(io.BytesIO(descargado)) as img:
+                assert img.size == (100, 75)
+            assert nodo.cerrar_descarga(resultado["id_descarga"])["exito"]
+    finally:
+        subidas.UMBRAL_MEMORIA = umbral
+
+    # Checksum erróneo: se rechaza y la subida se descarta
+    subida = nodo.abrir_subida(len(imagen_bytes))
+    nodo.enviar_fragmento(subida["id_subida"], 0, imagen_bytes)
+    assert not nodo.procesar_subida("sub_02", subida["id_subida"], "x.png", transformaciones, "0" * 64)["exito"]
+    assert not nodo.procesar_subida("sub_03", subida["id_subida"], "x.png", transformaciones, sha256)["exito"]
+
+    estado = nodo.obtener_estado()
+    assert estado["subidas"]["abiertas"] == 0 and estado["subidas"]["bytes"] == 0
+    assert estado["subidas"]["rechazadas_checksum"] == 1
+
+def test_descarga_grande_local():
+    # Un resultado mayor que resultados_mb se vuelca a un archivo temporal
+    # en lugar de procesarlo y descartarlo después
+    imagen_bytes = codificar(Image.effect_noise((1000, 800), 64).convert('RGB'))
+    sha256 = hashlib.sha256(imagen_bytes).hexdigest()
+    nodo = NodoWorker("worker_descarga_grande", capacidad_maxima=1, cache_mb=0, resultados_mb=1)
+    transformaciones = [{"tipo": "reflejar", "parametros": {"tipo": "horizontal"}}]
+
+    subida = nodo.abrir_subida(len(imagen_bytes), sha256)
+    nodo.enviar_fragmento(subida["id_subida"], 0, imagen_bytes)
+    resultado = nodo.procesar_subida("grande_01", subida["id_subida"], "ruido.png", transformaciones)
+    assert resultado["exito"] and resultado["bytes_resultado"] > MB, resultado
+    estado = nodo.obtener_estado()
+    assert estado["descargas"]["bytes"] == 0 and estado["subidas"]["descargas"] == 1
+    # Un resultado no se puede tomar como subida
+    assert not nodo.procesar_subida("grande_02", resultado["id_descarga"], "x.png", [], resultado["sha256_resultado"])["exito"]
+
+    partes, offset = [], 0
+    while True:
+        fragmento = nodo.descargar_fragmento(resultado["id_descarga"], offset, 300_000)
+        assert fragmento["exito"], fragmento
+        partes.append(fragmento["datos"])
+        offset += len(fragmento["datos"])
+        if fragmento["fin"]:
+            break
+    assert hashlib.sha256(b"".join(partes)).hexdigest() == resultado["sha256_resultado"]
+    assert not nodo.descargar_fragmento(resultado["id_descarga"], offset + 1)["exito"]
+
+    assert nodo.cerrar_descarga(resultado["id_descarga"])["exito"]
+    assert not nodo.descargar_fragmento(resultado["id_descarga"])["exito"]
+    estado = nodo.obtener_estado()
+    assert estado["subidas"]["descargas"] == 0 and estado["subidas"]["bytes"] == 0
+    assert estado["trabajos_completados"] == 1
+
 if __name__ == "__main__":
-    test_nodo_worker_corregido()
\ No newline at end of file
+    test_nodo_worker_corregido()
@@ -1,12 +1,16 @@
 import sys
 import os
-from PIL import Image
+from PIL import Image, ImageChops, ImageEnhance
 import io
 
 # Agregar el directorio actual al path para imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from procesador_imagen import ProcesadorImagenesImpl
+from transformaciones.marca_agua import MarcaAgua
+from utils.codificacion import resolver_codificacion
+from utils.optimizador_pipeline import optimizar_transformaciones, transposicion_equivalente
+from utils.teselado import aplicar_por_franjas, halo_paso
 
 def test_transformaciones():
     print("=== PRUEBA DE TODAS LAS TRANSFORMACIONES ===")
@@ -101,5 +105,230 @@ def test_transformaciones():
     else:
         print("⚠️  Algunas transformaciones tienen problemas")
 
+
+def codificar(img, formato='PNG'):
+    buffer = io.BytesIO()
+    img.save(buffer, format=formato)
+    return buffer.getvalue()
+
+
+def decodificar(datos):
+    with Image.open(io.BytesIO(datos)) as img:
+        img.load()
+        return img
+
+
+def test_procesar_bytes():
+    datos = codificar(Image.new('RGB', (120, 80), color='red'))
+    procesador = ProcesadorImagenesImpl()
+    transformaciones = [{"tipo": "grayscale", "parametros": {}}]
+
+    # bytes, memoryview y BytesIO deben producir el mismo resultado
+    for entrada in (datos, memoryview(datos), io.BytesIO(datos)):
+        resultado = procesador.procesar_bytes(entrada, transformaciones, "test_bytes")
+        assert resultado is not None
+        img = decodificar(resultado)
+        assert img.format == 'PNG'
+        assert img.size == (120, 80)
+        assert img.mode == 'L'
+
+    assert procesador.procesar_bytes(b"no es una imagen", transformaciones, "test_bytes") is None
+
+
+def test_optimizador_pipeline():
+    receta = [
+        {"tipo": "rotate", "parametros": {"degrees": 90}},
+        {"tipo": "flip", "parametros": {}},
+        {"tipo": "rotate", "parametros": {"degrees": 90}},
+        {"tipo": "blur", "parametros": {"radius": 0}},
+        {"tipo": "brightness", "parametros": {"value": 20}},
+        {"tipo": "brightness", "parametros": {"value": 10}},
+        {"tipo": "crop", "parametros": {"derecha": 30}},
+    ]
+    plan = optimizar_transformaciones(receta, (40, 20))
+    # giros+reflejo -> una transposición; crop adelantado; brillos compilados en tablas; blur nulo fuera
+    assert [p["tipo"] for p in plan] == ["transpose", "crop", "point_ops"], plan
+    assert receta[0]["parametros"] == {"degrees": 90}  # la receta original no se modifica
+
+    datos = codificar(Image.effect_noise((40, 20), 60).convert('RGB'))
+    procesador = ProcesadorImagenesImpl()
+    giros = [t for t in receta if t["tipo"] in ("rotate", "flip")] * 3
+    estricto = decodificar(procesador.procesar_bytes(datos, giros, "test_estricto", orden_estricto=True))
+    optimizado = decodificar(procesador.procesar_bytes(datos, giros, "test_optimizado"))
+    assert estricto.size == optimizado.size
+    assert ImageChops.difference(estricto.convert('RGB'), optimizado.convert('RGB')).getbbox() is None
+
+
+def test_optimizador_conserva_pixeles():
+    datos = codificar(Image.effect_noise((160, 120), 80).convert('RGB'))
+    procesador = ProcesadorImagenesImpl()
+    recetas = [
+        # Brillo y contraste saturan: el redimensionado no puede adelantarse
+        [{"tipo": "brightness", "parametros": {"value": 80}},
+         {"tipo": "resize", "parametros": {"ancho": 79}}],
+        [{"tipo": "contrast", "parametros": {"contraste": 73}},
+         {"tipo": "resize", "parametros": {"ancho": 40}}],
+        # Tras un giro arbitrario el tamaño no se conoce: el recorte no es nulo
+        [{"tipo": "rotate", "parametros": {"degrees": 10}},
+         {"tipo": "crop", "parametros": {"derecha": 179}}],
+        # Dos brillos redondean cada uno: no equivalen a un único factor
+        [{"tipo": "brightness", "parametros": {"value": 10}},
+         {"tipo": "brightness", "parametros": {"value": 30}}],
+    ]
+    for receta in recetas:
+        estricto = procesador.procesar_bytes(datos, receta, "estricto", orden_estricto=True)
+        optimizado = procesador.procesar_bytes(datos, receta, "optimizado")
+        assert decodificar(estricto).tobytes() == decodificar(optimizado).tobytes(), receta
+        assert decodificar(estricto).size == decodificar(optimizado).size, receta
+
+
+def test_decodificacion_reducida():
+    datos = codificar(Image.radial_gradient('L').resize((2000, 1500)).convert('RGB'), 'JPEG')
+    procesador = ProcesadorImagenesImpl()
+    receta = [
+        {"tipo": "crop", "parametros": {"izquierda": 400, "superior": 300, "derecha": 1600, "inferior": 1200}},
+        {"tipo": "resize", "parametros": {"ancho": 100}},
+    ]
+    estricto = procesador.procesar_bytes(datos, receta, "test_estricto", orden_estricto=True)
+    reducido = procesador.procesar_bytes(datos, receta, "test_reducido")
+    assert decodificar(estricto).size == decodificar(reducido).size == (100, 75)
+
+
+def test_cache_intermedios():
+    datos = codificar(Image.radial_gradient('L').resize((600, 400)).convert('RGB'))
+    con_cache = ProcesadorImagenesImpl()
+    sin_cache = ProcesadorImagenesImpl(cache_intermedios_mb=0)
+    variantes = [
+        [{"tipo": "crop", "parametros": {"derecha": 500}},
+         {"tipo": "blur", "parametros": {"radius": 2}},
+         {"tipo": "watermark", "parametros": {"text": texto}}]
+        for texto in ("uno", "dos", "tres")
+    ]
+    for receta in variantes:
+        assert con_cache.procesar_bytes(datos, receta, "con") == sin_cache.procesar_bytes(datos, receta, "sin")
+
+    # La 2ª y 3ª variante reanudan tras crop + blur
+    estadisticas = con_cache.estadisticas_cache()
+    assert estadisticas["aciertos"] == 2 and estadisticas["fallos"] == 1
+
+
+def test_marca_agua_cacheada():
+    original = Image.linear_gradient('L').resize((640, 480)).convert('RGB')
+    copia = original.copy()
+    resultado = MarcaAgua.aplicar(original, {"text": "muestra"})
+    otra = MarcaAgua.aplicar(original, {"text": "muestra"})
+
+    assert resultado.mode == "RGB" and resultado.size == original.size
+    assert resultado.tobytes() == otra.tobytes()
+    assert original.tobytes() == copia.tobytes()  # la entrada no se modifica
+    assert resultado.tobytes() != original.tobytes()
+
+
+def test_operaciones_puntuales():
+    lista = [
+        {"tipo": "contrast", "parametros": {"contraste": 40}},
+        {"tipo": "grayscale", "parametros": {}},
+        {"tipo": "brightness", "parametros": {"value": -30}},
+        {"tipo": "blur", "parametros": {"radius": 1}},
+    ]
+    assert [p["tipo"] for p in optimizar_transformaciones(lista)] == ["point_ops", "blur"]
+
+    original = Image.radial_gradient('L').resize((320, 240)).convert('RGB')
+    esperado = ImageEnhance.Contrast(original).enhance(1.4).convert('L')
+    esperado = ImageEnhance.Brightness(esperado).enhance(0.7)
+
+    procesador = ProcesadorImagenesImpl()
+    img = decodificar(procesador.procesar_bytes(codificar(original), lista[:3], "puntuales"))
+    assert img.mode == 'L'
+    assert img.tobytes() == esperado.tobytes()
+
+
+def test_brillo_contraste_estricto():
+    # Imagen RGB en la que la media estimada por el motor de tablas difiere en un nivel
+    tamaño = (40, 30)
+    original = Image.merge('RGB', [
+        Image.linear_gradient('L').resize(tamaño),
+        Image.radial_gradient('L').resize(tamaño),
+        Image.new('L', tamaño, 90),
+    ])
+    lista = [{"tipo": "brightness", "parametros": {"value": 54, "contraste": -64}}]
+    assert [p["tipo"] for p in optimizar_transformaciones(lista)] == ["point_ops"]
+
+    esperado = ImageEnhance.Brightness(original).enhance(1.54)
+    esperado = ImageEnhance.Contrast(esperado).enhance(0.36)
+    procesador = ProcesadorImagenesImpl()
+    img = decodificar(procesador.procesar_bytes(codificar(original), lista, "estricto", orden_estricto=True))
+    assert img.tobytes() == esperado.tobytes()
+
+
+def test_procesamiento_por_franjas():
+    original = Image.effect_noise((200, 333), 60).convert('RGB')
+    pasos = [
+        {"tipo": "blur", "parametros": {"radius": 3}},
+        {"tipo": "sharpen", "parametros": {"value": 60}},
+        {"tipo": "watermark", "parametros": {"text": "franjas"}},
+    ]
+    assert halo_paso({"tipo": "contrast", "parametros": {"contraste": 20}}) is None
+
+    procesador = ProcesadorImagenesImpl(umbral_teselado_mpx=0)
+    completa = decodificar(procesador.procesar_bytes(codificar(original), pasos, "completa", orden_estricto=True))
+    por_franjas = aplicar_por_franjas(
+        original, pasos,
+        lambda franja, paso: procesador.transformaciones[paso["tipo"]].aplicar(franja, dict(paso["parametros"])),
+        pixeles_por_franja=200 * 20
+    )
+    assert por_franjas.tobytes() == completa.tobytes()
+
+
+def test_perfiles_codificacion():
+    datos = codificar(Image.effect_noise((160, 120), 40).convert('RGB'))
+    procesador = ProcesadorImagenesImpl()
+
+    # Sin convert_format se mantiene PNG con máxima compresión
+    assert resolver_codificacion([]) == {"formato": "PNG", "compresion": 9, "optimizar": True}
+
+    casos = [
+        ({"perfil": "png_rapido"}, 'PNG'),
+        ({"formato": "jpg", "calidad": 70, "progresivo": True}, 'JPEG'),
+        ({"perfil": "webp_sin_perdida"}, 'WEBP'),
+    ]
+    for parametros, formato in casos:
+        receta = [{"tipo": "convert_format", "parametros": parametros}]
+        assert resolver_codificacion(receta)["formato"] == formato
+        assert decodificar(procesador.procesar_bytes(datos, receta, "codificacion")).format == formato
+
+    # Las opciones sueltas mandan sobre las del perfil
+    receta = [{"tipo": "convert_format", "parametros": {"perfil": "jpeg_rapido", "calidad": 50}}]
+    assert resolver_codificacion(receta)["calidad"] == 50
+
+
+def test_sin_recodificar():
+    datos = codificar(Image.effect_noise((64, 48), 40).convert('RGB'), 'JPEG')
+    procesador = ProcesadorImagenesImpl()
+
+    # Pasos nulos y un cambio al mismo formato: se devuelven los bytes originales
+    nulos = [
+        {"tipo": "blur", "parametros": {"radius": 0}},
+        {"tipo": "rotate", "parametros": {"degrees": 0}},
+        {"tipo": "watermark", "parametros": {"text": "  "}},
+        {"tipo": "convert_format", "parametros": {"formato": "jpg"}},
+    ]
+    assert procesador.procesar_bytes(datos, nulos, "sin_recodificar") == datos
+    # Sin convert_format la salida es PNG: hay que recodificar
+    assert procesador.procesar_bytes(datos, nulos[:3], "sin_recodificar") != datos
+    assert ProcesadorImagenesImpl(evitar_recodificacion=False).procesar_bytes(
+        datos, nulos, "sin_recodificar") != datos
+
+    assert transposicion_equivalente([{"tipo": "rotate", "parametros": {"degrees": 90}},
+                                      {"tipo": "rotate", "parametros": {"degrees": -90}}]) == ""
+    assert transposicion_equivalente([{"tipo": "flip", "parametros": {}}]) == "FLIP_LEFT_RIGHT"
+    assert transposicion_equivalente([{"tipo": "blur", "parametros": {"radius": 2}}]) is None
+
+    # Un giro exacto siempre produce un JPEG girado (con jpegtran o recodificando)
+    giro = [{"tipo": "rotate", "parametros": {"degrees": 90}},
+            {"tipo": "convert_format", "parametros": {"formato": "JPEG"}}]
+    img = decodificar(procesador.procesar_bytes(datos, giro, "sin_recodificar"))
+    assert img.format == 'JPEG' and img.size == (48, 64)
+
 if __name__ == "__main__":
-    test_transformaciones()
\ No newline at end of file
+    test_transformaciones()
@@ -12,6 +12,8 @@ from .perfilar import Perfilar
 from .brillo_contraste import BrilloContraste
 from .marca_agua import MarcaAgua
 from .convertir_formato import ConvertirFormato
+from .transponer import Transponer
+from .ajustes_puntuales import AjustesPuntuales
 
 __all__ = [
     'EscalaGrises',
@@ -23,5 +25,7 @@ __all__ = [
     'Perfilar',
     'BrilloContraste',
     'MarcaAgua',
-    'ConvertirFormato'
+    'ConvertirFormato',
+    'Transponer',
+    'AjustesPuntuales'
 ]
\ No newline at end of file
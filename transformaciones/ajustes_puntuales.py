@@ -0,0 +1,30 @@
+from utils.operaciones_puntuales import aplicar_operaciones
+from .brillo_contraste import BrilloContraste
+from .escala_grises import EscalaGrises
+
+class AjustesPuntuales:
+    @staticmethod
+    def aplicar(img, parametros=None):
+        """Aplica varios ajustes de brillo, contraste y escala de grises en una sola pasada"""
+        if parametros is None:
+            parametros = {}
+        
+        try:
+            # Lista de pasos fusionados por el optimizador
+            pasos = parametros.get("pasos", [])
+            
+            print(f"Aplicando ajustes puntuales: {[paso.get('tipo') for paso in pasos]}")
+            
+            resultado = aplicar_operaciones(img, pasos)
+            if resultado is not None:
+                return resultado
+            
+            # Modo no soportado por las tablas: aplicar uno a uno
+            for paso in pasos:
+                clase = EscalaGrises if paso.get("tipo") == "grayscale" else BrilloContraste
+                img = clase.aplicar(img, paso.get("parametros"))
+            return img
+            
+        except Exception as e:
+            print(f"Error en ajustes puntuales: {e}")
+            return img
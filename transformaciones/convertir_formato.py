@@ -1,5 +1,7 @@
 from PIL import Image
 
+from utils.codificacion import formato_paso
+
 class ConvertirFormato:
     @staticmethod
     def aplicar(img, parametros=None):
@@ -8,13 +10,13 @@ class ConvertirFormato:
             parametros = {}
         
         try:
-            # Esta transformación principalmente cambia el formato al guardar
-            # pero podemos hacer algunas conversiones básicas aquí
-            formato = parametros.get("formato", "PNG").upper()
+            # El formato y las opciones de guardado se resuelven al codificar
+            # (utils.codificacion); aquí sólo se adapta el modo de la imagen
+            formato = formato_paso(parametros)
             
             print(f"Preparando conversión a formato: {formato}")
             
-            if formato == "JPG" or formato == "JPEG":
+            if formato == "JPEG":
                 # Convertir a RGB si es necesario para JPEG
                 if img.mode in ('RGBA', 'LA', 'P'):
                     # Crear fondo blanco para imágenes con transparencia
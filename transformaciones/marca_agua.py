@@ -1,57 +1,103 @@
+from functools import lru_cache
+
 from PIL import ImageDraw, ImageFont, Image
 
+# Color semi-transparente
+COLOR_MARCA = (255, 255, 255, 128)  # Blanco semi-transparente
+
+
+@lru_cache(maxsize=32)
+def _cargar_fuente(tamaño_fuente):
+    """Carga la fuente una sola vez por tamaño (incluido el fallback)"""
+    try:
+        return ImageFont.truetype("arial.ttf", tamaño_fuente)
+    except Exception:
+        # Fallback a fuente por defecto
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=64)
+def _capa_texto(texto, tamaño_fuente, color):
+    """
+    Renderiza el texto en una capa RGBA del tamaño de su caja.
+    La capa se comparte entre llamadas: no debe modificarse.
+
+    Returns:
+        Tupla (capa, caja del texto relativa al punto de dibujo)
+    """
+    font = _cargar_fuente(tamaño_fuente)
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), texto, font=font)
+    capa = Image.new('RGBA', (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), (255, 255, 255, 0))
+    ImageDraw.Draw(capa).text((-bbox[0], -bbox[1]), texto, fill=color, font=font)
+    return capa, bbox
+
+
+def colocar_marca(texto, tamaño_lienzo):
+    """
+    Capa de texto y posición (x, y) de su esquina en una imagen del tamaño dado:
+    centrada y con fuente proporcional al lado mayor.
+    """
+    ancho, alto = tamaño_lienzo
+    tamaño_fuente = max(20, max(ancho, alto) // 20)  # Fuente proporcional al tamaño de imagen
+    capa, bbox = _capa_texto(texto, tamaño_fuente, COLOR_MARCA)
+
+    # Calcular posición centrada
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (ancho - text_width) // 2 + bbox[0]
+    y = (alto - text_height) // 2 + bbox[1]
+    return capa, x, y
+
+
 class MarcaAgua:
     @staticmethod
     def aplicar(img, parametros=None):
         """Agrega marca de agua de texto usando parámetros del frontend"""
         if parametros is None:
             parametros = {}
-        
+
         try:
             # Parámetros del frontend Angular
             texto = parametros.get("text", "")
-            
+
             print(f"Aplicando marca de agua con texto: '{texto}'")
-            
+
             # Solo aplicar si hay texto
             if not texto or texto.strip() == "":
                 return img
-            
-            # Crear una imagen temporal para dibujar
-            img_con_marca = img.convert("RGBA")
-            
-            # Crear capa de texto
-            txt = Image.new('RGBA', img_con_marca.size, (255, 255, 255, 0))
-            draw = ImageDraw.Draw(txt)
-            
-            # Configurar fuente - tamaño basado en la imagen
-            try:
-                tamaño_base = max(img.width, img.height)
-                tamaño_fuente = max(20, tamaño_base // 20)  # Fuente proporcional al tamaño de imagen
-                font = ImageFont.truetype("arial.ttf", tamaño_fuente)
-            except:
-                # Fallback a fuente por defecto
-                font = ImageFont.load_default()
-            
-            # Calcular posición centrada
-            bbox = draw.textbbox((0, 0), texto, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            x = (img.width - text_width) // 2
-            y = (img.height - text_height) // 2
-            
-            # Color semi-transparente
-            color = (255, 255, 255, 128)  # Blanco semi-transparente
-            
-            # Dibujar texto
-            draw.text((x, y), texto, fill=color, font=font)
-            
-            # Combinar imágenes
-            img_resultado = Image.alpha_composite(img_con_marca, txt)
-            
-            return img_resultado.convert("RGB")  # Volver a RGB para compatibilidad
-            
+
+            return MarcaAgua.aplicar_en_region(img, texto, img.size, (0, 0))
+
         except Exception as e:
             print(f"Error agregando marca de agua: {e}")
-            return img
\ No newline at end of file
+            return img
+
+    @staticmethod
+    def aplicar_en_region(img, texto, tamaño_lienzo, origen):
+        """
+        Agrega la parte de la marca de agua de una imagen de 'tamaño_lienzo' que
+        cae en 'img', que es la región de esa imagen cuya esquina está en 'origen'.
+        Permite marcar por franjas con el mismo resultado que la imagen completa.
+        """
+        capa, x, y = colocar_marca(texto, tamaño_lienzo)
+        x -= origen[0]
+        y -= origen[1]
+
+        # Parte de la capa que cae dentro de la imagen
+        caja = (max(0, x), max(0, y), min(img.width, x + capa.width), min(img.height, y + capa.height))
+        if caja[0] >= caja[2] or caja[1] >= caja[3]:
+            return img.convert("RGB")
+        recorte_capa = capa.crop((caja[0] - x, caja[1] - y, caja[2] - x, caja[3] - y))
+
+        if img.mode != "RGB":
+            # Con transparencia la mezcla depende del alfa de la imagen
+            img_con_marca = img.convert("RGBA")
+            img_con_marca.alpha_composite(recorte_capa, dest=caja[:2])
+            return img_con_marca.convert("RGB")  # Volver a RGB para compatibilidad
+
+        # Combinar sólo la región del texto, sin modificar la imagen de entrada
+        img_resultado = img.copy()
+        region = Image.alpha_composite(img_resultado.crop(caja).convert("RGBA"), recorte_capa)
+        img_resultado.paste(region.convert("RGB"), caja[:2])
+
+        return img_resultado
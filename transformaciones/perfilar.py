@@ -22,7 +22,7 @@ class Perfilar:
                 
                 return img.filter(ImageFilter.UnsharpMask(
                     radius=radio, 
-                    percent=porcentaje, 
+                    percent=int(porcentaje), 
                     threshold=umbral
                 ))
             else:
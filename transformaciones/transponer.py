@@ -0,0 +1,23 @@
+from PIL import Image
+
+class Transponer:
+    @staticmethod
+    def aplicar(img, parametros=None):
+        """Aplica una transposición exacta (giro múltiplo de 90° y/o reflejo) en una sola pasada"""
+        if parametros is None:
+            parametros = {}
+        
+        try:
+            # Nombre de Image.Transpose: ROTATE_90, FLIP_LEFT_RIGHT, TRANSPOSE, ...
+            metodo = parametros.get("metodo")
+            
+            print(f"Aplicando transposición: {metodo}")
+            
+            if metodo:
+                return img.transpose(Image.Transpose[metodo])
+            else:
+                return img
+            
+        except Exception as e:
+            print(f"Error en transposición: {e}")
+            return img
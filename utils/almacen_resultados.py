@@ -0,0 +1,167 @@
+"""
+Almacén de resultados de los trabajos asíncronos del nodo.
+Guarda el estado de cada trabajo enviado con enviar_trabajo y, al
+terminar, su resultado hasta que el cliente lo recoge o caduca (TTL). El
+tamaño total de los resultados está acotado: si no caben, se descartan
+los más antiguos y de ellos sólo queda el estado 'descartado' hasta que
+caducan. Los trabajos pendientes también están acotados, en número y en
+bytes de entrada retenidos hasta que terminan.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+MB = 1024 * 1024
+
+# Estados de un trabajo asíncrono
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+DESCARTADO = "descartado"
+DESCONOCIDO = "desconocido"
+
+
+class _Terminado:
+    __slots__ = ("estado", "resultado", "tamaño", "expira")
+
+    def __init__(self, estado: str, resultado: Optional[Dict[str, Any]], tamaño: int, expira: float):
+        self.estado = estado
+        self.resultado = resultado
+        self.tamaño = tamaño
+        self.expira = expira
+
+
+class AlmacenResultados:
+    """Estados y resultados de trabajos asíncronos con TTL y límite de bytes"""
+
+    def __init__(self, max_bytes: int, ttl: float, max_pendientes: int,
+                 max_bytes_pendientes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_pendientes = max_pendientes
+        # Bytes de entrada de los trabajos pendientes (None = sin límite)
+        self.max_bytes_pendientes = max_bytes_pendientes
+        self._lock = threading.Lock()
+        self._pendientes: Dict[str, str] = {}
+        self._entradas: Dict[str, int] = {}
+        self._bytes_pendientes = 0
+        # En orden de finalización; con TTL fijo, también en orden de caducidad
+        self._terminados: "OrderedDict[str, _Terminado]" = OrderedDict()
+        self._bytes = 0
+        self.descartados = 0
+        self.caducados = 0
+
+    def registrar(self, id_trabajo: str, tamaño_entrada: int = 0) -> Optional[str]:
+        """
+        Da de alta un trabajo en estado 'en_cola'.
+
+        Args:
+            id_trabajo: ID del trabajo
+            tamaño_entrada: Bytes de entrada que el trabajo retiene hasta terminar
+
+        Returns:
+            None si se registró; si no, el motivo del rechazo
+        """
+        with self._lock:
+            self._purgar()
+            if id_trabajo in self._pendientes or id_trabajo in self._terminados:
+                return f"Ya existe un trabajo con id {id_trabajo}"
+            if len(self._pendientes) >= self.max_pendientes:
+                return f"Demasiados trabajos asíncronos pendientes ({self.max_pendientes})"
+            if (self.max_bytes_pendientes is not None and self._pendientes and
+                    self._bytes_pendientes + tamaño_entrada > self.max_bytes_pendientes):
+                # Con nada pendiente se admite cualquier tamaño, como el presupuesto de memoria
+                return (
+                    f"Sin espacio para trabajos asíncronos: entrada de "
+                    f"{tamaño_entrada / MB:.1f} MB (pendientes {self._bytes_pendientes / MB:.1f} "
+                    f"de {self.max_bytes_pendientes / MB:.0f} MB)"
+                )
+            self._pendientes[id_trabajo] = EN_COLA
+            self._entradas[id_trabajo] = tamaño_entrada
+            self._bytes_pendientes += tamaño_entrada
+            return None
+
+    def marcar_procesando(self, id_trabajo: str):
+        with self._lock:
+            if id_trabajo in self._pendientes:
+                self._pendientes[id_trabajo] = PROCESANDO
+
+    def guardar(self, id_trabajo: str, resultado: Dict[str, Any]):
+        """Guarda el resultado de un trabajo terminado, descartando los más antiguos si no cabe"""
+        tamaño = len(resultado.get("imagen_resultado") or b"")
+        estado = COMPLETADO if resultado.get("exito") else FALLIDO
+        with self._lock:
+            self._pendientes.pop(id_trabajo, None)
+            self._bytes_pendientes -= self._entradas.pop(id_trabajo, 0)
+            self._purgar()
+            expira = time.monotonic() + self.ttl
+            if tamaño > self.max_bytes:
+                self.descartados += 1
+                self._terminados[id_trabajo] = _Terminado(DESCARTADO, None, 0, expira)
+                return
+            for otro in self._terminados.values():
+                if self._bytes + tamaño <= self.max_bytes:
+                    break
+                if otro.resultado is not None:
+                    self._descartar(otro)
+            self._terminados[id_trabajo] = _Terminado(estado, resultado, tamaño, expira)
+            self._bytes += tamaño
+
+    def consultar(self, id_trabajo: str) -> str:
+        """Estado del trabajo ('desconocido' si no existe o ya caducó)"""
+        with self._lock:
+            self._purgar()
+            if id_trabajo in self._pendientes:
+                return self._pendientes[id_trabajo]
+            terminado = self._terminados.get(id_trabajo)
+            return terminado.estado if terminado is not None else DESCONOCIDO
+
+    def retirar(self, id_trabajo: str, conservar: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de un trabajo terminado, o None si no lo hay.
+        Salvo 'conservar', deja de ocupar el almacén al entregarse.
+        """
+        with self._lock:
+            self._purgar()
+            terminado = self._terminados.get(id_trabajo)
+            if terminado is None or terminado.resultado is None:
+                return None
+            if not conservar:
+                del self._terminados[id_trabajo]
+                self._bytes -= terminado.tamaño
+            return terminado.resultado
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purgar()
+            return {
+                "pendientes": len(self._pendientes),
+                "bytes_pendientes": self._bytes_pendientes,
+                "max_bytes_pendientes": self.max_bytes_pendientes,
+                "terminados": sum(1 for t in self._terminados.values() if t.resultado is not None),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "descartados": self.descartados,
+                "caducados": self.caducados
+            }
+
+    def _descartar(self, terminado: _Terminado):
+        """Libera el resultado y deja sólo el estado (llamar con el lock tomado)"""
+        self._bytes -= terminado.tamaño
+        terminado.estado, terminado.resultado, terminado.tamaño = DESCARTADO, None, 0
+        self.descartados += 1
+
+    def _purgar(self):
+        """Elimina los trabajos terminados caducados (llamar con el lock tomado)"""
+        ahora = time.monotonic()
+        while self._terminados:
+            id_trabajo, terminado = next(iter(self._terminados.items()))
+            if terminado.expira > ahora:
+                break
+            del self._terminados[id_trabajo]
+            if terminado.resultado is not None:
+                self._bytes -= terminado.tamaño
+                self.caducados += 1
@@ -0,0 +1,112 @@
+"""
+Referencias a archivos en un almacenamiento compartido (NFS o un volumen
+local común al API y a los nodos).
+Con procesar_referencia los trabajos llevan rutas en lugar de píxeles: el
+nodo mapea la entrada con mmap y escribe el resultado directamente, de
+forma atómica (archivo temporal en el mismo directorio + os.replace), así
+que un lector nunca ve un resultado a medias. Las referencias se resuelven
+siempre dentro del directorio raíz configurado en el nodo.
+"""
+
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import unquote, urlparse
+
+# Permisos del resultado: legible por el API aunque corra con otro usuario
+PERMISOS_SALIDA = 0o644
+
+
+def resolver_referencia(referencia: str, raiz: str) -> str:
+    """
+    Ruta absoluta de una referencia dentro de 'raiz'.
+
+    Args:
+        referencia: Ruta relativa a la raíz, ruta absoluta o URI 'file://'
+        raiz: Directorio compartido (ruta real, ya resuelta)
+
+    Returns:
+        Ruta real de la referencia
+
+    Raises:
+        ValueError: Si la referencia no es válida o queda fuera de la raíz
+    """
+    if not isinstance(referencia, str) or not referencia:
+        raise ValueError("Referencia vacía")
+    uri = urlparse(referencia)
+    if uri.scheme == "file":
+        if uri.netloc not in ("", "localhost"):
+            raise ValueError(f"Host no soportado en la referencia: {uri.netloc}")
+        referencia = unquote(uri.path)
+    elif uri.scheme and len(uri.scheme) > 1:
+        # (un esquema de una letra es una unidad de Windows, no un URI)
+        raise ValueError(f"Esquema no soportado: {uri.scheme}")
+
+    ruta = os.path.realpath(os.path.join(raiz, referencia))
+    if os.path.commonpath([ruta, raiz]) != raiz or ruta == raiz:
+        raise ValueError(f"Referencia fuera del directorio compartido: {referencia}")
+    return ruta
+
+
+@contextmanager
+def mapear_lectura(ruta: str) -> Iterator[memoryview]:
+    """
+    Contenido del archivo como memoryview de un mmap de sólo lectura, sin
+    copiarlo a memoria del proceso. Un archivo vacío da una vista vacía.
+    """
+    with open(ruta, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(mapa)
+        try:
+            yield vista
+        finally:
+            try:
+                vista.release()
+                mapa.close()
+            except BufferError:
+                # Queda una vista viva; el mapa se libera cuando se recoja
+                pass
+
+
+def escribir_atomico(ruta: str, datos, sincronizar: bool = True) -> int:
+    """
+    Escribe 'datos' en 'ruta' a través de un temporal en el mismo directorio
+    que se renombra al terminar. Crea el directorio si no existe.
+
+    Args:
+        ruta: Ruta de destino
+        datos: Contenido (bytes o similar)
+        sincronizar: fsync del temporal antes de renombrarlo
+
+    Returns:
+        Bytes escritos
+    """
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(
+        dir=directorio, prefix=f".{os.path.basename(ruta)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(datos)
+            f.flush()
+            if sincronizar:
+                os.fsync(f.fileno())
+        os.chmod(temporal, PERMISOS_SALIDA)
+        os.replace(temporal, ruta)
+    except BaseException:
+        _borrar(temporal)
+        raise
+    return len(datos)
+
+
+def _borrar(ruta: Optional[str]):
+    try:
+        os.unlink(ruta)
+    except OSError:
+        pass
@@ -0,0 +1,282 @@
+"""
+Cachés del nodo worker.
+- CacheResultados: imagen resultante indexada por el hash de los bytes de
+  entrada más la receta, con un nivel LRU en memoria y un nivel opcional
+  en disco, ambos acotados en bytes.
+- CacheIntermedios: imágenes decodificadas e intermedias por prefijo de
+  receta, acotada en bytes y con caducidad.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("Cache")
+
+_EXTENSION = ".bin"
+
+
+def clave_resultado(datos, transformaciones: List[Dict], **opciones) -> str:
+    """
+    Clave de caché: blake2b de los bytes de entrada y de la serialización
+    canónica (claves ordenadas) de la receta y las opciones de procesamiento.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(datos)
+    receta = json.dumps(
+        {"transformaciones": transformaciones, "opciones": opciones},
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    h.update(receta.encode("utf-8"))
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """
+    Caché LRU de resultados en memoria con segundo nivel opcional en disco.
+    Un acierto en disco promociona la entrada a memoria.
+    """
+
+    def __init__(self, max_bytes_memoria: int, directorio: Optional[str] = None,
+                 max_bytes_disco: int = 0):
+        self.max_bytes_memoria = max_bytes_memoria
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco if directorio else 0
+        self._lock = threading.Lock()
+        self._memoria: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes_memoria = 0
+        self._disco: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes_disco = 0
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+        if self.max_bytes_disco > 0:
+            os.makedirs(directorio, exist_ok=True)
+            self._indexar_disco()
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        """Devuelve el resultado cacheado o None"""
+        with self._lock:
+            datos = self._memoria.get(clave)
+            if datos is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return datos
+            en_disco = clave in self._disco
+
+        if en_disco:
+            datos = self._leer_disco(clave)
+            if datos is not None:
+                with self._lock:
+                    if clave in self._disco:
+                        self._disco.move_to_end(clave)
+                    self.aciertos_disco += 1
+                    self._guardar_memoria(clave, datos)
+                return datos
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave: str, datos: bytes):
+        """Guarda un resultado en memoria y, si está configurado, en disco"""
+        with self._lock:
+            self._guardar_memoria(clave, datos)
+            escribir_disco = (
+                self.max_bytes_disco > 0 and
+                clave not in self._disco and
+                len(datos) <= self.max_bytes_disco
+            )
+        if escribir_disco:
+            self._escribir_disco(clave, datos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            aciertos = self.aciertos_memoria + self.aciertos_disco
+            consultas = aciertos + self.fallos
+            return {
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(aciertos / consultas, 3) if consultas else 0,
+                "entradas_memoria": len(self._memoria),
+                "bytes_memoria": self._bytes_memoria,
+                "entradas_disco": len(self._disco),
+                "bytes_disco": self._bytes_disco
+            }
+
+    # ==================== NIVEL EN MEMORIA ====================
+
+    def _guardar_memoria(self, clave: str, datos: bytes):
+        """Inserta en el LRU de memoria (llamar con el lock tomado)"""
+        if len(datos) > self.max_bytes_memoria:
+            return
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._bytes_memoria -= len(anterior)
+        self._memoria[clave] = datos
+        self._bytes_memoria += len(datos)
+        while self._bytes_memoria > self.max_bytes_memoria:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(expulsado)
+
+    # ==================== NIVEL EN DISCO ====================
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave + _EXTENSION)
+
+    def _indexar_disco(self):
+        """Reconstruye el índice LRU del disco a partir de los archivos existentes"""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(_EXTENSION):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((estado.st_mtime, nombre[:-len(_EXTENSION)], estado.st_size))
+        for _, clave, tamaño in sorted(entradas):
+            self._disco[clave] = tamaño
+            self._bytes_disco += tamaño
+        with self._lock:
+            self._expulsar_disco()
+        logger.info(f"Caché en disco: {len(self._disco)} entradas, {self._bytes_disco / 1024 / 1024:.1f} MB")
+
+    def _leer_disco(self, clave: str) -> Optional[bytes]:
+        try:
+            with open(self._ruta(clave), "rb") as f:
+                datos = f.read()
+            os.utime(self._ruta(clave))
+            return datos
+        except OSError:
+            with self._lock:
+                tamaño = self._disco.pop(clave, None)
+                if tamaño is not None:
+                    self._bytes_disco -= tamaño
+            return None
+
+    def _escribir_disco(self, clave: str, datos: bytes):
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "wb") as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en la caché de disco: {e}")
+            try:
+                os.unlink(temporal)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if clave not in self._disco:
+                self._disco[clave] = len(datos)
+                self._bytes_disco += len(datos)
+            self._expulsar_disco()
+
+    def _expulsar_disco(self):
+        """Borra las entradas menos usadas hasta caber en el límite (lock tomado)"""
+        while self._bytes_disco > self.max_bytes_disco and self._disco:
+            clave, tamaño = self._disco.popitem(last=False)
+            self._bytes_disco -= tamaño
+            try:
+                os.unlink(self._ruta(clave))
+            except OSError:
+                pass
+
+
+def tamaño_en_memoria(img) -> int:
+    """Bytes aproximados que ocupan los píxeles de una imagen PIL"""
+    if img.mode in ("I", "F"):
+        bytes_por_banda = 4
+    elif img.mode.startswith("I;16"):
+        bytes_por_banda = 2
+    else:
+        bytes_por_banda = 1
+    return img.width * img.height * len(img.getbands()) * bytes_por_banda
+
+
+class CacheIntermedios:
+    """
+    Caché LRU de imágenes PIL intermedias con caducidad.
+    Las imágenes guardadas se comparten entre trabajos: nunca deben
+    modificarse en sitio, sólo usarse como entrada de la siguiente
+    transformación.
+    """
+
+    def __init__(self, max_bytes: int, ttl_segundos: float):
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener_mas_profundo(self, claves: List[Hashable]):
+        """
+        Recorre las claves de la última a la primera y devuelve la primera
+        imagen vigente. Cuenta un único acierto o fallo por consulta.
+
+        Returns:
+            Tupla (índice de la clave encontrada, imagen) o (-1, None)
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            for indice in range(len(claves) - 1, -1, -1):
+                entrada = self._entradas.get(claves[indice])
+                if entrada is None:
+                    continue
+                if entrada[2] < ahora:
+                    self._quitar(claves[indice])
+                    continue
+                self._entradas.move_to_end(claves[indice])
+                self.aciertos += 1
+                return indice, entrada[0]
+            self.fallos += 1
+            return -1, None
+
+    def cabe(self, img) -> bool:
+        return tamaño_en_memoria(img) <= self.max_bytes
+
+    def guardar(self, clave: Hashable, img):
+        tamaño = tamaño_en_memoria(img)
+        if tamaño > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (img, tamaño, time.monotonic() + self.ttl_segundos)
+            self._bytes += tamaño
+            ahora = time.monotonic()
+            # Primero lo caducado, luego lo menos usado
+            for caducada in [c for c, e in self._entradas.items() if e[2] < ahora]:
+                self._quitar(caducada)
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes
+            }
+
+    def _quitar(self, clave: Hashable):
+        """Elimina una entrada (llamar con el lock tomado)"""
+        _, tamaño, _ = self._entradas.pop(clave)
+        self._bytes -= tamaño
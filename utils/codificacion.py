@@ -0,0 +1,120 @@
+"""
+Perfiles de codificación de la imagen de salida.
+El formato y las opciones del codificador salen de la receta: del último
+paso 'convert_format', que admite un 'perfil' predefinido y/o opciones
+sueltas (las sueltas mandan sobre las del perfil). Sin ese paso se usa el
+formato por defecto con las opciones de siempre (máxima compresión).
+
+Parámetros de 'convert_format':
+    formato: 'PNG', 'JPEG' (o 'JPG') o 'WEBP'
+    perfil: nombre de un perfil de PERFILES
+    calidad: 1-100 (JPEG y WEBP con pérdida)
+    compresion: nivel zlib 0-9 (PNG)
+    optimizar: búsqueda exhaustiva de la mejor compresión (PNG y JPEG)
+    progresivo: JPEG progresivo
+    sin_perdida: WEBP sin pérdida
+    esfuerzo: esfuerzo del codificador WEBP, 0 (rápido) a 6 (compacto)
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Formatos de salida soportados
+FORMATOS_SALIDA = ("PNG", "JPEG", "WEBP")
+
+FORMATO_POR_DEFECTO = "PNG"
+
+# Perfiles predefinidos, orientados a velocidad o a tamaño
+PERFILES: Dict[str, Dict[str, Any]] = {
+    "png_rapido": {"formato": "PNG", "compresion": 1, "optimizar": False},
+    "png_equilibrado": {"formato": "PNG", "compresion": 6, "optimizar": False},
+    "png_compacto": {"formato": "PNG", "compresion": 9, "optimizar": True},
+    "jpeg_rapido": {"formato": "JPEG", "calidad": 85, "optimizar": False, "progresivo": False},
+    "jpeg_web": {"formato": "JPEG", "calidad": 85, "optimizar": True, "progresivo": True},
+    "jpeg_calidad": {"formato": "JPEG", "calidad": 95, "optimizar": True, "progresivo": False},
+    "webp_rapido": {"formato": "WEBP", "calidad": 80, "esfuerzo": 0},
+    "webp_compacto": {"formato": "WEBP", "calidad": 80, "esfuerzo": 6},
+    "webp_sin_perdida": {"formato": "WEBP", "sin_perdida": True, "esfuerzo": 1},
+}
+
+# Opciones cuando la receta no indica otras (el comportamiento histórico)
+_OPCIONES_POR_DEFECTO = {
+    "PNG": {"compresion": 9, "optimizar": True},
+    "JPEG": {"calidad": 95, "optimizar": True, "progresivo": False},
+    "WEBP": {"calidad": 95, "sin_perdida": False, "esfuerzo": 4},
+}
+
+_OPCIONES = ("calidad", "compresion", "optimizar", "progresivo", "sin_perdida", "esfuerzo")
+
+
+def normalizar_formato(formato: Optional[str], por_defecto: str = FORMATO_POR_DEFECTO) -> str:
+    """Nombre de formato de Pillow ('JPG' -> 'JPEG'); 'por_defecto' si no es soportado"""
+    formato = str(formato or "").upper()
+    if formato == "JPG":
+        formato = "JPEG"
+    return formato if formato in FORMATOS_SALIDA else por_defecto
+
+
+def formato_paso(parametros: Optional[Dict]) -> str:
+    """Formato de salida que fija un paso 'convert_format'"""
+    parametros = parametros or {}
+    perfil = PERFILES.get(parametros.get("perfil"), {})
+    return normalizar_formato(parametros.get("formato") or perfil.get("formato"))
+
+
+def resolver_codificacion(transformaciones: List[Dict],
+                          formato: str = FORMATO_POR_DEFECTO) -> Dict[str, Any]:
+    """
+    Formato y opciones de codificación de una receta.
+
+    Args:
+        transformaciones: Lista de transformaciones del trabajo
+        formato: Formato si la receta no tiene paso 'convert_format'
+
+    Returns:
+        Dict con 'formato' y las opciones del codificador (ver el docstring del módulo)
+    """
+    parametros = None
+    for paso in transformaciones or []:
+        if isinstance(paso, dict) and paso.get("tipo") == "convert_format":
+            parametros = paso.get("parametros") or {}
+
+    if parametros is None:
+        formato = normalizar_formato(formato)
+        return dict(_OPCIONES_POR_DEFECTO[formato], formato=formato)
+
+    formato = formato_paso(parametros)
+    codificacion = dict(_OPCIONES_POR_DEFECTO[formato])
+    perfil = PERFILES.get(parametros.get("perfil"), {})
+    if perfil.get("formato") == formato:
+        codificacion.update((k, v) for k, v in perfil.items() if k in _OPCIONES)
+    codificacion.update((k, parametros[k]) for k in _OPCIONES if parametros.get(k) is not None)
+    codificacion["formato"] = formato
+    return codificacion
+
+
+def opciones_guardado(codificacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos de Image.save para una codificación de resolver_codificacion"""
+    formato = codificacion["formato"]
+    if formato == "JPEG":
+        return {
+            "format": "JPEG",
+            "quality": _acotar(codificacion.get("calidad"), 1, 100),
+            "optimize": bool(codificacion.get("optimizar")),
+            "progressive": bool(codificacion.get("progresivo")),
+        }
+    if formato == "WEBP":
+        return {
+            "format": "WEBP",
+            "quality": _acotar(codificacion.get("calidad"), 0, 100),
+            "lossless": bool(codificacion.get("sin_perdida")),
+            "method": _acotar(codificacion.get("esfuerzo"), 0, 6),
+        }
+    return {
+        "format": "PNG",
+        "compress_level": _acotar(codificacion.get("compresion"), 0, 9),
+        "optimize": bool(codificacion.get("optimizar")),
+    }
+
+
+def _acotar(valor, minimo: int, maximo: int) -> int:
+    return max(minimo, min(maximo, int(valor)))
@@ -0,0 +1,162 @@
+"""
+Cola de espera de trabajos del nodo worker.
+Cuando el nodo está lleno, los trabajos esperan su turno aquí en lugar de
+rechazarse. El siguiente en entrar es el de la clase de prioridad más alta
+con trabajos en espera; dentro de una clase, los clientes se turnan (el que
+lleva más tiempo sin ser atendido primero) y cada cliente respeta el orden
+de llegada de sus trabajos. Así un lote masivo de un cliente no bloquea las
+ediciones interactivas de otro.
+Los trabajos de lote y asíncronos ponen aquí su turno al recibirse y el
+nodo los despacha cuando les toca (turnos 'diferidos'); las llamadas
+síncronas esperan su turno en su propio hilo.
+No es thread-safe: se usa siempre con el lock del nodo tomado.
+"""
+
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+# Clases de prioridad, de mayor a menor
+PRIORIDADES = ("interactiva", "normal", "masiva")
+PRIORIDAD_POR_DEFECTO = "normal"
+
+_MAX_CLIENTES_RECORDADOS = 4096
+
+
+class Turno:
+    """
+    Un trabajo en espera. 'trabajo' es lo que el nodo despacha al tocarle
+    el turno (None si el llamante espera su turno por sí mismo).
+    """
+
+    __slots__ = ("memoria", "prioridad", "cliente", "llegada", "trabajo")
+
+    def __init__(self, memoria: int = 0, prioridad: str = PRIORIDAD_POR_DEFECTO,
+                 cliente: Optional[str] = None, trabajo: Any = None):
+        self.memoria = memoria
+        self.prioridad = prioridad
+        self.cliente = cliente
+        self.llegada = time.monotonic()
+        self.trabajo = trabajo
+
+
+class ColaEspera:
+    """
+    Cola de turnos por prioridad y cliente, con métricas de espera.
+    'tamaño_maximo' acota sólo los trabajos que piden no esperar
+    indefinidamente (ver NodoWorker._reservar_slot); los diferidos no cuentan.
+    """
+
+    def __init__(self, tamaño_maximo: int):
+        self.tamaño_maximo = tamaño_maximo
+        # prioridad -> cliente -> turnos en orden de llegada
+        self._clases: Dict[str, "OrderedDict[Optional[str], deque]"] = {
+            prioridad: OrderedDict() for prioridad in PRIORIDADES
+        }
+        self._total = 0
+        self._diferidos = 0
+        # Número de admisión en que se atendió por última vez a cada cliente
+        self._ultimo_servicio: Dict[Optional[str], int] = {}
+        self._admisiones = 0
+        self._metricas = {
+            prioridad: {"admitidos": 0, "espera_total": 0.0, "espera_maxima": 0.0}
+            for prioridad in PRIORIDADES
+        }
+        self.rechazos_cola_llena = 0
+        self.rechazos_plazo = 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def llena(self) -> bool:
+        return self._total - self._diferidos >= self.tamaño_maximo
+
+    def hay_por_delante(self, prioridad: str) -> bool:
+        """Si hay turnos en espera de la clase 'prioridad' o de una más alta"""
+        for clase in PRIORIDADES[:PRIORIDADES.index(prioridad) + 1]:
+            if self._clases[clase]:
+                return True
+        return False
+
+    def agregar(self, turno: Turno):
+        self._clases[turno.prioridad].setdefault(turno.cliente, deque()).append(turno)
+        self._total += 1
+        self._diferidos += turno.trabajo is not None
+
+    def siguiente(self) -> Optional[Turno]:
+        """Turno al que le toca entrar"""
+        for prioridad in PRIORIDADES:
+            clientes = self._clases[prioridad]
+            if clientes:
+                cliente = min(
+                    clientes,
+                    key=lambda c: (self._ultimo_servicio.get(c, -1), clientes[c][0].llegada)
+                )
+                return clientes[cliente][0]
+        return None
+
+    def quitar(self, turno: Turno) -> bool:
+        """Saca un turno de la cola; False si ya no estaba"""
+        clientes = self._clases[turno.prioridad]
+        turnos = clientes.get(turno.cliente)
+        if not turnos:
+            return False
+        try:
+            turnos.remove(turno)
+        except ValueError:
+            return False
+        if not turnos:
+            del clientes[turno.cliente]
+        self._total -= 1
+        self._diferidos -= turno.trabajo is not None
+        return True
+
+    def retirar_diferidos(self) -> List[Turno]:
+        """Saca de la cola todos los turnos diferidos (p. ej. al detener el nodo)"""
+        diferidos = [
+            turno for clientes in self._clases.values()
+            for turnos in clientes.values() for turno in turnos
+            if turno.trabajo is not None
+        ]
+        for turno in diferidos:
+            self.quitar(turno)
+        return diferidos
+
+    def registrar_admision(self, turno: Turno, esperado: bool = True):
+        """Anota que el turno entró; 'esperado' indica si pasó por la cola"""
+        self._admisiones += 1
+        self._ultimo_servicio[turno.cliente] = self._admisiones
+        if len(self._ultimo_servicio) > _MAX_CLIENTES_RECORDADOS:
+            # Olvidar a los clientes sin trabajos en espera
+            en_espera = {c for clientes in self._clases.values() for c in clientes}
+            self._ultimo_servicio = {c: n for c, n in self._ultimo_servicio.items() if c in en_espera}
+        if not esperado:
+            return
+        espera = time.monotonic() - turno.llegada
+        metricas = self._metricas[turno.prioridad]
+        metricas["admitidos"] += 1
+        metricas["espera_total"] += espera
+        metricas["espera_maxima"] = max(metricas["espera_maxima"], espera)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        admitidos = sum(m["admitidos"] for m in self._metricas.values())
+        espera_total = sum(m["espera_total"] for m in self._metricas.values())
+        return {
+            "en_espera": self._total,
+            "diferidos": self._diferidos,
+            "tamaño_maximo": self.tamaño_maximo,
+            "admitidos_tras_espera": admitidos,
+            "espera_media_ms": round(1000 * espera_total / admitidos, 1) if admitidos else 0,
+            "espera_maxima_ms": round(1000 * max(m["espera_maxima"] for m in self._metricas.values()), 1),
+            "rechazos_cola_llena": self.rechazos_cola_llena,
+            "rechazos_plazo": self.rechazos_plazo,
+            "por_prioridad": {
+                prioridad: {
+                    "en_espera": sum(len(t) for t in self._clases[prioridad].values()),
+                    "admitidos_tras_espera": m["admitidos"],
+                    "espera_media_ms": round(1000 * m["espera_total"] / m["admitidos"], 1) if m["admitidos"] else 0,
+                    "espera_maxima_ms": round(1000 * m["espera_maxima"], 1)
+                }
+                for prioridad, m in self._metricas.items()
+            }
+        }
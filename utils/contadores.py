@@ -0,0 +1,65 @@
+"""
+Contadores acumulativos con escritura sin lock.
+Cada hilo suma en su propio diccionario (un solo escritor por shard) y la
+lectura combina todos los shards, así que los trabajos no compiten por el
+lock del nodo para actualizar estadísticas ni con quien las consulta. Una
+lectura concurrente puede no ver aún el último incremento de otro hilo,
+pero nunca pierde incrementos.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+
+class ContadoresPorHilo:
+    """Contadores con un shard por hilo que se combinan al leer"""
+
+    def __init__(self, nombres: Iterable[str]):
+        self.nombres = tuple(nombres)
+        self._local = threading.local()
+        # (hilo, shard); sólo se toma el lock al registrar un hilo nuevo y al leer
+        self._shards: List[Tuple[threading.Thread, Dict[str, float]]] = []
+        # Totales de los hilos que ya terminaron
+        self._retirados = dict.fromkeys(self.nombres, 0)
+        self._lock = threading.Lock()
+
+    def sumar(self, **incrementos):
+        """Suma a cada contador indicado, p. ej. sumar(trabajos_completados=1)"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._registrar_hilo()
+        for nombre, valor in incrementos.items():
+            shard[nombre] += valor
+
+    def valores(self) -> Dict[str, float]:
+        """Total de cada contador sumando todos los shards"""
+        with self._lock:
+            self._retirar_terminados()
+            total = dict(self._retirados)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            for nombre in self.nombres:
+                total[nombre] += shard[nombre]
+        return total
+
+    def __getitem__(self, nombre: str) -> float:
+        return self.valores()[nombre]
+
+    def _registrar_hilo(self) -> Dict[str, float]:
+        shard = dict.fromkeys(self.nombres, 0)
+        with self._lock:
+            self._retirar_terminados()
+            self._shards.append((threading.current_thread(), shard))
+        self._local.shard = shard
+        return shard
+
+    def _retirar_terminados(self):
+        """Pliega en _retirados los shards de hilos terminados (llamar con el lock tomado)"""
+        vivos = []
+        for hilo, shard in self._shards:
+            if hilo.is_alive():
+                vivos.append((hilo, shard))
+            else:
+                for nombre in self.nombres:
+                    self._retirados[nombre] += shard[nombre]
+        self._shards = vivos
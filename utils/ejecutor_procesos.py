@@ -0,0 +1,191 @@
+"""
+Ejecución de trabajos en un pool de procesos.
+Cada proceso hijo tiene su propio ProcesadorImagenesImpl, de modo que el
+GIL del nodo no serializa los trabajos. Los bytes de entrada y salida se
+entregan mediante memoria compartida en lugar de copiarse por el pipe.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("EjecutorProcesos")
+
+# Procesador propio de cada proceso hijo (se crea en el inicializador)
+_procesador = None
+
+
+def _inicializar_proceso():
+    """Inicializador de cada proceso del pool"""
+    global _procesador
+    from procesador_imagen import ProcesadorImagenesImpl
+    _procesador = ProcesadorImagenesImpl()
+
+
+def _procesar_en_proceso(metodo: str, nombre_entrada: str, tamaño: int, args: tuple, opciones: Dict):
+    """
+    Ejecuta un método del procesador dentro del proceso hijo.
+    Lee la entrada del bloque compartido y deja cada resultado en un bloque nuevo.
+
+    Returns:
+        Tupla (respuesta, tiempos por etapa del procesador); la respuesta es
+        (nombre del bloque de salida, tamaño), una lista de ellas para los
+        métodos que devuelven varias imágenes, o None si falló
+    """
+    entrada = shared_memory.SharedMemory(name=nombre_entrada)
+    vista = entrada.buf[:tamaño]
+    try:
+        resultado = getattr(_procesador, metodo)(vista, *args, **opciones)
+    finally:
+        vista.release()
+        entrada.close()
+
+    inicio = time.perf_counter()
+    if isinstance(resultado, list):
+        respuesta = [_exportar(r) for r in resultado]
+    else:
+        respuesta = _exportar(resultado)
+    tiempos = _procesador.ultimos_tiempos()
+    tiempos["memoria_compartida"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return respuesta, tiempos
+
+
+def _exportar(resultado: Optional[bytes]):
+    """Copia un resultado a un bloque de memoria compartida nuevo"""
+    if resultado is None:
+        return None
+    salida = shared_memory.SharedMemory(create=True, size=max(len(resultado), 1))
+    salida.buf[:len(resultado)] = resultado
+    salida.close()
+    return salida.name, len(resultado)
+
+
+def _importar(respuesta) -> Optional[bytes]:
+    """Recupera un resultado del bloque compartido y lo libera"""
+    if respuesta is None:
+        return None
+    nombre_salida, tamaño = respuesta
+    salida = shared_memory.SharedMemory(name=nombre_salida)
+    try:
+        return bytes(salida.buf[:tamaño])
+    finally:
+        salida.close()
+        salida.unlink()
+
+
+class EjecutorProcesos:
+    """
+    Pool de procesos con la misma interfaz de procesamiento que ProcesadorImagenesImpl.
+    Cada slot de capacidad del nodo corresponde a un proceso del pool.
+    """
+
+    def __init__(self, num_procesos: int):
+        self.num_procesos = num_procesos
+        self._contexto = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        # Tiempos del último trabajo de cada hilo llamante (ver ultimos_tiempos)
+        self._local = threading.local()
+        self._pool = self._crear_pool()
+        logger.info(f"Pool de procesos inicializado con {num_procesos} procesos")
+
+    def _crear_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.num_procesos,
+            mp_context=self._contexto,
+            initializer=_inicializar_proceso
+        )
+
+    def procesar_bytes(self, datos, lista_transformaciones: List[Dict],
+                       id_trabajo: str = None, **opciones) -> Optional[bytes]:
+        """
+        Procesa una imagen en un proceso del pool.
+        Las opciones se pasan tal cual a ProcesadorImagenesImpl.procesar_bytes.
+
+        Returns:
+            bytes de la imagen resultante, o None si el procesamiento falló
+        """
+        respuesta = self._ejecutar(
+            "procesar_bytes", datos, (lista_transformaciones, id_trabajo), opciones
+        )
+        inicio = time.perf_counter()
+        resultado = _importar(respuesta)
+        self._sumar_memoria_compartida(time.perf_counter() - inicio)
+        return resultado
+
+    def procesar_variantes_bytes(self, datos, recetas: List[List[Dict]],
+                                 id_trabajo: str = None, **opciones) -> List[Optional[bytes]]:
+        """
+        Genera varias variantes de una imagen en un único proceso del pool.
+        Las opciones se pasan tal cual a ProcesadorImagenesImpl.procesar_variantes_bytes.
+
+        Returns:
+            Lista con los bytes de cada variante (None en las que fallaron)
+        """
+        respuestas = self._ejecutar(
+            "procesar_variantes_bytes", datos, (recetas, id_trabajo), opciones
+        )
+        inicio = time.perf_counter()
+        resultados = [_importar(r) for r in respuestas]
+        self._sumar_memoria_compartida(time.perf_counter() - inicio)
+        return resultados
+
+    def ultimos_tiempos(self) -> Dict[str, Any]:
+        """
+        Tiempos por etapa del último trabajo enviado desde este hilo, como
+        ProcesadorImagenesImpl.ultimos_tiempos más 'memoria_compartida' (copias
+        de entrada y salida entre procesos).
+        """
+        return dict(getattr(self._local, 'tiempos', None) or {})
+
+    def _sumar_memoria_compartida(self, segundos: float):
+        tiempos = getattr(self._local, 'tiempos', None)
+        if tiempos is not None:
+            tiempos["memoria_compartida"] = round(tiempos.get("memoria_compartida", 0) + segundos * 1000, 2)
+
+    def _ejecutar(self, metodo: str, datos, args: tuple, opciones: Dict):
+        """
+        Copia la entrada a memoria compartida y espera la respuesta del proceso
+        hijo. Deja sus tiempos por etapa en los del hilo llamante.
+        """
+        self._local.tiempos = None
+        inicio = time.perf_counter()
+        datos = memoryview(datos).cast('B')
+        entrada = shared_memory.SharedMemory(create=True, size=max(len(datos), 1))
+        try:
+            entrada.buf[:len(datos)] = datos
+            copia = time.perf_counter() - inicio
+            futuro = self._enviar(
+                _procesar_en_proceso, metodo, entrada.name, len(datos), args, opciones
+            )
+            respuesta, self._local.tiempos = futuro.result()
+            self._sumar_memoria_compartida(copia)
+            return respuesta
+        finally:
+            entrada.close()
+            entrada.unlink()
+
+    def _enviar(self, funcion, *args):
+        """Envía una tarea al pool, recreándolo si un proceso hijo murió"""
+        with self._lock:
+            pool = self._pool
+        try:
+            return pool.submit(funcion, *args)
+        except BrokenProcessPool:
+            logger.warning("Pool de procesos roto, recreando...")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = self._crear_pool()
+                pool = self._pool
+            return pool.submit(funcion, *args)
+
+    def cerrar(self):
+        """Detiene el pool dejando terminar los trabajos en curso"""
+        with self._lock:
+            self._pool.shutdown(wait=False)
+        logger.info("Pool de procesos detenido")
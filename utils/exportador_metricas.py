@@ -0,0 +1,195 @@
+"""
+Exportador de métricas del nodo en formato de texto de Prometheus.
+Sirve GET /metrics con un ThreadingHTTPServer de la biblioteca estándar en
+un hilo propio, leyendo el estado del nodo en el mismo proceso: observar
+muchos nodos no añade llamadas Pyro5 al daemon del worker.
+"""
+
+import multiprocessing
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from utils.logger import get_logger
+from utils.metricas import TRANSFORMACIONES, Histograma
+
+logger = get_logger("ExportadorMetricas")
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+PREFIJO = "nodo_worker"
+
+
+def leer_rss(pid="self") -> Optional[int]:
+    """Memoria residente (VmRSS) de un proceso en bytes, o None si no se puede leer /proc"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def formatear_metricas(nodo) -> str:
+    """
+    Métricas del nodo en formato de exposición de texto de Prometheus.
+
+    Args:
+        nodo: NodoWorker del que leer el estado
+
+    Returns:
+        Texto con una métrica por línea, terminado en salto de línea
+    """
+    estado = nodo.obtener_estado()
+    histogramas = nodo.metricas.copia()
+    etiquetas = {"nodo": nodo.id_nodo}
+    lineas: List[str] = []
+
+    def metrica(nombre: str, tipo: str, ayuda: str, valores):
+        """valores: lista de (etiquetas extra, valor)"""
+        lineas.append(f"# HELP {PREFIJO}_{nombre} {ayuda}")
+        lineas.append(f"# TYPE {PREFIJO}_{nombre} {tipo}")
+        for extra, valor in valores:
+            if valor is not None:
+                lineas.append(f"{PREFIJO}_{nombre}{_etiquetas(dict(etiquetas, **extra))} {_numero(valor)}")
+
+    def histograma(nombre: str, ayuda: str, series: Dict[str, Histograma], etiqueta: Optional[str]):
+        lineas.append(f"# HELP {PREFIJO}_{nombre} {ayuda}")
+        lineas.append(f"# TYPE {PREFIJO}_{nombre} histogram")
+        for valor_etiqueta, h in sorted(series.items()):
+            base = dict(etiquetas, **({etiqueta: valor_etiqueta} if etiqueta else {}))
+            for limite, acumulado in h.acumuladas():
+                le = "+Inf" if limite == float("inf") else _numero(limite / 1000)
+                lineas.append(f"{PREFIJO}_{nombre}_bucket{_etiquetas(dict(base, le=le))} {acumulado}")
+            lineas.append(f"{PREFIJO}_{nombre}_sum{_etiquetas(base)} {_numero(h.suma_ms / 1000)}")
+            lineas.append(f"{PREFIJO}_{nombre}_count{_etiquetas(base)} {h.total}")
+
+    metrica("trabajos_total", "counter", "Trabajos terminados por resultado", [
+        ({"resultado": "completado"}, estado["trabajos_completados"]),
+        ({"resultado": "fallido"}, estado["trabajos_fallidos"] - estado["trabajos_invalidos"]),
+        ({"resultado": "invalido"}, estado["trabajos_invalidos"]),
+    ])
+    metrica("trabajos_activos", "gauge", "Trabajos en ejecución", [({}, estado["trabajos_activos"])])
+    metrica("capacidad_maxima", "gauge", "Trabajos concurrentes admitidos", [({}, estado["capacidad_maxima"])])
+    metrica("memoria_reservada_bytes", "gauge", "Memoria estimada de los trabajos en curso",
+            [({}, nodo.memoria_reservada)])
+    metrica("presupuesto_memoria_bytes", "gauge", "Presupuesto de memoria de los trabajos en curso",
+            [({}, nodo.presupuesto_memoria)])
+
+    cola = estado["cola"]
+    metrica("cola_en_espera", "gauge", "Trabajos esperando slot por prioridad", [
+        ({"prioridad": prioridad}, datos["en_espera"]) for prioridad, datos in cola["por_prioridad"].items()
+    ])
+    metrica("cola_rechazos_total", "counter", "Trabajos rechazados por la cola de espera", [
+        ({"motivo": "cola_llena"}, cola["rechazos_cola_llena"]),
+        ({"motivo": "plazo"}, cola["rechazos_plazo"]),
+    ])
+
+    metrica("bytes_recibidos_total", "counter", "Bytes de imagen recibidos", [({}, estado["bytes_recibidos"])])
+    metrica("bytes_enviados_total", "counter", "Bytes de imagen devueltos", [({}, estado["bytes_enviados"])])
+
+    histograma("trabajo_segundos", "Latencia total de los trabajos", {"": histogramas["trabajos"]}, None)
+    histograma("etapa_segundos", "Tiempo por etapa de los trabajos", histogramas["etapas"], "etapa")
+    histograma("transformacion_segundos", "Tiempo por tipo de transformación",
+               histogramas[TRANSFORMACIONES], "tipo")
+
+    cache = estado.get("cache")
+    if cache:
+        metrica("cache_consultas_total", "counter", "Consultas a la caché de resultados", [
+            ({"resultado": "acierto_memoria"}, cache["aciertos_memoria"]),
+            ({"resultado": "acierto_disco"}, cache["aciertos_disco"]),
+            ({"resultado": "fallo"}, cache["fallos"]),
+        ])
+        metrica("cache_bytes", "gauge", "Bytes en la caché de resultados", [
+            ({"nivel": "memoria"}, cache["bytes_memoria"]),
+            ({"nivel": "disco"}, cache["bytes_disco"]),
+        ])
+    intermedios = estado.get("cache_intermedios")
+    if intermedios:
+        metrica("cache_intermedios_consultas_total", "counter", "Consultas a la caché de intermedios", [
+            ({"resultado": "acierto"}, intermedios["aciertos"]),
+            ({"resultado": "fallo"}, intermedios["fallos"]),
+        ])
+        metrica("cache_intermedios_bytes", "gauge", "Bytes en la caché de intermedios",
+                [({}, intermedios["bytes"])])
+
+    hijos = [leer_rss(p.pid) for p in multiprocessing.active_children()]
+    metrica("rss_bytes", "gauge", "Memoria residente del nodo y de sus procesos hijos", [
+        ({"proceso": "principal"}, leer_rss()),
+        ({"proceso": "hijos"}, sum(r for r in hijos if r is not None) if hijos else None),
+    ])
+    return "\n".join(lineas) + "\n"
+
+
+class ExportadorMetricas:
+    """Servidor HTTP de métricas de un nodo en un hilo de fondo"""
+
+    def __init__(self, nodo, host: str = "0.0.0.0", puerto: int = 9100):
+        self.nodo = nodo
+        self.host = host
+        self.puerto = puerto
+        self._servidor: Optional[ThreadingHTTPServer] = None
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self) -> int:
+        """Arranca el servidor; devuelve el puerto (útil con puerto=0)"""
+        self._servidor = ThreadingHTTPServer((self.host, self.puerto), _crear_manejador(self.nodo))
+        self._servidor.daemon_threads = True
+        self.puerto = self._servidor.server_address[1]
+        self._hilo = threading.Thread(
+            target=self._servidor.serve_forever, name=f"metricas-{self.nodo.id_nodo}", daemon=True
+        )
+        self._hilo.start()
+        logger.info(f"Métricas disponibles en http://{self.host}:{self.puerto}/metrics (pid {os.getpid()})")
+        return self.puerto
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+
+def _crear_manejador(nodo):
+    class ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                cuerpo = formatear_metricas(nodo).encode("utf-8")
+            except Exception as e:
+                logger.error(f"Error generando métricas: {e}", exc_info=True)
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", TIPO_CONTENIDO)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            # Sin una línea de log por cada scrape
+            pass
+
+    return ManejadorMetricas
+
+
+def _etiquetas(valores: Dict[str, Any]) -> str:
+    if not valores:
+        return ""
+    pares = ",".join(f'{k}="{_escapar(str(v))}"' for k, v in valores.items())
+    return "{" + pares + "}"
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float):
+        return repr(round(valor, 6))
+    return str(valor)
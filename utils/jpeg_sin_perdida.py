@@ -0,0 +1,60 @@
+"""
+Transposiciones de JPEG sin pérdida con jpegtran (libjpeg-turbo).
+Gira y refleja reordenando los bloques DCT, sin decodificar ni volver a
+comprimir, así que no hay pérdida generacional y cuesta una fracción de
+una recodificación. Es opcional: si jpegtran no está instalado o la
+imagen no admite la transformación exacta (bordes que no completan un
+bloque), las funciones devuelven None y se usa el camino normal.
+"""
+
+import shutil
+import subprocess
+from typing import Optional
+
+# Ejecutable de jpegtran, si está en el PATH
+JPEGTRAN = shutil.which("jpegtran")
+
+# Segundos máximos por imagen
+TIEMPO_MAXIMO = 30
+
+# Método de Image.Transpose -> argumentos de jpegtran (que gira en sentido horario)
+_ARGUMENTOS = {
+    "FLIP_LEFT_RIGHT": ["-flip", "horizontal"],
+    "FLIP_TOP_BOTTOM": ["-flip", "vertical"],
+    "ROTATE_90": ["-rotate", "270"],
+    "ROTATE_180": ["-rotate", "180"],
+    "ROTATE_270": ["-rotate", "90"],
+    "TRANSPOSE": ["-transpose"],
+    "TRANSVERSE": ["-transverse"],
+}
+
+
+def disponible() -> bool:
+    return JPEGTRAN is not None
+
+
+def transponer_jpeg(datos: bytes, metodo: str) -> Optional[bytes]:
+    """
+    Aplica una transposición a un JPEG sin recodificarlo.
+
+    Args:
+        datos: JPEG de entrada
+        metodo: Nombre de Image.Transpose (ROTATE_90, FLIP_LEFT_RIGHT, ...)
+
+    Returns:
+        JPEG transformado, o None si no se puede hacer sin pérdida
+    """
+    if JPEGTRAN is None or metodo not in _ARGUMENTOS:
+        return None
+    try:
+        # -perfect: fallar antes que recortar los bloques incompletos del borde
+        # -copy none: sin metadatos, igual que al recodificar con Pillow
+        proceso = subprocess.run(
+            [JPEGTRAN, "-copy", "none", "-perfect"] + _ARGUMENTOS[metodo],
+            input=datos, capture_output=True, timeout=TIEMPO_MAXIMO
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if proceso.returncode != 0 or not proceso.stdout:
+        return None
+    return proceso.stdout
@@ -0,0 +1,69 @@
+"""
+Lectura de imágenes en memoria sin copiarlas.
+io.BytesIO copia el búfer entero que recibe, también cuando es un
+memoryview de una subida o de un archivo mapeado con mmap. LectorMemoria
+ofrece a Pillow la interfaz de archivo (read/seek/tell) sobre el búfer
+original: sólo se copia lo que el decodificador lee en cada llamada.
+"""
+
+import io
+
+
+class LectorMemoria(io.RawIOBase):
+    """Archivo de sólo lectura sobre un objeto tipo bytes, sin copiarlo"""
+
+    def __init__(self, datos):
+        super().__init__()
+        self._vista = memoryview(datos).cast("B")
+        self._posicion = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, tamaño: int = -1) -> bytes:
+        self._comprobar_abierto()
+        inicio = min(self._posicion, len(self._vista))
+        fin = len(self._vista) if tamaño is None or tamaño < 0 else min(len(self._vista), inicio + tamaño)
+        self._posicion = fin
+        return self._vista[inicio:fin].tobytes()
+
+    def readinto(self, destino) -> int:
+        self._comprobar_abierto()
+        destino = memoryview(destino).cast("B")
+        inicio = min(self._posicion, len(self._vista))
+        leidos = min(len(destino), len(self._vista) - inicio)
+        destino[:leidos] = self._vista[inicio:inicio + leidos]
+        self._posicion = inicio + leidos
+        return leidos
+
+    def seek(self, desplazamiento: int, origen: int = io.SEEK_SET) -> int:
+        self._comprobar_abierto()
+        if origen == io.SEEK_SET:
+            posicion = desplazamiento
+        elif origen == io.SEEK_CUR:
+            posicion = self._posicion + desplazamiento
+        elif origen == io.SEEK_END:
+            posicion = len(self._vista) + desplazamiento
+        else:
+            raise ValueError(f"Origen de seek inválido: {origen}")
+        if posicion < 0:
+            raise ValueError(f"Posición negativa: {posicion}")
+        self._posicion = posicion
+        return posicion
+
+    def tell(self) -> int:
+        self._comprobar_abierto()
+        return self._posicion
+
+    def close(self):
+        if not self.closed:
+            # Libera la vista para que el búfer original (p. ej. un mmap) pueda cerrarse
+            self._vista.release()
+        super().close()
+
+    def _comprobar_abierto(self):
+        if self.closed:
+            raise ValueError("Operación sobre un LectorMemoria cerrado")
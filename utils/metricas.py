@@ -0,0 +1,158 @@
+"""
+Tiempos por etapa de los trabajos.
+Cronometro acumula lo que tarda cada etapa de un trabajo (transferencia,
+decodificación, cada transformación por tipo y codificación) y
+MetricasEtapas los agrega en el nodo como histogramas de cubetas fijas:
+la latencia total de los trabajos, por etapa y por tipo de transformación.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Límites superiores de las cubetas de los histogramas, en milisegundos
+CUBETAS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Clave de tiempos() con los tiempos de cada tipo de transformación
+TRANSFORMACIONES = "transformaciones"
+
+
+class Cronometro:
+    """Tiempos de las etapas de un trabajo. No es thread-safe: uno por trabajo."""
+
+    def __init__(self):
+        self._etapas: Dict[str, float] = {}
+        self._transformaciones: Dict[str, float] = {}
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Suma a 'nombre' lo que tarda el bloque"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.perf_counter() - inicio)
+
+    @contextmanager
+    def transformacion(self, tipo: str) -> Iterator[None]:
+        """Suma al tipo de transformación lo que tarda el bloque"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._transformaciones[tipo] = (
+                self._transformaciones.get(tipo, 0.0) + time.perf_counter() - inicio
+            )
+
+    def sumar(self, nombre: str, segundos: float):
+        self._etapas[nombre] = self._etapas.get(nombre, 0.0) + segundos
+
+    def tiempos(self) -> Dict[str, Any]:
+        """Milisegundos por etapa; los de cada transformación, bajo 'transformaciones'"""
+        tiempos: Dict[str, Any] = {nombre: _ms(s) for nombre, s in self._etapas.items()}
+        tiempos[TRANSFORMACIONES] = {tipo: _ms(s) for tipo, s in self._transformaciones.items()}
+        return tiempos
+
+
+class Histograma:
+    """Histograma de tiempos con cubetas fijas (CUBETAS_MS y una final sin límite)"""
+
+    def __init__(self):
+        self.cuentas = [0] * (len(CUBETAS_MS) + 1)
+        self.total = 0
+        self.suma_ms = 0.0
+
+    def observar(self, ms: float):
+        indice = len(CUBETAS_MS)
+        for i, limite in enumerate(CUBETAS_MS):
+            if ms <= limite:
+                indice = i
+                break
+        self.cuentas[indice] += 1
+        self.total += 1
+        self.suma_ms += ms
+
+    def percentil(self, q: float) -> Optional[float]:
+        """Límite superior de la cubeta que contiene el percentil q (0-1); None si está vacío"""
+        if not self.total:
+            return None
+        objetivo = q * self.total
+        acumulado = 0
+        for limite, cuenta in zip(CUBETAS_MS, self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return limite
+        return float("inf")
+
+    def acumuladas(self) -> List[Tuple[float, int]]:
+        """(límite, observaciones <= límite) por cubeta, incluida la final (inf)"""
+        resultado = []
+        acumulado = 0
+        for limite, cuenta in zip(CUBETAS_MS + (float("inf"),), self.cuentas):
+            acumulado += cuenta
+            resultado.append((limite, acumulado))
+        return resultado
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "observaciones": self.total,
+            "media_ms": round(self.suma_ms / self.total, 2) if self.total else 0,
+            "p50_ms": self.percentil(0.5),
+            "p95_ms": self.percentil(0.95),
+            "p99_ms": self.percentil(0.99),
+        }
+
+
+class MetricasEtapas:
+    """Histogramas de latencia de los trabajos y de tiempos por etapa y por tipo de transformación"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.trabajos = Histograma()
+        self.etapas: Dict[str, Histograma] = {}
+        self.transformaciones: Dict[str, Histograma] = {}
+
+    def registrar(self, tiempos: Dict[str, Any]):
+        """Añade los tiempos de un trabajo (con la forma de Cronometro.tiempos)"""
+        with self._lock:
+            for nombre, ms in tiempos.items():
+                if nombre == TRANSFORMACIONES:
+                    for tipo, ms_tipo in ms.items():
+                        self.transformaciones.setdefault(tipo, Histograma()).observar(ms_tipo)
+                else:
+                    self.etapas.setdefault(nombre, Histograma()).observar(ms)
+
+    def registrar_trabajo(self, segundos: float):
+        """Añade la latencia total de un trabajo, de la recepción a la respuesta"""
+        with self._lock:
+            self.trabajos.observar(segundos * 1000)
+
+    def copia(self) -> Dict[str, Any]:
+        """Copia consistente de los histogramas: 'trabajos', 'etapas' y 'transformaciones'"""
+        with self._lock:
+            return {
+                "trabajos": _copiar(self.trabajos),
+                "etapas": {nombre: _copiar(h) for nombre, h in self.etapas.items()},
+                TRANSFORMACIONES: {tipo: _copiar(h) for tipo, h in self.transformaciones.items()},
+            }
+
+    def estadisticas(self) -> Dict[str, Any]:
+        copia = self.copia()
+        return {
+            "trabajos": copia["trabajos"].resumen(),
+            "etapas": {nombre: h.resumen() for nombre, h in copia["etapas"].items()},
+            TRANSFORMACIONES: {tipo: h.resumen() for tipo, h in copia[TRANSFORMACIONES].items()},
+        }
+
+
+def _copiar(histograma: Histograma) -> Histograma:
+    copia = Histograma()
+    copia.cuentas = list(histograma.cuentas)
+    copia.total = histograma.total
+    copia.suma_ms = histograma.suma_ms
+    return copia
+
+
+def _ms(segundos: float) -> float:
+    return round(segundos * 1000, 2)
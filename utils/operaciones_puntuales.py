@@ -0,0 +1,128 @@
+"""
+Motor de operaciones puntuales.
+Compila una secuencia de brillo, contraste y escala de grises en tablas de
+consulta (LUT) y las aplica con Image.point, de modo que cada tramo entre
+cambios de modo recorre la imagen una sola vez en lugar de una vez por
+operación.
+
+Las tablas se obtienen aplicando ImageEnhance a un degradado de 256 valores,
+así que reproducen exactamente el redondeo de BrilloContraste. La única
+diferencia posible es la media del contraste cuando le precede otro ajuste
+pendiente en una imagen RGB: se estima con los histogramas por canal sin
+materializar la imagen intermedia y puede diferir en un nivel. Por eso el
+motor sólo se usa a través del optimizador: con orden_estricto las
+transformaciones conservan la aritmética de ImageEnhance.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageEnhance, ImageStat
+
+# Modos que el motor sabe procesar (el resto usa las transformaciones originales)
+MODOS_SOPORTADOS = ("L", "RGB")
+
+_IDENTIDAD = tuple(range(256))
+
+# Pesos de la conversión RGB -> L de Pillow (en 1/65536)
+_PESOS_LUMA = (19595, 38470, 7471)
+
+
+@lru_cache(maxsize=1)
+def _degradado() -> Image.Image:
+    return Image.frombytes("L", (256, 1), bytes(_IDENTIDAD))
+
+
+@lru_cache(maxsize=256)
+def tabla_brillo(factor: float) -> Tuple[int, ...]:
+    """LUT equivalente a ImageEnhance.Brightness(img).enhance(factor)"""
+    return tuple(ImageEnhance.Brightness(_degradado()).enhance(factor).tobytes())
+
+
+@lru_cache(maxsize=1024)
+def tabla_contraste(factor: float, media: int) -> Tuple[int, ...]:
+    """LUT equivalente a ImageEnhance.Contrast con la media de luminancia dada"""
+    return tuple(Image.blend(Image.new("L", (256, 1), media), _degradado(), factor).tobytes())
+
+
+def factores(parametros: Dict) -> Tuple[float, float]:
+    """Factores (brillo, contraste) de BrilloContraste a partir de valores -100..100"""
+    return (
+        1.0 + (parametros.get("value", 0) / 100.0),
+        1.0 + (parametros.get("contraste", 0) / 100.0)
+    )
+
+
+def es_operacion_puntual(paso: Dict) -> bool:
+    """Pasos que el motor puede compilar"""
+    if paso.get("tipo") == "grayscale":
+        return True
+    if paso.get("tipo") not in ("brightness", "contrast"):
+        return False
+    parametros = paso.get("parametros") or {}
+    return all(
+        isinstance(parametros.get(clave, 0), (int, float)) and not isinstance(parametros.get(clave, 0), bool)
+        for clave in ("value", "contraste")
+    )
+
+
+def aplicar_operaciones(img: Image.Image, pasos: List[Dict]) -> Optional[Image.Image]:
+    """
+    Aplica una secuencia de operaciones puntuales.
+
+    Args:
+        img: Imagen de entrada (no se modifica)
+        pasos: Dicts con 'tipo' ('brightness', 'contrast' o 'grayscale') y 'parametros'
+
+    Returns:
+        Imagen resultante, o None si el modo de la imagen no está soportado
+    """
+    if img.mode not in MODOS_SOPORTADOS:
+        return None
+
+    tabla = _IDENTIDAD
+    histograma = None
+    for paso in pasos:
+        if paso.get("tipo") == "grayscale":
+            if img.mode != "L":
+                img = _aplicar_tabla(img, tabla).convert("L")
+                tabla, histograma = _IDENTIDAD, None
+            continue
+
+        factor_brillo, factor_contraste = factores(paso.get("parametros") or {})
+        if factor_brillo != 1.0:
+            brillo = tabla_brillo(factor_brillo)
+            tabla = tuple(brillo[v] for v in tabla)
+        if factor_contraste != 1.0:
+            if histograma is None and tabla is not _IDENTIDAD:
+                histograma = img.histogram()
+            media = _media_luminancia(img, tabla, histograma)
+            contraste = tabla_contraste(factor_contraste, media)
+            tabla = tuple(contraste[v] for v in tabla)
+
+    return _aplicar_tabla(img, tabla) if tabla != _IDENTIDAD else img.copy()
+
+
+def _aplicar_tabla(img: Image.Image, tabla: Tuple[int, ...]) -> Image.Image:
+    if tabla is _IDENTIDAD:
+        return img
+    return img.point(list(tabla) * len(img.getbands()))
+
+
+def _media_luminancia(img: Image.Image, tabla: Tuple[int, ...], histograma: Optional[List[int]]) -> int:
+    """
+    Media de luminancia redondeada, como la calcula ImageEnhance.Contrast,
+    de la imagen tras aplicar 'tabla'.
+    """
+    if tabla is _IDENTIDAD:
+        gris = img if img.mode == "L" else img.convert("L")
+        return int(ImageStat.Stat(gris).mean[0] + 0.5)
+
+    pixeles = max(1, img.width * img.height)
+    medias = [
+        sum(cuenta * tabla[v] for v, cuenta in enumerate(histograma[banda * 256:(banda + 1) * 256])) / pixeles
+        for banda in range(len(img.getbands()))
+    ]
+    if img.mode == "L":
+        return int(medias[0] + 0.5)
+    return int(sum(peso * media for peso, media in zip(_PESOS_LUMA, medias)) / 65536 + 0.5)
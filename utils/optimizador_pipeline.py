@@ -0,0 +1,360 @@
+"""
+Optimizador del pipeline de transformaciones.
+Reescribe la lista de transformaciones del frontend en una equivalente
+más barata antes de ejecutarla: elimina pasos nulos, fusiona giros y
+reflejos consecutivos en una sola transposición, adelanta recortes por
+delante de operaciones puntuales, combina ajustes de brillo/contraste
+adyacentes y compila las operaciones puntuales que quedan seguidas (o un
+ajuste con brillo y contraste a la vez) en un único paso de tablas de
+consulta.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from utils.operaciones_puntuales import es_operacion_puntual, factores
+
+Tamaño = Optional[Tuple[int, int]]
+
+# Transposiciones como matrices 2x2 sobre coordenadas (x a la derecha, y hacia abajo)
+_MATRICES_TRANSPOSICION = {
+    "FLIP_LEFT_RIGHT": ((-1, 0), (0, 1)),
+    "FLIP_TOP_BOTTOM": ((1, 0), (0, -1)),
+    "ROTATE_90": ((0, 1), (-1, 0)),
+    "ROTATE_180": ((-1, 0), (0, -1)),
+    "ROTATE_270": ((0, -1), (1, 0)),
+    "TRANSPOSE": ((0, 1), (1, 0)),
+    "TRANSVERSE": ((0, -1), (-1, 0)),
+}
+_IDENTIDAD = ((1, 0), (0, 1))
+_METODO_POR_MATRIZ = {matriz: metodo for metodo, matriz in _MATRICES_TRANSPOSICION.items()}
+_GIROS_90 = {0: _IDENTIDAD, 1: _MATRICES_TRANSPOSICION["ROTATE_90"],
+             2: _MATRICES_TRANSPOSICION["ROTATE_180"], 3: _MATRICES_TRANSPOSICION["ROTATE_270"]}
+
+# Tipos que intercambian ancho y alto
+_TRANSPOSICIONES_CON_GIRO = {"ROTATE_90", "ROTATE_270", "TRANSPOSE", "TRANSVERSE"}
+
+
+def optimizar_transformaciones(lista_transformaciones: List[Dict], tamaño: Tamaño = None) -> List[Dict]:
+    """
+    Devuelve una lista de transformaciones equivalente y más barata.
+    No modifica la lista ni los diccionarios recibidos.
+
+    Args:
+        lista_transformaciones: Lista de dicts con 'tipo' y 'parametros' del frontend
+        tamaño: (ancho, alto) de la imagen de entrada, si se conoce. Sin él no
+                se eliminan recortes ni redimensionados nulos.
+
+    Returns:
+        Nueva lista de transformaciones
+    """
+    pasos = [
+        {"tipo": t.get("tipo"), "parametros": dict(t.get("parametros") or {})}
+        for t in lista_transformaciones
+    ]
+    pasos = _eliminar_nulos(pasos, tamaño)
+    pasos = _adelantar_recortes(pasos)
+    pasos = _fusionar_transposiciones(pasos)
+    pasos = _combinar_ajustes(pasos)
+    pasos = _compilar_puntuales(pasos)
+    return pasos
+
+
+def tamaño_tras(paso: Dict, tamaño: Tamaño) -> Tamaño:
+    """
+    Calcula el tamaño de la imagen después de aplicar un paso, replicando la
+    lógica de cada transformación. Devuelve None si no puede determinarse
+    con exactitud (p. ej. tras un giro que no es múltiplo de 90°).
+    """
+    if tamaño is None:
+        return None
+    tipo = paso.get("tipo")
+    parametros = paso.get("parametros") or {}
+    ancho, alto = tamaño
+
+    try:
+        if tipo == "resize":
+            nuevo_ancho = parametros.get("ancho")
+            nuevo_alto = parametros.get("alto")
+            if nuevo_ancho and not nuevo_alto:
+                nuevo_alto = int(alto * (nuevo_ancho / float(ancho)))
+            elif nuevo_alto and not nuevo_ancho:
+                nuevo_ancho = int(ancho * (nuevo_alto / float(alto)))
+            elif not nuevo_ancho and not nuevo_alto:
+                return tamaño
+            return int(nuevo_ancho), int(nuevo_alto)
+
+        if tipo == "crop":
+            izquierda, superior, derecha, inferior = caja_recorte(parametros, tamaño)
+            return derecha - izquierda, inferior - superior
+
+        if tipo == "rotate":
+            grados = parametros.get("degrees", 0)
+            if grados % 90 == 0:
+                return (alto, ancho) if (grados // 90) % 2 else tamaño
+            # El lienzo expandido depende del redondeo de Pillow
+            return None
+
+        if tipo == "transpose":
+            if parametros.get("metodo") in _TRANSPOSICIONES_CON_GIRO:
+                return alto, ancho
+            return tamaño
+
+        return tamaño
+
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def caja_recorte(parametros: Dict, tamaño: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """Caja (izquierda, superior, derecha, inferior) efectiva de un recorte, como en Recortar"""
+    ancho, alto = tamaño
+    izquierda = max(0, min(parametros.get("izquierda", 0), ancho))
+    superior = max(0, min(parametros.get("superior", 0), alto))
+    derecha = max(izquierda + 1, min(parametros.get("derecha", ancho), ancho))
+    inferior = max(superior + 1, min(parametros.get("inferior", alto), alto))
+    return izquierda, superior, derecha, inferior
+
+
+def reduccion_inicial(pasos: List[Dict], tamaño: Tamaño):
+    """
+    Detecta si el pipeline empieza por un recorte opcional seguido de un
+    redimensionado, que es lo que permite decodificar a menor resolución.
+
+    Returns:
+        (caja del recorte en la imagen original, tamaño destino del
+        redimensionado, número de pasos que cubre) o None
+    """
+    if tamaño is None:
+        return None
+
+    caja = (0, 0) + tuple(tamaño)
+    indice = 0
+    if pasos and pasos[0].get("tipo") == "crop":
+        try:
+            caja = caja_recorte(pasos[0]["parametros"], tamaño)
+        except TypeError:
+            return None
+        indice = 1
+
+    if len(pasos) <= indice or pasos[indice].get("tipo") != "resize":
+        return None
+
+    region = (caja[2] - caja[0], caja[3] - caja[1])
+    destino = tamaño_tras(pasos[indice], region)
+    if destino is None or destino[0] <= 0 or destino[1] <= 0:
+        return None
+    return caja, destino, indice + 1
+
+
+def transposicion_equivalente(pasos: List[Dict]) -> Optional[str]:
+    """
+    Si todos los pasos son giros de 90° o reflejos, el método de
+    Image.Transpose que equivale a aplicarlos seguidos ('' si se anulan entre
+    sí); None si alguno no es una transposición exacta.
+    """
+    matriz = _IDENTIDAD
+    for paso in pasos:
+        paso_matriz = _matriz({"tipo": paso.get("tipo"), "parametros": paso.get("parametros") or {}})
+        if paso_matriz is None:
+            return None
+        matriz = _componer(matriz, paso_matriz)
+    return _METODO_POR_MATRIZ.get(matriz, "")
+
+
+# ==================== PASADAS DEL OPTIMIZADOR ====================
+
+def _tamaños(pasos: List[Dict], tamaño: Tamaño) -> List[Tamaño]:
+    """Tamaño de la imagen antes de cada paso"""
+    tamaños = []
+    for paso in pasos:
+        tamaños.append(tamaño)
+        tamaño = tamaño_tras(paso, tamaño)
+    return tamaños
+
+
+def _es_numero(valor) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def _es_nulo(paso: Dict, tamaño: Tamaño) -> bool:
+    """True si el paso no altera la imagen"""
+    tipo = paso["tipo"]
+    parametros = paso["parametros"]
+
+    if tipo == "blur":
+        radio = parametros.get("radius", 0)
+        return _es_numero(radio) and radio <= 0
+    if tipo == "sharpen":
+        nivel = parametros.get("value", 0)
+        return _es_numero(nivel) and nivel <= 0
+    if tipo == "rotate":
+        grados = parametros.get("degrees", 0)
+        return _es_numero(grados) and grados % 360 == 0
+    if tipo == "watermark":
+        texto = parametros.get("text", "")
+        return not texto or (isinstance(texto, str) and texto.strip() == "")
+    if tipo in ("brightness", "contrast"):
+        return parametros.get("value", 0) == 0 and parametros.get("contraste", 0) == 0
+    if tipo == "resize":
+        if not parametros.get("ancho") and not parametros.get("alto"):
+            return True
+        return tamaño is not None and tamaño_tras(paso, tamaño) == tamaño
+    if tipo == "crop":
+        if tamaño is None:
+            return False
+        try:
+            return caja_recorte(parametros, tamaño) == (0, 0) + tuple(tamaño)
+        except TypeError:
+            return False
+    return False
+
+
+def _eliminar_nulos(pasos: List[Dict], tamaño: Tamaño) -> List[Dict]:
+    return [paso for paso, t in zip(pasos, _tamaños(pasos, tamaño)) if not _es_nulo(paso, t)]
+
+
+def _es_ajuste(paso: Dict) -> bool:
+    """Brillo/contraste con valores numéricos (ambos tipos usan BrilloContraste)"""
+    parametros = paso["parametros"]
+    return (
+        paso["tipo"] in ("brightness", "contrast") and
+        _es_numero(parametros.get("value", 0)) and
+        _es_numero(parametros.get("contraste", 0))
+    )
+
+
+def _es_solo_brillo(paso: Dict) -> bool:
+    return _es_ajuste(paso) and paso["parametros"].get("contraste", 0) == 0
+
+
+def _adelantar_recortes(pasos: List[Dict]) -> List[Dict]:
+    """
+    Mueve los recortes por delante de la escala de grises y del brillo que
+    los preceden, para que éstos procesen menos píxeles: son operaciones
+    píxel a píxel, así que conmutan exactamente con el recorte.
+    Los redimensionados no se adelantan: brillo y contraste saturan en
+    0-255 y remuestrear antes de saturar no da los mismos píxeles.
+    """
+    resultado: List[Dict] = []
+    for paso in pasos:
+        posicion = len(resultado)
+        if paso["tipo"] == "crop":
+            while posicion > 0 and (resultado[posicion - 1]["tipo"] == "grayscale" or
+                                    _es_solo_brillo(resultado[posicion - 1])):
+                posicion -= 1
+        resultado.insert(posicion, paso)
+    return resultado
+
+
+def _matriz(paso: Dict):
+    """Matriz de transposición del paso, o None si no es una transposición exacta"""
+    tipo = paso["tipo"]
+    parametros = paso["parametros"]
+    if tipo == "flip":
+        return _MATRICES_TRANSPOSICION["FLIP_LEFT_RIGHT"]
+    if tipo == "flop":
+        return _MATRICES_TRANSPOSICION["FLIP_TOP_BOTTOM"]
+    if tipo == "transpose":
+        return _MATRICES_TRANSPOSICION.get(parametros.get("metodo"))
+    if tipo == "rotate":
+        grados = parametros.get("degrees", 0)
+        if _es_numero(grados) and grados % 90 == 0:
+            return _GIROS_90[int(grados // 90) % 4]
+    return None
+
+
+def _componer(primera, segunda):
+    """Matriz de aplicar 'primera' y después 'segunda'"""
+    return tuple(
+        tuple(sum(segunda[i][k] * primera[k][j] for k in range(2)) for j in range(2))
+        for i in range(2)
+    )
+
+
+def _fusionar_transposiciones(pasos: List[Dict]) -> List[Dict]:
+    """Sustituye cada racha de giros de 90° y reflejos por una sola transposición"""
+    resultado: List[Dict] = []
+    racha: List[Dict] = []
+
+    def cerrar_racha():
+        if len(racha) == 1:
+            resultado.append(racha[0])
+        elif racha:
+            matriz = _IDENTIDAD
+            for paso in racha:
+                matriz = _componer(matriz, _matriz(paso))
+            if matriz != _IDENTIDAD:
+                resultado.append({"tipo": "transpose",
+                                  "parametros": {"metodo": _METODO_POR_MATRIZ[matriz]}})
+        racha.clear()
+
+    for paso in pasos:
+        if _matriz(paso) is not None:
+            racha.append(paso)
+        else:
+            cerrar_racha()
+            resultado.append(paso)
+    cerrar_racha()
+    return resultado
+
+
+def _combinar_ajustes(pasos: List[Dict]) -> List[Dict]:
+    """
+    Combina ajustes de brillo/contraste adyacentes en un único paso de
+    BrilloContraste y elimina escalas de grises repetidas.
+    """
+    resultado: List[Dict] = []
+    for paso in pasos:
+        previo = resultado[-1] if resultado else None
+
+        if previo is not None and paso["tipo"] == "grayscale" and previo["tipo"] == "grayscale":
+            continue
+
+        if previo is not None and _es_ajuste(previo) and _es_ajuste(paso):
+            combinado = _combinar_par(previo["parametros"], paso["parametros"])
+            if combinado is not None:
+                resultado[-1] = {"tipo": "brightness", "parametros": combinado}
+                continue
+
+        resultado.append(paso)
+    return resultado
+
+
+def _combinar_par(primero: Dict, segundo: Dict) -> Optional[Dict]:
+    """
+    Parámetros de un único BrilloContraste equivalente a aplicar 'primero' y
+    luego 'segundo', o None si no es posible sin cambiar el resultado.
+    """
+    brillo_1, contraste_1 = primero.get("value", 0), primero.get("contraste", 0)
+    brillo_2, contraste_2 = segundo.get("value", 0), segundo.get("contraste", 0)
+
+    # BrilloContraste aplica brillo y después contraste. Dos brillos no se
+    # multiplican en un solo factor: cada uno redondea a enteros y el
+    # producto difiere; _compilar_puntuales los compone con sus tablas exactas
+    if contraste_1 == 0 and brillo_2 == 0:
+        return {"value": brillo_1, "contraste": contraste_2}
+
+    return None
+
+
+def _compilar_puntuales(pasos: List[Dict]) -> List[Dict]:
+    """
+    Agrupa cada tramo de dos o más operaciones puntuales seguidas en un paso
+    'point_ops', que las aplica con una tabla de consulta por cambio de modo.
+    Un ajuste suelto con brillo y contraste también cuenta como tramo: son
+    dos pasadas de ImageEnhance.
+    """
+    resultado: List[Dict] = []
+    tramo: List[Dict] = []
+    for paso in pasos + [None]:
+        if paso is not None and es_operacion_puntual(paso):
+            tramo.append(paso)
+            continue
+        if len(tramo) > 1 or (tramo and 1.0 not in factores(tramo[0]["parametros"])):
+            resultado.append({"tipo": "point_ops", "parametros": {"pasos": tramo}})
+        else:
+            resultado.extend(tramo)
+        tramo = []
+        if paso is not None:
+            resultado.append(paso)
+    return resultado
@@ -0,0 +1,129 @@
+"""
+Sondeo de imágenes sin decodificarlas.
+Lee sólo la cabecera (Image.open es perezoso) para conocer formato,
+dimensiones, modo y número de fotogramas. Con ello el nodo rechaza antes de
+ocupar un slot las entradas corruptas, los formatos no soportados y las
+bombas de descompresión, y estima la memoria que ocupará el trabajo para
+admitirlo por coste y no sólo por número.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from utils.lector_memoria import LectorMemoria
+from utils.optimizador_pipeline import tamaño_tras
+
+# Bytes por píxel de los intermedios en el peor caso (RGBA en la marca de agua)
+BYTES_POR_PIXEL = 4
+
+# Formatos de entrada aceptados
+FORMATOS_SOPORTADOS = ("JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF")
+
+# Límite por defecto: el umbral a partir del cual Pillow se niega a decodificar
+MAX_PIXELES = 2 * (Image.MAX_IMAGE_PIXELS or 89478485)
+
+
+def leer_cabecera(datos) -> Optional[Dict[str, Any]]:
+    """
+    Formato, dimensiones, modo y fotogramas de una imagen leyendo sólo su cabecera.
+
+    Returns:
+        Dict con 'formato', 'ancho', 'alto', 'modo' y 'fotogramas', o None si
+        no es una imagen reconocible
+    """
+    try:
+        return _abrir_cabecera(datos)
+    except Exception:
+        return None
+
+
+def sondear(datos, max_pixeles: Optional[int] = MAX_PIXELES,
+            formatos=FORMATOS_SOPORTADOS) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Valida una imagen antes de admitir el trabajo, leyendo sólo su cabecera.
+
+    Args:
+        datos: Imagen codificada
+        max_pixeles: Máximo de píxeles por fotograma (None = sin límite)
+        formatos: Formatos aceptados
+
+    Returns:
+        Tupla (cabecera o None, motivo del rechazo o None si es válida)
+    """
+    if not datos:
+        return None, "Imagen vacía"
+    try:
+        cabecera = _abrir_cabecera(datos)
+    except Image.DecompressionBombError as e:
+        return None, f"Imagen rechazada por tamaño (posible bomba de descompresión): {e}"
+    except Exception:
+        return None, "No es una imagen reconocible o está dañada"
+
+    if cabecera["formato"] not in formatos:
+        return cabecera, f"Formato no soportado: {cabecera['formato']}. Opciones: {', '.join(formatos)}"
+    if cabecera["ancho"] <= 0 or cabecera["alto"] <= 0:
+        return cabecera, f"Dimensiones inválidas: {cabecera['ancho']}x{cabecera['alto']}"
+    pixeles = cabecera["ancho"] * cabecera["alto"]
+    if max_pixeles is not None and pixeles > max_pixeles:
+        return cabecera, (
+            f"Imagen rechazada por tamaño (posible bomba de descompresión): "
+            f"{cabecera['ancho']}x{cabecera['alto']} supera {max_pixeles / 1_000_000:.0f} MP"
+        )
+    return cabecera, None
+
+
+def _abrir_cabecera(datos) -> Dict[str, Any]:
+    with LectorMemoria(datos) as lector, Image.open(lector) as img:
+        return {
+            "formato": img.format,
+            "ancho": img.width,
+            "alto": img.height,
+            "modo": img.mode,
+            "fotogramas": getattr(img, "n_frames", 1)
+        }
+
+
+def estimar_memoria(datos, transformaciones: List[Dict],
+                    cabecera: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Estimación conservadora del pico de memoria de un trabajo en bytes: la
+    entrada codificada, la imagen decodificada y, en el paso más caro, su
+    entrada y su salida a la vez.
+
+    Args:
+        datos: Imagen codificada
+        transformaciones: Lista de transformaciones del trabajo
+        cabecera: Resultado de leer_cabecera si ya se tiene
+
+    Returns:
+        Bytes estimados (sólo el tamaño de 'datos' si la cabecera no se puede leer)
+    """
+    cabecera = cabecera or leer_cabecera(datos)
+    if cabecera is None:
+        return len(datos)
+
+    tamaño = (cabecera["ancho"], cabecera["alto"])
+    pixeles = [tamaño[0] * tamaño[1]]
+    for paso in transformaciones:
+        tamaño = tamaño_tras(paso, tamaño) or _cota_tamaño(paso, tamaño)
+        pixeles.append(tamaño[0] * tamaño[1])
+
+    pico_pasos = max((a + b for a, b in zip(pixeles, pixeles[1:])), default=pixeles[0])
+    return len(datos) + BYTES_POR_PIXEL * (pixeles[0] + pico_pasos)
+
+
+def _cota_tamaño(paso: Dict, tamaño: Tuple[int, int]) -> Tuple[int, int]:
+    """Cota superior del tamaño tras un paso cuyo tamaño exacto no se conoce"""
+    if paso.get("tipo") == "rotate":
+        try:
+            radianes = math.radians(float((paso.get("parametros") or {}).get("degrees", 0)))
+        except (TypeError, ValueError):
+            return tamaño
+        coseno, seno = abs(math.cos(radianes)), abs(math.sin(radianes))
+        ancho, alto = tamaño
+        # Lienzo expandido del giro, con margen para el redondeo de Pillow
+        return (math.ceil(ancho * coseno + alto * seno) + 1,
+                math.ceil(ancho * seno + alto * coseno) + 1)
+    return tamaño
@@ -0,0 +1,275 @@
+"""
+Subidas fragmentadas de imágenes grandes.
+El cliente abre la subida declarando el tamaño total, envía fragmentos en
+orden y la confirma con el sha256 del contenido. Los fragmentos se copian
+en un búfer reservado de antemano (en memoria si es pequeño, si no en un
+archivo temporal mapeado con mmap), así que la imagen nunca viaja en un
+único mensaje Pyro5. El procesador lee ese búfer sin copiarlo (ver
+LectorMemoria); en modo 'procesos' se copia una vez a memoria compartida.
+Los resultados grandes vuelven por el mismo camino: se vuelcan a un búfer
+igual (ver GestorSubidas.guardar) y se descargan por fragmentos.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger("Subidas")
+
+MB = 1024 * 1024
+
+# Tamaño de fragmento recomendado a los clientes (muy por debajo del límite de mensaje de Pyro5)
+TAMAÑO_FRAGMENTO = 4 * MB
+
+# Subidas mayores se guardan en un archivo temporal en lugar de en memoria
+UMBRAL_MEMORIA = 32 * MB
+
+
+class _Subida:
+    """Búfer de una subida en curso. escribir() se serializa con su propio lock."""
+
+    def __init__(self, tamaño: int, sha256: Optional[str], directorio: Optional[str]):
+        self.tamaño = tamaño
+        self.sha256 = sha256.lower() if sha256 else None
+        self.recibidos = 0
+        # Resultado para descargar (ver GestorSubidas.guardar), no una subida
+        self.descarga = False
+        self.ultima_actividad = time.monotonic()
+        self.lock = threading.Lock()
+        self._hash = hashlib.sha256()
+        self._archivo = None
+        if tamaño <= UMBRAL_MEMORIA:
+            self.buffer = bytearray(tamaño)
+        else:
+            # Archivo anónimo: desaparece al cerrarlo aunque el nodo caiga
+            self._archivo = tempfile.TemporaryFile(dir=directorio, prefix="subida-")
+            try:
+                os.posix_fallocate(self._archivo.fileno(), 0, tamaño)
+            except (AttributeError, OSError):
+                self._archivo.truncate(tamaño)
+            self.buffer = mmap.mmap(self._archivo.fileno(), tamaño)
+
+    def escribir(self, offset: int, datos) -> int:
+        """Copia un fragmento; devuelve los bytes recibidos hasta ahora"""
+        with self.lock:
+            fin = offset + len(datos)
+            if offset < 0 or fin > self.tamaño:
+                raise ValueError(f"Fragmento fuera de rango: {offset}-{fin} de {self.tamaño} bytes")
+            # Reenvío de un fragmento ya recibido (p. ej. un reintento del cliente)
+            if fin <= self.recibidos and offset < self.recibidos:
+                return self.recibidos
+            if offset != self.recibidos:
+                raise ValueError(f"Fragmento fuera de orden: offset {offset}, se esperaba {self.recibidos}")
+            self.buffer[offset:fin] = datos
+            self._hash.update(datos)
+            self.recibidos = fin
+            self.ultima_actividad = time.monotonic()
+            return fin
+
+    def resumen(self) -> str:
+        return self._hash.hexdigest()
+
+    def cerrar(self):
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                # Queda una vista viva; el mapa se libera cuando se recoja
+                pass
+        if self._archivo is not None:
+            self._archivo.close()
+        self.buffer = None
+
+
+class GestorSubidas:
+    """Subidas fragmentadas en curso, acotadas en bytes y con caducidad por inactividad"""
+
+    def __init__(self, max_bytes: int, ttl: float, directorio: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._subidas: Dict[str, _Subida] = {}
+        # Bytes de las subidas abiertas y de las que se están procesando
+        self._bytes = 0
+        self.completadas = 0
+        self.caducadas = 0
+        self.rechazadas_checksum = 0
+
+    def abrir(self, tamaño: int, sha256: Optional[str] = None) -> str:
+        """
+        Reserva el búfer de una subida.
+
+        Args:
+            tamaño: Tamaño total en bytes
+            sha256: Checksum esperado (también se puede dar al confirmar)
+
+        Returns:
+            id de la subida
+
+        Raises:
+            ValueError: Tamaño inválido o sin espacio para la subida
+        """
+        if not isinstance(tamaño, int) or tamaño <= 0:
+            raise ValueError(f"Tamaño de subida inválido: {tamaño}")
+        with self._lock:
+            self._purgar()
+            if self._bytes + tamaño > self.max_bytes:
+                raise ValueError(
+                    f"Sin espacio para la subida: {tamaño / MB:.1f} MB "
+                    f"(en uso {self._bytes / MB:.1f} de {self.max_bytes / MB:.0f} MB)"
+                )
+            self._bytes += tamaño
+        try:
+            subida = _Subida(tamaño, sha256, self.directorio)
+        except Exception:
+            with self._lock:
+                self._bytes -= tamaño
+            raise
+        id_subida = uuid.uuid4().hex
+        with self._lock:
+            self._subidas[id_subida] = subida
+        return id_subida
+
+    def escribir(self, id_subida: str, offset: int, datos) -> int:
+        """Añade un fragmento; devuelve los bytes recibidos. ValueError si no procede."""
+        return self._obtener(id_subida).escribir(offset, datos)
+
+    def guardar(self, datos) -> str:
+        """
+        Vuelca un resultado a un búfer como el de una subida (en un archivo
+        temporal si es grande), dentro del mismo límite de bytes, para
+        descargarlo por fragmentos con leer().
+
+        Returns:
+            id de la descarga
+
+        Raises:
+            ValueError: Sin espacio para el resultado
+        """
+        id_descarga = self.abrir(len(datos))
+        subida = self._obtener(id_descarga)
+        subida.descarga = True
+        try:
+            subida.escribir(0, datos)
+        except Exception:
+            self.cancelar(id_descarga, descarga=True)
+            raise
+        return id_descarga
+
+    def leer(self, id_descarga: str, offset: int, tamaño: int) -> Tuple[bytes, int]:
+        """
+        Fragmento de un resultado guardado con guardar(). Leer cuenta como
+        actividad: la descarga caduca tras ttl segundos sin pedir fragmentos.
+
+        Returns:
+            Tupla (datos, tamaño total)
+
+        Raises:
+            ValueError: Descarga desconocida o caducada, o fragmento fuera de rango
+        """
+        subida = self._obtener(id_descarga, descarga=True)
+        with subida.lock:
+            if subida.buffer is None:
+                raise ValueError(f"Descarga desconocida o caducada: {id_descarga}")
+            if not 0 <= offset <= subida.tamaño or tamaño <= 0:
+                raise ValueError(f"Fragmento fuera de rango: offset {offset}, tamaño {tamaño}")
+            subida.ultima_actividad = time.monotonic()
+            return bytes(subida.buffer[offset:offset + tamaño]), subida.tamaño
+
+    @contextmanager
+    def tomar(self, id_subida: str, sha256: Optional[str] = None) -> Iterator[memoryview]:
+        """
+        Contenido de una subida completa y con el checksum correcto. La
+        subida deja de existir: al salir del bloque se libera su búfer.
+
+        Raises:
+            ValueError: Subida desconocida, incompleta o con checksum erróneo
+                (en este último caso se descarta)
+        """
+        with self._lock:
+            subida = self._subidas.get(id_subida)
+            if subida is None or subida.descarga:
+                raise ValueError(f"Subida desconocida o caducada: {id_subida}")
+            if subida.recibidos != subida.tamaño:
+                raise ValueError(f"Subida incompleta: {subida.recibidos} de {subida.tamaño} bytes")
+            del self._subidas[id_subida]
+
+        try:
+            esperado = (sha256 or subida.sha256 or "").lower()
+            if not esperado:
+                raise ValueError("Falta el sha256 de la subida")
+            if subida.resumen() != esperado:
+                with self._lock:
+                    self.rechazadas_checksum += 1
+                raise ValueError(f"sha256 no coincide: recibido {subida.resumen()}, esperado {esperado}")
+            with self._lock:
+                self.completadas += 1
+            vista = memoryview(subida.buffer)
+            try:
+                yield vista
+            finally:
+                vista.release()
+        finally:
+            self._liberar(subida)
+
+    def cancelar(self, id_subida: str, descarga: bool = False) -> bool:
+        """Descarta una subida (o, con 'descarga', un resultado guardado) y libera su búfer"""
+        with self._lock:
+            subida = self._subidas.get(id_subida)
+            if subida is None or subida.descarga != descarga:
+                return False
+            del self._subidas[id_subida]
+        self._liberar(subida)
+        return True
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purgar()
+            return {
+                "abiertas": sum(1 for s in self._subidas.values() if not s.descarga),
+                "descargas": sum(1 for s in self._subidas.values() if s.descarga),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "completadas": self.completadas,
+                "caducadas": self.caducadas,
+                "rechazadas_checksum": self.rechazadas_checksum
+            }
+
+    def _obtener(self, id_subida: str, descarga: bool = False) -> _Subida:
+        with self._lock:
+            subida = self._subidas.get(id_subida)
+        if subida is None or subida.descarga != descarga:
+            tipo = "Descarga" if descarga else "Subida"
+            raise ValueError(f"{tipo} desconocida o caducada: {id_subida}")
+        return subida
+
+    def _liberar(self, subida: _Subida):
+        with subida.lock:
+            subida.cerrar()
+        with self._lock:
+            self._bytes -= subida.tamaño
+
+    def _purgar(self):
+        """Cierra las subidas inactivas más de ttl segundos (llamar con el lock tomado)"""
+        limite = time.monotonic() - self.ttl
+        for id_subida, subida in list(self._subidas.items()):
+            # Una subida recibiendo un fragmento no está inactiva
+            if subida.ultima_actividad > limite or not subida.lock.acquire(blocking=False):
+                continue
+            try:
+                subida.cerrar()
+            finally:
+                subida.lock.release()
+            del self._subidas[id_subida]
+            self._bytes -= subida.tamaño
+            self.caducadas += 1
+            logger.info(f"Subida {id_subida} caducada tras {self.ttl:.0f}s sin actividad")
@@ -0,0 +1,102 @@
+"""
+Ejecución por franjas para imágenes muy grandes.
+Los pasos "teselables" (desenfoque, nitidez, operaciones puntuales sin
+contraste y marca de agua) se aplican a franjas horizontales con un margen
+(halo) de filas por encima y por debajo, y cada franja se pega en una
+imagen de salida reservada una sola vez. Así la memoria de un trabajo es la
+entrada, la salida y una franja, en lugar de una imagen completa por paso.
+
+El resultado es idéntico al de aplicar los pasos a la imagen completa: el
+halo cubre el soporte de los filtros y el contraste, que depende de la
+media de toda la imagen, no se considera teselable.
+"""
+
+import math
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+from transformaciones.marca_agua import MarcaAgua
+from utils.operaciones_puntuales import factores
+
+# Píxeles aproximados por franja (sin contar el halo)
+PIXELES_POR_FRANJA = 4 * 1024 * 1024
+
+# Radio de UnsharpMask usado por Perfilar
+_RADIO_PERFILAR = 2.0
+
+
+def halo_paso(paso: Dict) -> Optional[int]:
+    """
+    Filas de margen que necesita un paso para dar el mismo resultado por
+    franjas que sobre la imagen completa, o None si no es teselable.
+    """
+    tipo = paso.get("tipo")
+    parametros = paso.get("parametros") or {}
+    try:
+        if tipo == "blur":
+            radio = parametros.get("radius", 0)
+            return _halo_gaussiano(radio) if radio > 0 else 0
+        if tipo == "sharpen":
+            return _halo_gaussiano(_RADIO_PERFILAR) if parametros.get("value", 0) > 0 else 0
+        if tipo == "grayscale":
+            return 0
+        if tipo in ("brightness", "contrast"):
+            return 0 if _sin_contraste(parametros) else None
+        if tipo == "point_ops":
+            pasos = parametros.get("pasos", [])
+            return 0 if all(halo_paso(p) == 0 for p in pasos) else None
+        if tipo == "watermark":
+            return 0
+    except TypeError:
+        return None
+    return None
+
+
+def aplicar_por_franjas(img: Image.Image, pasos: List[Dict],
+                        aplicar_paso: Callable[[Image.Image, Dict], Image.Image],
+                        pixeles_por_franja: int = PIXELES_POR_FRANJA) -> Image.Image:
+    """
+    Aplica una secuencia de pasos teselables por franjas horizontales.
+
+    Args:
+        img: Imagen de entrada (no se modifica)
+        pasos: Pasos para los que halo_paso no devuelve None
+        aplicar_paso: Función que aplica un paso a una imagen (salvo la marca de agua)
+        pixeles_por_franja: Tamaño aproximado de cada franja
+
+    Returns:
+        Nueva imagen con el mismo tamaño que la entrada
+    """
+    ancho, alto = img.size
+    halo = sum(halo_paso(paso) for paso in pasos)
+    alto_franja = max(1, pixeles_por_franja // max(1, ancho))
+
+    salida = None
+    for inicio in range(0, alto, alto_franja):
+        fin = min(alto, inicio + alto_franja)
+        arriba = max(0, inicio - halo)
+        franja = img.crop((0, arriba, ancho, min(alto, fin + halo)))
+
+        for paso in pasos:
+            if paso.get("tipo") == "watermark":
+                texto = (paso.get("parametros") or {}).get("text", "")
+                if texto and texto.strip():
+                    franja = MarcaAgua.aplicar_en_region(franja, texto, img.size, (0, arriba))
+            else:
+                franja = aplicar_paso(franja, paso)
+
+        if salida is None:
+            salida = Image.new(franja.mode, img.size)
+        salida.paste(franja.crop((0, inicio - arriba, ancho, fin - arriba)), (0, inicio))
+
+    return salida if salida is not None else img.copy()
+
+
+def _halo_gaussiano(radio: float) -> int:
+    """Soporte del desenfoque gaussiano de Pillow (tres pasadas de caja)"""
+    return 3 * math.ceil(radio) + 3
+
+
+def _sin_contraste(parametros: Dict) -> bool:
+    return factores(parametros)[1] == 1.0